@@ -1,5 +1,7 @@
+import logging
 import os
 from celery import Celery
+from celery.signals import worker_process_init, worker_ready
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'internetmap.settings')
@@ -7,3 +9,45 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'internetmap.settings')
 app = Celery('internetmap')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
+
+
+def _start_metrics_server():
+    from django.conf import settings
+    from network.metrics import start_metrics_server
+
+    port = getattr(settings, 'WORKER_METRICS_PORT', 0)
+    if port:
+        start_metrics_server(port)
+
+
+@worker_process_init.connect
+def start_worker_metrics(**kwargs):
+    """Экспорт метрик сканера из каждого дочернего процесса prefork — там выполняются задачи."""
+    _start_metrics_server()
+
+
+@worker_ready.connect
+def start_pool_metrics(sender=None, **kwargs):
+    """
+    Пулы solo и threads выполняют задачи в главном процессе, и worker_process_init не приходит.
+    У prefork главный процесс задач не выполняет: порт остается дочерним.
+    """
+    pool = getattr(sender, 'pool', None)
+    if pool is None or not type(pool).__module__.endswith('prefork'):
+        _start_metrics_server()
+
+
+@worker_process_init.connect
+def start_worker_caches(**kwargs):
+    """
+    Кэши процесса, общие для задач сканирования, и их прогрев из базы.
+    Сигнал приходит в каждом дочернем процессе prefork и один раз в пуле solo.
+    """
+    from network import caches
+
+    caches.activate()
+    try:
+        caches.warm_from_db()
+    except Exception as e:
+        # Без прогрева воркер работает, просто начинает с холодных кэшей
+        logging.getLogger(__name__).warning(f"Не удалось прогреть кэши воркера: {e}")
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from celery.schedules import crontab
+from datetime import timedelta
 from pathlib import Path
 import os
 
@@ -137,6 +139,107 @@ CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
+# Очереди сканов: короткие интерактивные отдельно от тяжелых пакетных.
+# Воркеры: `celery -A internetmap worker -Q scans.interactive,scans.batch`
+# и хотя бы один выделенный `-Q scans.batch`, чтобы большие сканы тоже продвигались.
+CELERY_TASK_ROUTES = {
+    'network.tasks.run_scanner_task': {'queue': 'scans.batch'},
+}
+# Приоритеты внутри очереди Redis (0 — наивысший)
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+    # С acks_late неподтвержденная задача возвращается в очередь через visibility_timeout
+    # (у Redis по умолчанию 1 ч). Берем с запасом больше SCAN_BUDGET_MAX_RUNTIME (6 ч),
+    # иначе длинный скан запустится второй раз на другом воркере
+    'visibility_timeout': 12 * 60 * 60,
+}
+# Воркер не набирает задачи впрок, иначе длинный скан держит за собой короткие
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+# Периодические задачи; запускаются процессом `celery -A internetmap beat`
+CELERY_BEAT_SCHEDULE = {
+    # RDAP-обогащение IP без сети, по RDAP_ENRICH_BATCH адресов за запуск
+    'enrich-ips': {
+        'task': 'network.tasks.enrich_ips_task',
+        'schedule': timedelta(hours=1),
+    },
+    # Политика хранения сессий SCAN_RETENTION — раз в сутки, ночью
+    'prune-sessions': {
+        'task': 'network.tasks.prune_sessions_task',
+        'schedule': crontab(hour=3, minute=30),
+    },
+}
+# Порт экспорта метрик Prometheus из воркеров (процессы prefork занимают следующие порты).
+# 0 — экспорт выключен.
+WORKER_METRICS_PORT = int(os.environ.get('WORKER_METRICS_PORT', 9808))
+# Кэши процесса воркера (network/caches.py), общие для всех сканов процесса:
+# maxsize — записей (LRU), ttl — секунды жизни записи, negative_ttl — секунды жизни
+# пустого ответа сетевого этапа (таймаут, временный сбой; 0 — не кэшировать).
+# Нужна запись на каждый кэш сканера, иначе он работает без кэша процесса
+WORKER_CACHES = {
+    'resolve': {'maxsize': 50000, 'ttl': 300, 'negative_ttl': 30},
+    'tls': {'maxsize': 20000, 'ttl': 60 * 60, 'negative_ttl': 60},
+    'reverse_dns': {'maxsize': 20000, 'ttl': 60 * 60, 'negative_ttl': 60},
+    'harvester': {'maxsize': 2000, 'ttl': 6 * 60 * 60, 'negative_ttl': 5 * 60},
+    'nmap': {'maxsize': 2000, 'ttl': 6 * 60 * 60, 'negative_ttl': 5 * 60},
+    'rdap': {'maxsize': 20000, 'ttl': 24 * 60 * 60},
+    'domain_pk': {'maxsize': 200000, 'ttl': 24 * 60 * 60},
+    'ip_pk': {'maxsize': 200000, 'ttl': 24 * 60 * 60},
+}
+# Сколько последних доменов и IP загружается в кэши при старте процесса воркера
+WORKER_CACHE_WARM_LIMIT = 50000
+
+# Хранилище связей завершенных сессий (network/storage.py): 'edges' — общие Edge
+# с интервалами по сессиям, 'links' — своя копия строк Link у каждой сессии
+SCAN_STORAGE = 'edges'
+
+# Секции network_link в PostgreSQL (network/partitions.py): сессий на секцию.
+# Задается до миграции 0009 и потом не меняется — по нему называются секции
+LINK_PARTITION_SIZE = 1000
+
+# Хранение сессий (network/retention.py, prune_sessions): младше keep_all_days — все,
+# старше — одна завершенная на snapshot_days дней на корень, старше max_age_days — удаляются
+SCAN_RETENTION = {
+    'keep_all_days': 14,
+    'snapshot_days': 7,
+    'max_age_days': 365,
+}
+
+# Пакетный скан (network/batch.py): размер и время жизни каждого общего кэша пакета,
+# сколько корней можно передать в одном пакете, предельная глубина
+# и число незавершенных пакетов у одного заказчика. BATCH_SCAN_HEARTBEAT_TIMEOUT — через
+# сколько секунд без отметки владелец пакета считается пропавшим: больше SCAN_BUDGET_MAX_RUNTIME
+# (отметка ставится между корнями) и меньше visibility_timeout брокера
+BATCH_SCAN_CACHE_SIZE = 200000
+BATCH_SCAN_CACHE_TTL = 6 * 60 * 60
+BATCH_SCAN_MAX_ROOTS = 10000
+BATCH_SCAN_MAX_DEPTH = 5
+BATCH_SCAN_REQUESTER_CONCURRENCY = 1
+BATCH_SCAN_HEARTBEAT_TIMEOUT = 8 * 60 * 60
+
+# Сколько индексов смежности завершенных сессий держит в памяти процесс API (network/adjacency.py)
+ADJACENCY_CACHE_SIZE = 8
+
+# RDAP-обогащение IP (network/enrichment.py): параллельных запросов и запросов в секунду
+RDAP_MAX_WORKERS = 4
+RDAP_RATE_LIMIT = 5.0
+# Сколько IP без сети обрабатывает один запуск enrich_ips_task
+RDAP_ENRICH_BATCH = 5000
+
+# Планировщик сканов (network/scheduler.py)
+# Адреса обратных прокси, которым доверяется X-Forwarded-For при определении заказчика
+# (network/scheduler.py). Пусто — заказчик определяется только по REMOTE_ADDR
+TRUSTED_PROXIES = [p for p in os.environ.get('TRUSTED_PROXIES', '').split(',') if p]
+SCAN_REQUESTER_CONCURRENCY = 2  # одновременных сканов на одного заказчика
+SCAN_INTERACTIVE_MAX_COST = 2000  # оценка числа проб, выше которой скан считается пакетным
+
+# Бюджет одного скана (network/estimator.py). None — без ограничения.
+SCAN_BUDGET_MAX_PROBES = 200000
+SCAN_BUDGET_MAX_RUNTIME = 6 * 60 * 60  # секунды
+SCAN_BUDGET_POLICY = 'downgrade'  # 'downgrade' — понизить глубину, 'reject' — отклонить
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # React фронтенд
     "http://localhost:8000",  # Django
@@ -22,12 +22,14 @@ from rest_framework.routers import DefaultRouter
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
-from network.views import DomainViewSet, IPAddressViewSet, LinkViewSet
+from network.views import DomainViewSet, IPAddressViewSet, LinkViewSet, ScanBatchViewSet, ScanSessionViewSet, metrics
 
 router = DefaultRouter()
 router.register(r'domains', DomainViewSet, basename='domain')
 router.register(r'ips', IPAddressViewSet, basename='ip')
 router.register(r'links', LinkViewSet, basename='link')
+router.register(r'sessions', ScanSessionViewSet, basename='session')
+router.register(r'batches', ScanBatchViewSet, basename='batch')
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -41,6 +43,7 @@ schema_view = get_schema_view(
 
 urlpatterns = [
     path('api/', include(router.urls)),
+    path('metrics', metrics, name='metrics'),
     path('swagger(<format>\.json|\.yaml)', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
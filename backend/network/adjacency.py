@@ -0,0 +1,338 @@
+# backend/network/adjacency.py
+
+"""
+Индекс смежности сессии в памяти: окрестность узла, кратчайший путь, компоненты связности.
+
+Граф сессии двудольный: узлы — домены и IP, ребро — связь (домен, IP, метод).
+Индекс хранит его в формате CSR (indptr/indices, NumPy): соседи узла v —
+indices[indptr[v]:indptr[v + 1]]. Узлы 0..D-1 — домены, D..D+I-1 — IP, в порядке
+возрастания pk, так что pk <-> узел переводится searchsorted. Обход в ширину
+расширяет сразу весь фронт одним набором векторных операций, без цикла по узлам.
+
+Индекс завершенной сессии строится один раз и хранится в кэше процесса
+(settings.ADJACENCY_CACHE_SIZE последних сессий); незавершенной — строится заново.
+"""
+
+from django.conf import settings
+from .caches import MISSING, TTLCache
+from .models import Domain, IPAddress
+from .storage import LOOKUP_CHUNK, session_links
+import ipaddress
+import logging
+import numpy as np
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 8
+CACHE_TTL = 24 * 60 * 60
+DEFAULT_HOPS = 2
+MAX_HOPS = 6
+DEFAULT_NODE_LIMIT = 500
+MAX_NODE_LIMIT = 5000
+
+_cache = None
+
+
+def _expand(indptr, indices, frontier):
+    """Все ребра фронта: (сосед, узел фронта, позиция ребра в indices)."""
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    # Позиции ребер подряд идущими отрезками [start, start + count)
+    positions = np.arange(total) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return indices[positions], np.repeat(frontier, counts), positions
+
+
+class AdjacencyIndex:
+    """CSR-граф одной сессии. Строится из массивов связей: domain_pk[i] — ip_pk[i] методом methods[i]."""
+
+    def __init__(self, domain_pks, ip_pks, methods):
+        domain_pks = np.asarray(domain_pks, dtype=np.int64)
+        ip_pks = np.asarray(ip_pks, dtype=np.int64)
+        self.domain_pks = np.unique(domain_pks)
+        self.ip_pks = np.unique(ip_pks)
+        self.method_names, method_codes = np.unique(np.asarray(methods, dtype=str), return_inverse=True)
+        self.domains = len(self.domain_pks)
+        self.size = self.domains + len(self.ip_pks)
+        self.links = len(domain_pks)
+
+        domain_nodes = np.searchsorted(self.domain_pks, domain_pks)
+        ip_nodes = np.searchsorted(self.ip_pks, ip_pks) + self.domains
+        sources = np.concatenate([domain_nodes, ip_nodes])
+        targets = np.concatenate([ip_nodes, domain_nodes])
+        order = np.argsort(sources, kind='stable')
+        self.indices = targets[order]
+        self.edge_methods = np.concatenate([method_codes, method_codes])[order].astype(np.int16)
+        self.indptr = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=self.size), out=self.indptr[1:])
+        self._components = None
+
+    @classmethod
+    def from_session(cls, session):
+        rows = session_links(session).order_by().values_list('domain_id', 'ip_id', 'method')
+        columns = tuple(zip(*rows.iterator(chunk_size=10000))) or ((), (), ())
+        return cls(*columns)
+
+    # --- Узлы ---
+
+    def node(self, kind: str, pk: int):
+        """Номер узла домена или IP с данным pk; None — в сессии его нет."""
+        pks, offset = (self.domain_pks, 0) if kind == 'domain' else (self.ip_pks, self.domains)
+        position = int(np.searchsorted(pks, pk))
+        if position < len(pks) and pks[position] == pk:
+            return position + offset
+        return None
+
+    def describe(self, nodes):
+        """[(kind, pk)] для номеров узлов."""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        return [
+            ('domain', int(self.domain_pks[v])) if v < self.domains else ('ip', int(self.ip_pks[v - self.domains]))
+            for v in nodes.tolist()
+        ]
+
+    # --- Запросы ---
+
+    def neighborhood(self, node: int, hops: int):
+        """(узлы, расстояния) в пределах hops ребер от node, по возрастанию расстояния."""
+        distance = np.full(self.size, -1, dtype=np.int32)
+        distance[node] = 0
+        frontier = np.array([node], dtype=np.int64)
+        found = [frontier]
+        for hop in range(1, hops + 1):
+            neighbors, _, _ = _expand(self.indptr, self.indices, frontier)
+            frontier = np.unique(neighbors[distance[neighbors] < 0])
+            if not len(frontier):
+                break
+            distance[frontier] = hop
+            found.append(frontier)
+        nodes = np.concatenate(found)
+        return nodes, distance[nodes]
+
+    def _step(self, frontier, parent, method):
+        """Один уровень BFS: новые узлы фронта; parent/method — откуда пришли и каким ребром."""
+        neighbors, sources, positions = _expand(self.indptr, self.indices, frontier)
+        fresh = parent[neighbors] == -2
+        neighbors, sources, positions = neighbors[fresh], sources[fresh], positions[fresh]
+        frontier, first = np.unique(neighbors, return_index=True)
+        parent[frontier] = sources[first]
+        method[frontier] = self.edge_methods[positions[first]]
+        return frontier
+
+    def shortest_path(self, source: int, target: int):
+        """
+        Кратчайший путь [(узел, метод ребра к предыдущему узлу)] от source к target;
+        None — узлы в разных компонентах. Двунаправленный BFS: каждый раз
+        расширяется меньший из двух фронтов.
+        """
+        if source == target:
+            return [(source, None)]
+        # -2 — не посещен, -1 — корень обхода
+        parents = [np.full(self.size, -2, dtype=np.int64) for _ in range(2)]
+        methods = [np.full(self.size, -1, dtype=np.int16) for _ in range(2)]
+        parents[0][source] = parents[1][target] = -1
+        frontiers = [np.array([source], dtype=np.int64), np.array([target], dtype=np.int64)]
+        while len(frontiers[0]) and len(frontiers[1]):
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            frontiers[side] = self._step(frontiers[side], parents[side], methods[side])
+            met = frontiers[side][parents[1 - side][frontiers[side]] != -2]
+            if len(met):
+                return self._join(int(met[0]), parents, methods)
+        return None
+
+    def _join(self, middle, parents, methods):
+        # Половина от source к middle (в обратном порядке) и от middle к target
+        path = []
+        node = middle
+        while node != -1:
+            path.append(node)
+            node = int(parents[0][node])
+        path.reverse()
+        node = middle
+        while parents[1][node] != -1:
+            node = int(parents[1][node])
+            path.append(node)
+
+        names = self.method_names
+        steps = [(path[0], None)]
+        for previous, node in zip(path, path[1:]):
+            # Ребро previous — node записано у того конца, который был открыт позже
+            if parents[0][node] == previous:
+                code = methods[0][node]
+            else:
+                code = methods[1][previous]
+            steps.append((node, str(names[code])))
+        return steps
+
+    def components(self):
+        """Метка компоненты для каждого узла (наименьший номер узла в ней); считается один раз."""
+        if self._components is not None:
+            return self._components
+        labels = np.arange(self.size, dtype=np.int64)
+        sources = np.repeat(np.arange(self.size, dtype=np.int64), np.diff(self.indptr))
+        targets = self.indices
+        # Подвешивание меньшей метки к большей и сжатие путей, пока метки меняются
+        while True:
+            low = np.minimum(labels[sources], labels[targets])
+            before = labels.copy()
+            np.minimum.at(labels, labels[sources], low)
+            np.minimum.at(labels, labels[targets], low)
+            while True:
+                jumped = labels[labels]
+                if np.array_equal(jumped, labels):
+                    break
+                labels = jumped
+            if np.array_equal(labels, before):
+                break
+        self._components = labels
+        return labels
+
+    def edges_between(self, nodes):
+        """Ребра между узлами nodes: (домен, IP, код метода), по одному на связь."""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        domains = nodes[nodes < self.domains]
+        neighbors, sources, positions = _expand(self.indptr, self.indices, domains)
+        inside = np.isin(neighbors, nodes)
+        return sources[inside], neighbors[inside], self.edge_methods[positions[inside]]
+
+    def component_sizes(self):
+        """(метки, размеры, доменов) компонент по убыванию размера."""
+        labels = self.components()
+        unique, sizes = np.unique(labels, return_counts=True)
+        domains = np.bincount(np.searchsorted(unique, labels[:self.domains]), minlength=len(unique))
+        order = np.argsort(-sizes, kind='stable')
+        return unique[order], sizes[order], domains[order]
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        _cache = TTLCache('adjacency', getattr(settings, 'ADJACENCY_CACHE_SIZE', DEFAULT_CACHE_SIZE), CACHE_TTL)
+    return _cache
+
+
+def get_adjacency(session) -> AdjacencyIndex:
+    """Индекс сессии; индекс завершенной сессии берется из кэша процесса."""
+    cacheable = session.status == 'completed'
+    # completed_at в ключе: id могут повториться после удаления сессий (SQLite, тесты)
+    key = (session.id, session.completed_at)
+    if cacheable:
+        index = _get_cache().get(key, MISSING)
+        if index is not MISSING:
+            return index
+    started = time.perf_counter()
+    index = AdjacencyIndex.from_session(session)
+    logger.info(f"Индекс смежности сессии {session.id}: {index.size} узлов, {index.links} связей "
+                f"за {time.perf_counter() - started:.2f} с")
+    if cacheable:
+        _get_cache().set(key, index)
+    return index
+
+
+def node_labels(pairs):
+    """{(kind, pk): имя домена или адрес IP} для [(kind, pk)]."""
+    labels = {}
+    for kind, model, field in (('domain', Domain, 'name'), ('ip', IPAddress, 'address')):
+        pks = [pk for k, pk in pairs if k == kind]
+        for start in range(0, len(pks), LOOKUP_CHUNK):
+            rows = model.objects.filter(pk__in=pks[start:start + LOOKUP_CHUNK]).values_list('id', field)
+            labels.update(((kind, pk), label) for pk, label in rows)
+    return labels
+
+
+def node_key(kind: str, pk: int) -> str:
+    """Ключ узла как в графе сессии (graph.py): d-<pk> / ip-<pk>."""
+    return f'd-{pk}' if kind == 'domain' else f'ip-{pk}'
+
+
+def resolve_node(index: AdjacencyIndex, value: str):
+    """
+    Номер узла по ключу графа (d-12, ip-7), имени домена или адресу IP.
+    None — такого узла в сессии нет.
+    """
+    value = (value or '').strip()
+    for prefix, kind in (('d-', 'domain'), ('ip-', 'ip')):
+        if value.startswith(prefix) and value[len(prefix):].isdigit():
+            return index.node(kind, int(value[len(prefix):]))
+    pk = IPAddress.objects.filter(address=value).values_list('id', flat=True).first() if _is_address(value) else None
+    if pk is not None and index.node('ip', pk) is not None:
+        return index.node('ip', pk)
+    pk = Domain.objects.filter(name=value.lower()).values_list('id', flat=True).first()
+    return index.node('domain', pk) if pk is not None else None
+
+
+def _is_address(value: str) -> bool:
+    try:
+        ipaddress.ip_address(value)
+    except ValueError:
+        return False
+    return True
+
+
+def render_nodes(index: AdjacencyIndex, nodes, extra=None):
+    """Узлы для API: [{'id', 'type', 'label', **extra[i]}]."""
+    pairs = index.describe(nodes)
+    labels = node_labels(pairs)
+    rendered = []
+    for i, (kind, pk) in enumerate(pairs):
+        node = {'id': node_key(kind, pk), 'type': kind, 'label': labels.get((kind, pk))}
+        if extra is not None:
+            node.update(extra[i])
+        rendered.append(node)
+    return rendered
+
+
+def neighborhood_payload(index: AdjacencyIndex, node: int, hops: int, limit: int) -> dict:
+    """Окрестность для API: ближайшие limit узлов (по расстоянию) и ребра между ними."""
+    nodes, distances = index.neighborhood(node, hops)
+    total = len(nodes)
+    nodes, distances = nodes[:limit], distances[:limit]
+    rendered = render_nodes(index, nodes, [{'distance': int(d)} for d in distances.tolist()])
+    keys = dict(zip(nodes.tolist(), (n['id'] for n in rendered)))
+    sources, targets, methods = index.edges_between(nodes)
+    edges = [
+        {'source': keys[source], 'target': keys[target], 'label': str(index.method_names[method])}
+        for source, target, method in zip(sources.tolist(), targets.tolist(), methods.tolist())
+    ]
+    return {'node': keys[node], 'hops': hops, 'total': total, 'truncated': total > limit, 'nodes': rendered, 'edges': edges}
+
+
+def path_payload(index: AdjacencyIndex, source: int, target: int):
+    """Кратчайший путь для API; None — узлы не связаны."""
+    steps = index.shortest_path(source, target)
+    if steps is None:
+        return None
+    nodes = render_nodes(index, [node for node, _ in steps], [{'via': method} for _, method in steps])
+    return {'length': len(steps) - 1, 'nodes': nodes}
+
+
+def components_payload(index: AdjacencyIndex, limit: int, node: int = None) -> dict:
+    """
+    Компоненты связности: число и крупнейшие limit по размеру. С node — только
+    компонента узла и до limit ее членов. Компонента называется по узлу с наименьшим номером.
+    """
+    labels, sizes, domains = index.component_sizes()
+    payload = {'count': len(labels), 'nodes': index.size}
+    if node is None:
+        representatives = render_nodes(index, labels[:limit])
+        payload['components'] = [
+            {'id': rep['id'], 'label': rep['label'], 'size': size, 'domains': d, 'ips': size - d}
+            for rep, size, d in zip(representatives, sizes[:limit].tolist(), domains[:limit].tolist())
+        ]
+        return payload
+
+    label = index.components()[node]
+    rank = int(np.flatnonzero(labels == label)[0])
+    members = np.flatnonzero(index.components() == label)
+    size, d = int(sizes[rank]), int(domains[rank])
+    payload['component'] = {
+        'id': render_nodes(index, [label])[0]['id'],
+        'rank': rank + 1, 'size': size, 'domains': d, 'ips': size - d,
+        'truncated': len(members) > limit,
+        'members': render_nodes(index, members[:limit]),
+    }
+    return payload
@@ -1,11 +1,20 @@
 from django.contrib import admin
-from .models import Domain, IPAddress, Link
+from .models import Domain, IPAddress, Link, ScanBatch, ScanSession, SessionGraph
+from .search import search_domains
 
 @admin.register(Domain)
 class DomainAdmin(admin.ModelAdmin):
     list_display = ('name', 'created_at')
     search_fields = ('name',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # Шаблоны *.suffix / prefix* / подстрока — по индексам из network/search.py,
+        # а не ILIKE по всей таблице; короткие и некорректные — как раньше
+        try:
+            return search_domains(search_term, queryset=queryset), False
+        except ValueError:
+            return super().get_search_results(request, queryset, search_term)
+
 @admin.register(IPAddress)
 class IPAddressAdmin(admin.ModelAdmin):
     list_display = ('address', 'organization', 'created_at')
@@ -15,4 +24,26 @@ class IPAddressAdmin(admin.ModelAdmin):
 class LinkAdmin(admin.ModelAdmin):
     list_display = ('domain', 'ip', 'method', 'discovered_at')
     list_filter = ('method', 'discovered_at')
-    search_fields = ('domain__name', 'ip__address')
\ No newline at end of file
+    search_fields = ('domain__name', 'ip__address')
+
+@admin.register(ScanSession)
+class ScanSessionAdmin(admin.ModelAdmin):
+    list_display = ('root_domain', 'depth', 'status', 'created_at', 'completed_at')
+    list_filter = ('status', 'depth')
+    search_fields = ('root_domain',)
+    readonly_fields = ('stats', 'frontier')
+
+
+@admin.register(SessionGraph)
+class SessionGraphAdmin(admin.ModelAdmin):
+    list_display = ('session', 'layout', 'created_at')
+    list_filter = ('layout',)
+    readonly_fields = ('nodes', 'edges', 'summary')
+
+
+@admin.register(ScanBatch)
+class ScanBatchAdmin(admin.ModelAdmin):
+    list_display = ('name', 'depth', 'status', 'requester', 'created_at', 'completed_at')
+    list_filter = ('status',)
+    search_fields = ('name', 'requester')
+    readonly_fields = ('stats',)
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class NetworkConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'network'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from . import caches, fields, partitions
+        from .models import Domain, IPAddress, ScanSession
+
+        # Удаленные строки не должны оставаться в кэшах pk процесса
+        post_delete.connect(caches.invalidate_domain, sender=Domain)
+        post_delete.connect(caches.invalidate_ip, sender=IPAddress)
+        # Секция network_link для новой сессии (только PostgreSQL)
+        post_save.connect(partitions.create_session_partition, sender=ScanSession)
+        # Функция для lookups net_within/net_contains в SQLite
+        connection_created.connect(fields.register_sqlite_functions)
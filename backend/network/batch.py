@@ -0,0 +1,334 @@
+# backend/network/batch.py
+
+"""
+Пакетный скан: список корневых доменов сканируется одной задачей, корень за корнем.
+
+Каждый корень по-прежнему получает свою ScanSession с полным обходом, поэтому граф,
+углубление и разница сессий работают как для одиночного скана. Общий у корней пакета —
+ScanContext: кэши DNS, TLS, RDAP, обратного DNS, theHarvester, nmap по подсетям и pk
+доменов и IP. Общая инфраструктура (хостинги, CDN, подсети) пробуется один раз
+на пакет, а следующие корни берут готовые ответы, не повторяя сетевых вызовов.
+Ответы crt.sh и так лежат в файловом кэше, общем для всех сканов.
+
+Общие кэши живут столько же, сколько задача пакета, ограничены по размеру (LRU)
+и времени жизни записи — settings.BATCH_SCAN_CACHE_SIZE / BATCH_SCAN_CACHE_TTL.
+"""
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from .caches import TTLCache
+from .models import ScanBatch, ScanSession
+from .psl import registrable_domains
+import datetime
+import logging
+import os
+import re
+import socket
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHES = ('resolve', 'tls', 'rdap', 'reverse_dns', 'harvester', 'nmap', 'domain_pk', 'ip_pk')
+DEFAULT_CACHE_SIZE = 200000
+DEFAULT_CACHE_TTL = 6 * 60 * 60
+DEFAULT_MAX_ROOTS = 10000
+DEFAULT_MAX_DEPTH = 5
+# Сколько незавершенных пакетов может быть у одного заказчика
+DEFAULT_REQUESTER_BATCHES = 1
+# Через сколько секунд без отметки захвативший пакет процесс считается пропавшим.
+# Больше бюджета времени одного скана: отметка ставится между корнями
+DEFAULT_HEARTBEAT_TIMEOUT = 8 * 60 * 60
+
+# Метка имени хоста: буквы, цифры и дефис не по краям (IDN — после перевода в punycode)
+HOST_LABEL = re.compile(r'^(?!-)[a-z0-9-]{1,63}(?<!-)$')
+MAX_HOST_LENGTH = 253
+
+# Ключи ScanStats.summary()['items'] -> итоги пакета
+TOTALS = {'domain': 'domains', 'ip': 'ips', 'link': 'links'}
+
+
+class ScanContext:
+    """Общее состояние сканеров одного пакета: кэши по именам из SHARED_CACHES и итоги."""
+
+    def __init__(self, maxsize: int = None, ttl: float = None, totals: dict = None):
+        if maxsize is None:
+            maxsize = getattr(settings, 'BATCH_SCAN_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+        if ttl is None:
+            ttl = getattr(settings, 'BATCH_SCAN_CACHE_TTL', DEFAULT_CACHE_TTL)
+        self.caches = {name: TTLCache(f'batch_{name}', maxsize=maxsize, ttl=ttl) for name in SHARED_CACHES}
+        self.totals = dict.fromkeys([*TOTALS.values(), 'network_calls', 'cache_hits'], 0)
+        self.totals.update(totals or {})
+
+    def cache(self, name: str):
+        """Общий кэш пакета; None — такого нет, сканер возьмет кэш процесса."""
+        return self.caches.get(name)
+
+    def add(self, stats: dict):
+        """Учитывает статистику пройденной сессии (ScanStats.summary())."""
+        if not stats:
+            return
+        for item, total in TOTALS.items():
+            self.totals[total] += stats.get('items', {}).get(item, 0)
+        self.totals['network_calls'] += stats.get('network_calls', 0)
+        self.totals['cache_hits'] += stats.get('cache_hits', 0)
+
+    def summary(self) -> dict:
+        return {
+            'totals': dict(self.totals),
+            'caches': {name: cache.info() for name, cache in self.caches.items()},
+        }
+
+
+class InvalidRoots(ValueError):
+    """В списке корней есть строки, которые нельзя сканировать; rejected — какие и почему."""
+
+    def __init__(self, rejected: list):
+        super().__init__(f'Invalid root domains: {len(rejected)}')
+        self.rejected = rejected
+
+
+class RequesterBusy(Exception):
+    """У заказчика уже столько незавершенных пакетов, сколько допускает BATCH_SCAN_REQUESTER_CONCURRENCY."""
+
+
+def _root_error(root: str):
+    """Почему имя не годится в корень скана; None — годится."""
+    if len(root) > MAX_HOST_LENGTH:
+        return 'name too long'
+    if not all(HOST_LABEL.match(label) for label in root.split('.')):
+        return 'not a host name'
+    return None
+
+
+def parse_roots(lines) -> list:
+    """
+    Корни из строк файла или списка: нижний регистр, без точки в конце, без пустых строк,
+    комментариев (#) и повторов, в исходном порядке; IDN — в punycode.
+    Каждый корень проверяется как имя хоста и по PSL, как имена в сканере: публичный суффикс
+    (com, co.uk, github.io) корнем быть не может. InvalidRoots — есть непригодные строки
+    (номер строки, значение, причина); ValueError — пусто или больше лимита.
+    """
+    roots, rejected = {}, []
+    for number, line in enumerate(lines, 1):
+        if not isinstance(line, str):
+            rejected.append({'line': number, 'value': line, 'reason': 'not a string'})
+            continue
+        root = line.split('#', 1)[0].strip().lower().rstrip('.')
+        if not root:
+            continue
+        try:
+            root = root.encode('idna').decode('ascii')
+        except UnicodeError:
+            rejected.append({'line': number, 'value': line, 'reason': 'not a host name'})
+            continue
+        reason = _root_error(root)
+        if reason:
+            rejected.append({'line': number, 'value': line, 'reason': reason})
+        elif root not in roots:
+            roots[root] = number
+    for root, base in zip(list(roots), registrable_domains(list(roots))):
+        if base is None:
+            rejected.append({'line': roots.pop(root), 'value': root, 'reason': 'public suffix'})
+    if rejected:
+        raise InvalidRoots(sorted(rejected, key=lambda item: item['line']))
+    if not roots:
+        raise ValueError('No root domains given')
+    limit = getattr(settings, 'BATCH_SCAN_MAX_ROOTS', DEFAULT_MAX_ROOTS)
+    if len(roots) > limit:
+        raise ValueError(f'More than {limit} root domains in one batch: {len(roots)}')
+    return list(roots)
+
+
+def parse_depth(value) -> int:
+    """Глубина пакета: целое от 1 до BATCH_SCAN_MAX_DEPTH, иначе ValueError."""
+    limit = getattr(settings, 'BATCH_SCAN_MAX_DEPTH', DEFAULT_MAX_DEPTH)
+    try:
+        depth = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Depth must be an integer')
+    if not 1 <= depth <= limit:
+        raise ValueError(f'Depth must be between 1 and {limit}')
+    return depth
+
+
+def _check_requester_batches(requester: str):
+    """
+    RequesterBusy, если у заказчика уже BATCH_SCAN_REQUESTER_CONCURRENCY незавершенных пакетов.
+    Вызывается в транзакции create_batch: его незавершенные пакеты блокируются, а в PostgreSQL
+    еще и advisory-блокировка по заказчику — пока пакетов нет, блокировать строки нечего,
+    и два параллельных запроса иначе оба прошли бы проверку.
+    """
+    limit = getattr(settings, 'BATCH_SCAN_REQUESTER_CONCURRENCY', DEFAULT_REQUESTER_BATCHES)
+    if not requester or limit is None:
+        return
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [f'scan_batch:{requester}'])
+    unfinished = list(
+        ScanBatch.objects.select_for_update().filter(requester=requester, status__in=['pending', 'running']).values_list('id', flat=True)
+    )
+    if len(unfinished) >= limit:
+        raise RequesterBusy(f'Requester {requester} already has {len(unfinished)} unfinished batches')
+
+
+def admit_session(session: ScanSession) -> bool:
+    """
+    Бюджет скана (admit_scan) для сессии пакета — в задаче пакета, непосредственно перед
+    обходом корня, а не при создании: оценка читает кэш crt.sh и историю сканов, и на тысячах
+    корней запрос ждал бы ее целиком. Глубина сессии понижается по бюджету, оценка записывается.
+    False — корень не укладывается в бюджет, сессия помечена failed.
+    """
+    from .estimator import admit_scan
+
+    depth, estimate = admit_scan(session.root_domain, session.depth)
+    session.estimated_probes, session.estimated_runtime = estimate['probes'], estimate['runtime_seconds']
+    fields = ['estimated_probes', 'estimated_runtime']
+    if depth is None:
+        session.status, session.completed_at = 'failed', timezone.now()
+        fields += ['status', 'completed_at']
+        logger.warning(f"Сессия {session.id} пакета {session.batch_id} ({session.root_domain}) отклонена по бюджету")
+    elif depth != session.depth:
+        session.depth = depth
+        fields.append('depth')
+    session.save(update_fields=fields)
+    return depth is not None
+
+
+@transaction.atomic
+def create_batch(roots, depth: int = 2, name: str = '', requester: str = '', check_requester: bool = True) -> ScanBatch:
+    """
+    Пакет и по сессии pending на корень. Сессии создаются по одной — для секций network_link.
+    Бюджет корней проверяет задача пакета (admit_session).
+    RequesterBusy — у заказчика уже предельное число незавершенных пакетов (check_requester=False —
+    без проверки, для пакетов оператора из manage.py).
+    """
+    if check_requester:
+        _check_requester_batches(requester)
+    batch = ScanBatch.objects.create(name=name, depth=depth, requester=requester)
+    for root in roots:
+        ScanSession.objects.create(root_domain=root, depth=depth, status='pending', requester=requester, batch=batch)
+    logger.info(f"Создан пакет {batch.id}: {len(roots)} корней, глубина {depth}")
+    return batch
+
+
+def submit_batch(batch: ScanBatch):
+    """Ставит задачу пакета в пакетную очередь Celery после коммита."""
+    from .scheduler import BATCH_QUEUE, DEFAULT_PRIORITY_CLASSES
+    from .tasks import run_scan_batch_task
+    transaction.on_commit(
+        lambda: run_scan_batch_task.apply_async(args=[batch.id], queue=BATCH_QUEUE, priority=DEFAULT_PRIORITY_CLASSES[-1][2])
+    )
+
+
+def annotate_progress(queryset):
+    """Число сессий пакета по статусам одним GROUP BY (для списков пакетов)."""
+    return queryset.annotate(
+        sessions_total=Count('sessions'),
+        **{f'sessions_{s}': Count('sessions', filter=Q(sessions__status=s)) for s in ('pending', 'running', 'completed', 'failed')},
+    )
+
+
+def batch_progress(batch: ScanBatch) -> dict:
+    """Сводный прогресс пакета: сессии по статусам, доля пройденных и итоги обхода."""
+    if not hasattr(batch, 'sessions_total'):
+        batch = annotate_progress(ScanBatch.objects.filter(pk=batch.pk)).get()
+    counts = {s: getattr(batch, f'sessions_{s}') for s in ('pending', 'running', 'completed', 'failed')}
+    done = counts['completed'] + counts['failed']
+    return {
+        'total': batch.sessions_total,
+        **counts,
+        'percent': round(100 * done / batch.sessions_total, 1) if batch.sessions_total else 100.0,
+        **((batch.stats or {}).get('totals') or {}),
+    }
+
+
+def default_worker() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_batch(batch_id: int, worker: str):
+    """
+    Захватывает пакет под блокировкой строки (SELECT ... FOR UPDATE). None — пакет уже
+    завершен или его держит другой живой процесс (отметка свежее BATCH_SCAN_HEARTBEAT_TIMEOUT):
+    так бывает, когда брокер повторно доставляет задачу длинного пакета.
+    Если прежний владелец пропал, его сессии в статусе running возвращаются в pending.
+    """
+    timeout = getattr(settings, 'BATCH_SCAN_HEARTBEAT_TIMEOUT', DEFAULT_HEARTBEAT_TIMEOUT)
+    now = timezone.now()
+    with transaction.atomic():
+        batch = ScanBatch.objects.select_for_update().get(pk=batch_id)
+        if batch.status == 'completed':
+            logger.info(f"Пакет {batch.id} уже завершен")
+            return None
+        if (
+            batch.status == 'running' and batch.worker != worker
+            and batch.heartbeat_at and batch.heartbeat_at > now - datetime.timedelta(seconds=timeout)
+        ):
+            logger.info(f"Пакет {batch.id} выполняется процессом {batch.worker}, повторная задача пропущена")
+            return None
+        if batch.status == 'running':
+            reclaimed = batch.sessions.filter(status='running').update(status='pending')
+            logger.warning(f"Пакет {batch.id} перехвачен у {batch.worker or 'неизвестного процесса'}: {reclaimed} сессий заново")
+        batch.status, batch.worker, batch.heartbeat_at = 'running', worker, now
+        batch.started_at = batch.started_at or now
+        batch.save(update_fields=['status', 'worker', 'heartbeat_at', 'started_at'])
+    return batch
+
+
+def _heartbeat(batch: ScanBatch, worker: str, **fields) -> bool:
+    """Отметка владельца пакета (и заодно поля fields); False — пакет перехвачен другим процессом."""
+    return bool(ScanBatch.objects.filter(pk=batch.pk, worker=worker).update(heartbeat_at=timezone.now(), **fields))
+
+
+def run_batch(batch: ScanBatch, context: ScanContext = None, progress=None, worker: str = None):
+    """
+    Захватывает пакет (claim_batch) и сканирует его ожидающие сессии по очереди с общим ScanContext;
+    перед обходом каждая сессия проходит бюджет скана (admit_session).
+    Между корнями ставится отметка владельца; если пакет перехватили, обход прекращается.
+    progress(batch_progress) вызывается после каждого корня.
+    Возвращает пакет или None, если захватить его не удалось.
+    """
+    from .tasks import scan_session, finish_session
+
+    worker = worker or default_worker()
+    batch = claim_batch(batch.pk, worker)
+    if batch is None:
+        return None
+    if context is None:
+        context = ScanContext(totals=(batch.stats or {}).get('totals'))
+
+    lost = False
+    try:
+        session_ids = list(batch.sessions.filter(status='pending').order_by('id').values_list('id', flat=True))
+        for session_id in session_ids:
+            if not _heartbeat(batch, worker):
+                lost = True
+                break
+            session = ScanSession.objects.get(pk=session_id)
+            if admit_session(session):
+                scan_session(session, context)
+                finish_session(session)
+                context.add(session.stats)
+            batch.stats = context.summary()
+            if not _heartbeat(batch, worker, stats=batch.stats):
+                lost = True
+                break
+            if progress:
+                progress(batch_progress(batch))
+        batch.status = 'completed'
+    except Exception as e:
+        logger.error(f"Ошибка пакетного скана {batch.id}: {e}", exc_info=True)
+        batch.status = 'failed'
+        raise
+    finally:
+        if lost:
+            logger.warning(f"Пакет {batch.id} перехвачен другим процессом, {worker} прекращает обход")
+        else:
+            batch.completed_at = timezone.now()
+            batch.stats = context.summary()
+            ScanBatch.objects.filter(pk=batch.pk, worker=worker).update(
+                status=batch.status, completed_at=batch.completed_at, stats=batch.stats, heartbeat_at=batch.completed_at,
+            )
+            logger.info(f"Пакет {batch.id} завершен со статусом '{batch.status}': {context.totals}")
+    return None if lost else batch
@@ -0,0 +1,94 @@
+# backend/network/bench/seed.py
+
+"""
+Наполнение базы синтетическими сессиями заданного размера для бенчмарков графа.
+"""
+
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from network.models import Domain, IPAddress, Link, ScanSession
+import ipaddress
+
+BATCH_SIZE = 5000
+# Ограничение на число параметров в одном IN (у SQLite — 999)
+LOOKUP_CHUNK = 900
+METHODS = ['dns', 'tls-cert', 'harvester', 'nmap-subnet']
+
+
+def _ids_by(model, field, values):
+    """Словарь значение -> pk, выбираемый порциями, чтобы не упереться в лимит параметров."""
+    ids = {}
+    for start in range(0, len(values), LOOKUP_CHUNK):
+        chunk = values[start:start + LOOKUP_CHUNK]
+        ids.update(model.objects.filter(**{f'{field}__in': chunk}).values_list(field, 'id'))
+    return ids
+
+
+@transaction.atomic
+def seed_session(root_domain: str, links: int, fan_in: int = 0, groups: int = 100, ip_offset: int = 0) -> ScanSession:
+    """
+    Создает завершенную сессию root_domain примерно с links связями.
+    - Домены вида d<i>.g<k>.<root> плюс сами g<k>.<root> — для связей «поддомен».
+    - У каждого домена две связи с IP; IP сгруппированы по подсетям /24 с cidr.
+    - fan_in > 0 добавляет адверсариальный «горячий» IP, к которому привязано
+      fan_in доменов; эти связи самые свежие и попадают в любой лимит выборки.
+    ip_offset сдвигает диапазон адресов, чтобы сессии разных размеров не делили IP.
+    """
+    session = ScanSession.objects.create(
+        root_domain=root_domain, depth=3, status='completed', completed_at=timezone.now()
+    )
+
+    regular = max(links - fan_in, 0)
+    domain_count = max(regular // 2, fan_in, 1)
+    ip_count = max(domain_count // 2, 1)
+
+    names = [f'd{i}.g{i % groups}.{root_domain}' for i in range(domain_count)]
+    names += [root_domain] + [f'g{k}.{root_domain}' for k in range(groups)]
+    Domain.objects.bulk_create([Domain(name=n) for n in names], batch_size=BATCH_SIZE, ignore_conflicts=True)
+    domain_ids = _ids_by(Domain, 'name', names)
+    domain_ids = [domain_ids[n] for n in names[:domain_count]]
+
+    base = int(ipaddress.ip_address('10.0.0.0')) + ip_offset
+    addresses = [str(ipaddress.ip_address(base + i)) for i in range(ip_count + 1)]
+    IPAddress.objects.bulk_create(
+        [
+            IPAddress(
+                address=a,
+                cidr=str(ipaddress.ip_network(f'{a}/24', strict=False)),
+                organization=f'ORG-{i // 1024}',
+            )
+            for i, a in enumerate(addresses)
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    address_ids = _ids_by(IPAddress, 'address', addresses)
+    ip_ids = [address_ids[a] for a in addresses[:-1]]
+    hot_ip_id = address_ids[addresses[-1]]
+
+    batch = []
+    pairs = set()
+    for i in range(regular):
+        domain_id = domain_ids[(i // 2) % len(domain_ids)]
+        ip_id = ip_ids[(i * 7 + i // 2) % len(ip_ids)]
+        if (domain_id, ip_id) in pairs:
+            continue
+        pairs.add((domain_id, ip_id))
+        batch.append(Link(scan_session=session, domain_id=domain_id, ip_id=ip_id, method=METHODS[i % len(METHODS)]))
+        if len(batch) >= BATCH_SIZE:
+            Link.objects.bulk_create(batch)
+            batch = []
+    Link.objects.bulk_create(batch)
+
+    if fan_in:
+        Link.objects.bulk_create(
+            [Link(scan_session=session, domain_id=domain_id, ip_id=hot_ip_id, method='dns') for domain_id in domain_ids[:fan_in]],
+            batch_size=BATCH_SIZE,
+        )
+        # discovered_at — auto_now_add, поэтому «свежесть» выставляем отдельным UPDATE
+        Link.objects.filter(scan_session=session, ip_id=hot_ip_id).update(
+            discovered_at=timezone.now() + timedelta(minutes=1)
+        )
+
+    return session
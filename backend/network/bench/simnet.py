@@ -0,0 +1,357 @@
+# backend/network/bench/simnet.py
+
+"""
+Симуляция интернета для офлайн-бенчмарка сканера: синтетическая зона,
+DNS-сервер, ферма TLS-серверов, поддельные crt.sh / RDAP и бинарники nmap / theHarvester.
+"""
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import datetime
+import ipaddress
+import json
+import os
+import socketserver
+import ssl
+import stat
+import sys
+import tempfile
+import threading
+
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.resolver
+import dns.reversename
+import dns.rrset
+
+# Синтетические адреса берем из 127.0.0.0/8: на Linux весь диапазон ведет на loopback
+IP_NETWORK = ipaddress.ip_network('127.64.0.0/12')
+ROOT_DOMAIN = 'sim.test'
+
+
+class SyntheticZone:
+    """
+    Дерево из size доменов с коэффициентом ветвления branching.
+    - Потомки домена лежат в SAN сертификата на его IP, в выдаче theHarvester
+      и (для доменов без A-записи) в crt.sh.
+    - share доменов делят один IP — это дает связи через общий IP.
+    - Каждый cname_every-й домен отвечает цепочкой CNAME → cdn-имя → A.
+    - Каждый no_address_every-й домен не имеет A-записи и раскрывается только через crt.sh.
+    - PTR каждого IP указывает на первый домен на нем.
+    """
+
+    def __init__(self, size: int, branching: int = 4, share: int = 2, cname_every: int = 5, no_address_every: int = 11):
+        self.size = size
+        self.names = []
+        self.children = {}
+        self.addresses = {}
+        self.cnames = {}
+        self.ptr = {}
+
+        hosts = IP_NETWORK.hosts()
+        ip = None
+        for i in range(size):
+            if i == 0:
+                name = ROOT_DOMAIN
+            else:
+                parent = self.names[(i - 1) // branching]
+                name = f'h{i}.{parent}'
+                self.children.setdefault(parent, []).append(name)
+            self.names.append(name)
+
+            if i and i % no_address_every == 0:
+                continue
+            if ip is None or i % share == 0:
+                ip = str(next(hosts))
+                self.ptr[ip] = name
+            if i and i % cname_every == 0:
+                alias = f'cdn{i}.edge.{ROOT_DOMAIN}'
+                self.cnames[name] = alias
+                self.addresses[alias] = ip
+            else:
+                self.addresses[name] = ip
+
+        self.known_names = set(self.names)
+
+        # Имена в сертификате IP: потомки всех доменов, живущих на этом IP
+        self.cert_names = {}
+        for name in self.names:
+            ip = self.address_of(name)
+            if ip:
+                self.cert_names.setdefault(ip, []).extend(self.children.get(name, []))
+
+    def address_of(self, name: str):
+        return self.addresses.get(self.cnames.get(name, name))
+
+    def subnet_of(self, ip: str) -> str:
+        return str(ipaddress.ip_network(f'{ip}/24', strict=False))
+
+    def harvester_hosts(self, domain: str) -> list:
+        hosts = []
+        for child in self.children.get(domain, [])[:2]:
+            ip = self.address_of(child)
+            hosts.append(f'{child}:{ip}' if ip else child)
+        return hosts
+
+    def crtsh_entries(self, domain: str) -> list:
+        return [
+            {'common_name': child, 'name_value': child}
+            for child in self.children.get(domain, [])
+            if child.endswith('.' + domain)
+        ]
+
+    def state(self) -> dict:
+        """Данные, которые нужны поддельным бинарникам в отдельном процессе."""
+        return {
+            'cert_names': self.cert_names,
+            'harvester': {name: self.harvester_hosts(name) for name in self.names},
+        }
+
+
+class _DNSHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        zone = self.server.zone
+        try:
+            query = dns.message.from_wire(data)
+        except Exception:
+            return
+        response = dns.message.make_response(query)
+        question = query.question[0]
+        qname = question.name.to_text().rstrip('.').lower()
+        qtype = question.rdtype
+
+        if qtype == dns.rdatatype.PTR:
+            try:
+                ip = dns.reversename.to_address(question.name)
+            except Exception:
+                ip = None
+            if ip in zone.ptr:
+                response.answer.append(dns.rrset.from_text(question.name, 60, 'IN', 'PTR', zone.ptr[ip] + '.'))
+            else:
+                response.set_rcode(dns.rcode.NXDOMAIN)
+        elif qname in zone.cnames:
+            target = zone.cnames[qname]
+            response.answer.append(dns.rrset.from_text(question.name, 60, 'IN', 'CNAME', target + '.'))
+            if qtype == dns.rdatatype.A:
+                response.answer.append(dns.rrset.from_text(target + '.', 60, 'IN', 'A', zone.addresses[target]))
+        elif qname in zone.addresses:
+            if qtype == dns.rdatatype.A:
+                response.answer.append(dns.rrset.from_text(question.name, 60, 'IN', 'A', zone.addresses[qname]))
+        elif qname not in zone.known_names:
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        sock.sendto(response.to_wire(), self.client_address)
+
+
+class _DNSServer(socketserver.ThreadingUDPServer):
+    daemon_threads = True
+
+
+class _TLSFarm(socketserver.ThreadingTCPServer):
+    """Один слушатель на все адреса; сертификат выбирается по адресу назначения."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, zone, cert_dir, port):
+        self.zone = zone
+        self.cert_dir = cert_dir
+        self.key = ec.generate_private_key(ec.SECP256R1())
+        self.key_path = os.path.join(cert_dir, 'key.pem')
+        with open(self.key_path, 'wb') as f:
+            f.write(self.key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            ))
+        self.contexts = {}
+        self._lock = threading.Lock()
+        # Сертификаты выпускаем заранее, чтобы их генерация не попадала в замер
+        for ip in zone.ptr:
+            self.context_for(ip)
+        super().__init__(('0.0.0.0', port), _TLSHandler)
+
+    def context_for(self, ip: str) -> ssl.SSLContext:
+        with self._lock:
+            if ip not in self.contexts:
+                names = self.zone.cert_names.get(ip) or [self.zone.ptr.get(ip, ROOT_DOMAIN)]
+                cert_path = os.path.join(self.cert_dir, f'{ip}.pem')
+                with open(cert_path, 'wb') as f:
+                    f.write(self._make_cert(names).public_bytes(serialization.Encoding.PEM))
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+                context.load_cert_chain(cert_path, self.key_path)
+                self.contexts[ip] = context
+            return self.contexts[ip]
+
+    def _make_cert(self, names):
+        subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, names[0])])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return (
+            x509.CertificateBuilder()
+            .subject_name(subject)
+            .issuer_name(subject)
+            .public_key(self.key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=30))
+            .add_extension(x509.SubjectAlternativeName([x509.DNSName(n) for n in names]), critical=False)
+            .sign(self.key, hashes.SHA256())
+        )
+
+
+class _TLSHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        ip = self.request.getsockname()[0]
+        try:
+            with self.server.context_for(ip).wrap_socket(self.request, server_side=True) as tls:
+                tls.recv(1)
+        except (ssl.SSLError, OSError):
+            pass
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    """Поддельные crt.sh (/json?q=) и RDAP (/ip/<ip>)."""
+
+    def do_GET(self):
+        zone = self.server.zone
+        url = urlparse(self.path)
+        if url.path == '/json':
+            domain = parse_qs(url.query).get('q', [''])[0]
+            self._send(zone.crtsh_entries(domain))
+        elif url.path.startswith('/ip/'):
+            ip = url.path[len('/ip/'):]
+            network = ipaddress.ip_network(zone.subnet_of(ip))
+            self._send({
+                'objectClassName': 'ip network',
+                'startAddress': str(network.network_address),
+                'endAddress': str(network.broadcast_address),
+                'cidr0_cidrs': [{'v4prefix': str(network.network_address), 'length': network.prefixlen}],
+                'name': f'SIMNET-{network.network_address}',
+            })
+        else:
+            self.send_error(404)
+
+    def _send(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+FAKE_NMAP = '''#!{python} -S
+import ipaddress, json, sys
+args = sys.argv[1:]
+out = args[args.index('-oX') + 1]
+network = ipaddress.ip_network(args[-1], strict=False)
+state = json.load(open({state!r}))
+hosts = []
+for ip, names in state['cert_names'].items():
+    if names and ipaddress.ip_address(ip) in network:
+        alt = ''.join('<elem>%s</elem>' % n for n in names)
+        hosts.append(
+            '<host><address addr="%s"/><ports><port><script id="ssl-cert">'
+            '<elem key="subject"><elem key="commonName">%s</elem></elem>'
+            '<elem key="alternativeNames">%s</elem>'
+            '</script></port></ports></host>' % (ip, names[0], alt)
+        )
+open(out, 'w').write('<nmaprun>%s</nmaprun>' % ''.join(hosts))
+'''
+
+FAKE_HARVESTER = '''#!{python} -S
+import json, sys
+args = sys.argv[1:]
+domain = args[args.index('-d') + 1]
+out = args[args.index('-f') + 1]
+state = json.load(open({state!r}))
+json.dump({{'hosts': state['harvester'].get(domain, [])}}, open(out, 'w'))
+'''
+
+
+class SimulatedInternet:
+    """
+    Поднимает все заглушки для зоны и перенастраивает на них сканер.
+    Используется как контекстный менеджер; при выходе все возвращается как было.
+    """
+
+    def __init__(self, zone: SyntheticZone):
+        self.zone = zone
+        self.workdir = tempfile.mkdtemp(prefix='simnet-')
+        self._threads = []
+        self._saved = {}
+
+    def __enter__(self):
+        from network import scanner, tools
+
+        self.dns_server = _DNSServer(('127.0.0.1', 0), _DNSHandler)
+        self.dns_server.zone = self.zone
+        self.tls_server = _TLSFarm(self.zone, self.workdir, 0)
+        self.http_server = ThreadingHTTPServer(('127.0.0.1', 0), _HTTPHandler)
+        self.http_server.zone = self.zone
+        for server in (self.dns_server, self.tls_server, self.http_server):
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        self._write_binaries()
+
+        resolver = dns.resolver.Resolver(configure=False)
+        resolver.nameservers = ['127.0.0.1']
+        resolver.port = self.dns_server.server_address[1]
+        resolver.lifetime = 2.0
+        http_url = f'http://127.0.0.1:{self.http_server.server_address[1]}'
+
+        self._saved = {
+            'resolver': dns.resolver.default_resolver,
+            'crtsh': tools.CRTSH_URL,
+            'rdap': tools.RDAP_URL,
+            'sleep': tools.DEFAULT_SLEEP,
+            'tls_port': scanner.InternetMapScanner.tls_port,
+            'path': os.environ.get('PATH', ''),
+            'cwd': os.getcwd(),
+        }
+        dns.resolver.default_resolver = resolver
+        tools.CRTSH_URL = f'{http_url}/json'
+        tools.RDAP_URL = http_url
+        # Пауза вежливости нужна настоящему crt.sh, но не заглушке
+        tools.DEFAULT_SLEEP = 0
+        scanner.InternetMapScanner.tls_port = self.tls_server.server_address[1]
+        os.environ['PATH'] = os.path.join(self.workdir, 'bin') + os.pathsep + self._saved['path']
+        # Кэш crt.sh пишется относительно текущего каталога — держим его во временном
+        os.chdir(self.workdir)
+        return self
+
+    def __exit__(self, *exc):
+        from network import scanner, tools
+
+        dns.resolver.default_resolver = self._saved['resolver']
+        tools.CRTSH_URL = self._saved['crtsh']
+        tools.RDAP_URL = self._saved['rdap']
+        tools.DEFAULT_SLEEP = self._saved['sleep']
+        scanner.InternetMapScanner.tls_port = self._saved['tls_port']
+        os.environ['PATH'] = self._saved['path']
+        os.chdir(self._saved['cwd'])
+        for server in (self.dns_server, self.tls_server, self.http_server):
+            server.shutdown()
+            server.server_close()
+        return False
+
+    def _write_binaries(self):
+        bin_dir = os.path.join(self.workdir, 'bin')
+        os.makedirs(bin_dir, exist_ok=True)
+        state_path = os.path.join(self.workdir, 'state.json')
+        with open(state_path, 'w') as f:
+            json.dump(self.zone.state(), f)
+        for name, template in (('nmap', FAKE_NMAP), ('theHarvester', FAKE_HARVESTER)):
+            path = os.path.join(bin_dir, name)
+            with open(path, 'w') as f:
+                f.write(template.format(python=sys.executable, state=state_path))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
@@ -0,0 +1,240 @@
+# backend/network/caches.py
+
+"""
+Кэши процесса воркера: общие для всех сканеров, запущенных в одном процессе.
+
+Каждая задача создает новый InternetMapScanner, и без общих кэшей все, что узнал
+предыдущий скан (разрешенные имена, сети RDAP, сертификаты, pk доменов и IP),
+выбрасывается. Кэши ограничены по числу записей (LRU) и по времени жизни записи.
+
+Кэши включаются только в процессах воркера Celery (сигнал worker_process_init):
+в тестах и runserver сканер работает как раньше, без состояния между запусками.
+Размеры и TTL — settings.WORKER_CACHES.
+"""
+
+from collections import OrderedDict
+from .metrics import Counter, Gauge
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Значения по умолчанию, если в settings.WORKER_CACHES нет записи для кэша
+DEFAULT_MAXSIZE = 10000
+DEFAULT_TTL = 3600
+# Время жизни пустого ответа (нет адресов, сертификата, PTR): чаще всего это таймаут
+# или временный сбой, и держать его весь ttl нельзя. 0 — пустые ответы не кэшируются
+DEFAULT_NEGATIVE_TTL = 60
+# Сколько последних доменов и IP загружается из базы при старте воркера
+DEFAULT_WARM_LIMIT = 50000
+
+MISSING = object()
+
+WORKER_CACHE_LOOKUPS = Counter(
+    'internetmap_worker_cache_lookups_total',
+    'Обращения к кэшам процесса воркера',
+    ('cache', 'result'),
+)
+WORKER_CACHE_EVICTIONS = Counter(
+    'internetmap_worker_cache_evictions_total',
+    'Записи, вытесненные из кэшей воркера по размеру (lru) или по времени жизни (ttl)',
+    ('cache', 'reason'),
+)
+WORKER_CACHE_ENTRIES = Gauge(
+    'internetmap_worker_cache_entries',
+    'Текущее число записей в кэшах воркера',
+    ('cache',),
+)
+
+
+class TTLCache:
+    """
+    LRU-кэш с ограничением размера и временем жизни записи. Потокобезопасен.
+    Просроченные записи удаляются при обращении к ним и при вытеснении.
+    negative_ttl — время жизни пустых ответов для тех, кто кэширует через set_result.
+    """
+
+    def __init__(self, name: str, maxsize: int = DEFAULT_MAXSIZE, ttl: float = DEFAULT_TTL,
+                 negative_ttl: float = DEFAULT_NEGATIVE_TTL, clock=time.monotonic):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is not MISSING and entry[1] <= self._clock():
+                del self._data[key]
+                WORKER_CACHE_EVICTIONS.inc(cache=self.name, reason='ttl')
+                entry = MISSING
+            if entry is MISSING:
+                self.misses += 1
+                result = 'miss'
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+                result = 'hit'
+            size = len(self._data)
+        WORKER_CACHE_LOOKUPS.inc(cache=self.name, result=result)
+        WORKER_CACHE_ENTRIES.set(size, cache=self.name)
+        return default if entry is MISSING else entry[0]
+
+    def set(self, key, value, ttl: float = None):
+        expires = self._clock() + (self.ttl if ttl is None else ttl)
+        evicted = 0
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+            size = len(self._data)
+        if evicted:
+            WORKER_CACHE_EVICTIONS.inc(evicted, cache=self.name, reason='lru')
+        WORKER_CACHE_ENTRIES.set(size, cache=self.name)
+
+    def set_result(self, key, value):
+        """Результат сетевого вызова: пустой живет negative_ttl (0 — не кэшируется), остальные — ttl."""
+        if value:
+            self.set(key, value)
+        elif self.negative_ttl:
+            self.set(key, value, ttl=self.negative_ttl)
+
+    def update(self, items, ttl: float = None):
+        for key, value in items:
+            self.set(key, value, ttl)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+        WORKER_CACHE_ENTRIES.set(0, cache=self.name)
+
+    def info(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data), 'maxsize': self.maxsize, 'ttl': self.ttl,
+            'hits': self.hits, 'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+class NullCache:
+    """Кэш, который ничего не хранит: используется, пока кэши процесса не включены."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __len__(self):
+        return 0
+
+    def get(self, key, default=None):
+        return default
+
+    def set(self, key, value, ttl: float = None):
+        pass
+
+    def set_result(self, key, value):
+        pass
+
+    def update(self, items, ttl: float = None):
+        pass
+
+    def discard(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+_registry = {}
+_lock = threading.Lock()
+
+
+def _config() -> dict:
+    from django.conf import settings
+    return getattr(settings, 'WORKER_CACHES', {})
+
+
+def activate():
+    """Включает кэши процесса по settings.WORKER_CACHES. Повторный вызов ничего не меняет."""
+    with _lock:
+        for name, options in _config().items():
+            if name not in _registry:
+                _registry[name] = TTLCache(
+                    name, maxsize=options.get('maxsize', DEFAULT_MAXSIZE), ttl=options.get('ttl', DEFAULT_TTL),
+                    negative_ttl=options.get('negative_ttl', DEFAULT_NEGATIVE_TTL),
+                )
+
+
+def deactivate():
+    """Выключает кэши процесса (для тестов)."""
+    with _lock:
+        for cache in _registry.values():
+            cache.clear()
+        _registry.clear()
+
+
+def is_active() -> bool:
+    return bool(_registry)
+
+
+def get_cache(name: str):
+    """Кэш процесса по имени; NullCache — кэши не включены или такого нет в настройках."""
+    cache = _registry.get(name)
+    return NullCache(name) if cache is None else cache
+
+
+def cache_info() -> dict:
+    """Размер и доля попаданий по каждому кэшу процесса."""
+    return {name: cache.info() for name, cache in sorted(_registry.items())}
+
+
+def warm_from_db(limit: int = None):
+    """
+    Прогревает кэши из базы: pk последних доменов и IP и известные сети RDAP.
+    DNS и TLS не прогреваются — сохраненные связи для них слишком быстро устаревают.
+    """
+    from django.conf import settings
+    from .models import Domain, IPAddress
+
+    if not is_active():
+        return
+    if limit is None:
+        limit = getattr(settings, 'WORKER_CACHE_WARM_LIMIT', DEFAULT_WARM_LIMIT)
+    started = time.perf_counter()
+    # Выбираем самые новые, а кладем от старых к новым: при переполнении LRU вытеснит старые
+    domains = Domain.objects.order_by('-id').values_list('name', 'id')[:limit]
+    get_cache('domain_pk').update(reversed(list(domains)))
+    ips = IPAddress.objects.order_by('-id').values_list('address', 'id')[:limit]
+    get_cache('ip_pk').update(reversed(list(ips)))
+    networks = (
+        IPAddress.objects.filter(cidr__isnull=False).exclude(cidr='')
+        .order_by('-id').values_list('address', 'cidr', 'organization')[:limit]
+    )
+    get_cache('rdap').update((address, (cidr, organization)) for address, cidr, organization in reversed(list(networks)))
+    logger.info(f"Кэши воркера прогреты за {time.perf_counter() - started:.2f} с: "
+                f"{ {name: info['size'] for name, info in cache_info().items()} }")
+
+
+def invalidate_domain(sender, instance, **kwargs):
+    get_cache('domain_pk').discard(instance.name)
+
+
+def invalidate_ip(sender, instance, **kwargs):
+    get_cache('ip_pk').discard(instance.address)
+    get_cache('rdap').discard(instance.address)
@@ -0,0 +1,252 @@
+# backend/network/clusters.py
+
+"""
+Кластеры графа сессии для просмотра с уровнем детализации.
+
+Домены сворачиваются в кластеры по регистрируемому домену, IP — по подсети
+(IPAddress.cidr) или по организации. Агрегаты считаются по всем связям сессии
+(без лимита графа) и для завершенной сессии хранятся в SessionGraph.clusters:
+клиент получает обзор из ограниченного числа кластеров и раскрывает нужные по запросу.
+"""
+
+from django.db.models import Q
+from .storage import session_links
+from . import psl
+import numpy as np
+
+# Группировки IP-адресов: поле IPAddress, по которому строится кластер
+IP_GROUPINGS = {
+    'subnet': 'ip__cidr',
+    'organization': 'ip__organization',
+}
+DEFAULT_IP_GROUPING = 'subnet'
+# Сколько кластеров (или членов раскрытого кластера) на сторону отдается за один запрос
+DEFAULT_CLUSTER_LIMIT = 50
+MAX_CLUSTER_LIMIT = 500
+# Кластер, в который сворачиваются все, что не вошло в лимит
+OTHER_KEY = '*'
+
+
+def cluster_id(kind, key):
+    return f'c-{kind}:{key}'
+
+
+def parse_cluster_id(value):
+    """'c-subnet:10.0.0.0/24' -> ('subnet', '10.0.0.0/24'); ValueError — не id кластера."""
+    if not value.startswith('c-') or ':' not in value:
+        raise ValueError(f'Некорректный id кластера: {value}')
+    kind, key = value[2:].split(':', 1)
+    if kind != 'domain' and kind not in IP_GROUPINGS:
+        raise ValueError(f'Неизвестный тип кластера: {kind}')
+    return kind, key
+
+
+def domain_cluster_keys(names):
+    """Ключи кластеров доменов: регистрируемый домен по PSL, для публичных суффиксов — само имя."""
+    return [base or name for name, base in zip(names, psl.registrable_domains(names))]
+
+
+def _factorize(values):
+    """Уникальные значения (списком str) и код каждого элемента."""
+    uniques, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return uniques.tolist(), codes.ravel()
+
+
+def _count_distinct(groups, members, size):
+    """Число разных members в каждой группе."""
+    pairs = np.unique(groups.astype(np.int64) * (members.max() + 1) + members)
+    return np.bincount(pairs // (members.max() + 1), minlength=size)
+
+
+def compute_cluster_aggregates(session):
+    """
+    Агрегаты кластеров по всем связям сессии.
+    {'domain': [[key, domains, ips, links], ...],
+     'subnet': {'clusters': [[key, ips, domains, links], ...], 'edges': [[domain_idx, ip_idx, links], ...]},
+     'organization': {...}}
+    Кластеры отсортированы по числу связей по убыванию.
+    """
+    rows = list(
+        session_links(session).values_list('domain_id', 'domain__name', 'ip_id', *IP_GROUPINGS.values())
+    )
+    aggregates = {'domain': []}
+    aggregates.update({grouping: {'clusters': [], 'edges': []} for grouping in IP_GROUPINGS})
+    if not rows:
+        return aggregates
+
+    columns = list(zip(*rows))
+    domain_ids = np.array(columns[0], dtype=np.int64)
+    ip_ids = np.array(columns[2], dtype=np.int64)
+    names, name_codes = _factorize(columns[1])
+    domain_keys, domain_clusters = _factorize(domain_cluster_keys(names))
+    domain_clusters = domain_clusters[name_codes]
+
+    # Кластеры доменов: сортировка по числу связей, чтобы обзор брал самые «тяжелые»
+    domain_links = np.bincount(domain_clusters, minlength=len(domain_keys))
+    domain_rank = np.argsort(-domain_links, kind='stable')
+    domain_position = np.empty_like(domain_rank)
+    domain_position[domain_rank] = np.arange(len(domain_rank))
+    domain_counts = _count_distinct(domain_clusters, domain_ids, len(domain_keys))
+    domain_ip_counts = _count_distinct(domain_clusters, ip_ids, len(domain_keys))
+    aggregates['domain'] = [
+        [domain_keys[i], int(domain_counts[i]), int(domain_ip_counts[i]), int(domain_links[i])]
+        for i in domain_rank.tolist()
+    ]
+
+    for offset, grouping in enumerate(IP_GROUPINGS):
+        ip_keys, ip_clusters = _factorize([value or '' for value in columns[3 + offset]])
+        ip_links = np.bincount(ip_clusters, minlength=len(ip_keys))
+        ip_rank = np.argsort(-ip_links, kind='stable')
+        ip_position = np.empty_like(ip_rank)
+        ip_position[ip_rank] = np.arange(len(ip_rank))
+        ip_counts = _count_distinct(ip_clusters, ip_ids, len(ip_keys))
+        ip_domain_counts = _count_distinct(ip_clusters, domain_ids, len(ip_keys))
+
+        edge_keys, edge_links = np.unique(
+            domain_position[domain_clusters].astype(np.int64) * len(ip_keys) + ip_position[ip_clusters],
+            return_counts=True,
+        )
+        aggregates[grouping] = {
+            'clusters': [
+                [ip_keys[i], int(ip_counts[i]), int(ip_domain_counts[i]), int(ip_links[i])]
+                for i in ip_rank.tolist()
+            ],
+            'edges': np.column_stack([edge_keys // len(ip_keys), edge_keys % len(ip_keys), edge_links]).tolist(),
+        }
+    return aggregates
+
+
+def _domain_cluster_node(key, domains, ips, links):
+    return {
+        'id': cluster_id('domain', key), 'label': key if key != OTHER_KEY else 'other domains',
+        'type': 'cluster', 'kind': 'domain', 'domains': domains, 'ips': ips, 'links': links,
+    }
+
+
+def _ip_cluster_node(grouping, key, ips, domains, links):
+    label = key or 'Unknown'
+    if key == OTHER_KEY:
+        label = f'other {grouping}s'
+    return {
+        'id': cluster_id(grouping, key), 'label': label,
+        'type': 'cluster', 'kind': grouping, 'domains': domains, 'ips': ips, 'links': links,
+    }
+
+
+def _aggregate_edge(source, target, links):
+    return {'id': f'agg_{source}_{target}', 'source': source, 'target': target,
+            'type': 'aggregate', 'label': f'{links} links', 'weight': links}
+
+
+def _collapse(rows, limit):
+    """
+    Первые limit кластеров (rows отсортированы по связям) и один кластер «остальные».
+    Счетчики «остальных» — суммы, поэтому для разных элементов это оценка сверху.
+    Возвращает (видимые строки, отображение индекса строки -> индекс видимой).
+    """
+    if len(rows) <= limit:
+        return rows, np.arange(len(rows))
+    visible = rows[:limit - 1]
+    rest = np.array([row[1:] for row in rows[limit - 1:]], dtype=np.int64).sum(0).tolist()
+    visible = visible + [[OTHER_KEY, *rest]]
+    mapping = np.minimum(np.arange(len(rows)), limit - 1)
+    return visible, mapping
+
+
+def cluster_overview(aggregates, grouping=DEFAULT_IP_GROUPING, limit=DEFAULT_CLUSTER_LIMIT):
+    """Обзор: не больше limit кластеров на сторону и агрегированные ребра между ними."""
+    domain_rows, domain_map = _collapse(aggregates['domain'], limit)
+    ip_rows, ip_map = _collapse(aggregates[grouping]['clusters'], limit)
+    nodes = [_domain_cluster_node(*row) for row in domain_rows]
+    nodes += [_ip_cluster_node(grouping, *row) for row in ip_rows]
+
+    edges = []
+    raw = np.array(aggregates[grouping]['edges'], dtype=np.int64).reshape(-1, 3)
+    if len(raw):
+        keys, inverse = np.unique(domain_map[raw[:, 0]] * len(ip_rows) + ip_map[raw[:, 1]], return_inverse=True)
+        weights = np.bincount(inverse.ravel(), weights=raw[:, 2]).astype(np.int64)
+        for key, weight in zip(keys.tolist(), weights.tolist()):
+            source = nodes[key // len(ip_rows)]['id']
+            target = nodes[len(domain_rows) + key % len(ip_rows)]['id']
+            edges.append(_aggregate_edge(source, target, weight))
+
+    return {
+        'level': 'overview', 'grouping': grouping, 'nodes': nodes, 'edges': edges,
+        'summary': {
+            'domain_clusters': len(aggregates['domain']),
+            'ip_clusters': len(aggregates[grouping]['clusters']),
+            'domains': sum(row[1] for row in aggregates['domain']),
+            'links': sum(row[3] for row in aggregates['domain']),
+        },
+    }
+
+
+def expand_cluster(session, value, grouping=DEFAULT_IP_GROUPING, limit=DEFAULT_CLUSTER_LIMIT):
+    """
+    Раскрытие кластера: его члены (до limit, самые связанные) и агрегированные ребра
+    от каждого члена к кластерам другой стороны (тоже не больше limit).
+    """
+    kind, key = parse_cluster_id(value)
+    links = session_links(session)
+    if kind == 'domain':
+        links = links.filter(Q(domain__name=key) | Q(domain__name__endswith=f'.{key}'))
+        rows = list(links.values_list('domain_id', 'domain__name', IP_GROUPINGS[grouping]))
+        rows = [
+            (domain_id, name, cluster_id(grouping, other or ''))
+            for (domain_id, name, other), name_key in zip(rows, domain_cluster_keys([row[1] for row in rows]))
+            if name_key == key
+        ]
+        member_prefix, member_type, other_kind = 'd', 'domain', grouping
+    else:
+        field = IP_GROUPINGS[kind]
+        links = links.filter(Q(**{f'{field}__isnull': True}) | Q(**{field: ''})) if key == '' else links.filter(**{field: key})
+        rows = list(links.values_list('ip_id', 'ip__address', 'domain__name'))
+        rows = [
+            (ip_id, address, cluster_id('domain', name_key))
+            for (ip_id, address, _), name_key in zip(rows, domain_cluster_keys([row[2] for row in rows]))
+        ]
+        member_prefix, member_type, other_kind = 'ip', 'ip', 'domain'
+
+    if not rows:
+        return None
+
+    member_ids, labels, others = (np.array(column, dtype=object) for column in zip(*rows))
+    members, member_codes, member_links = np.unique(member_ids.astype(np.int64), return_inverse=True, return_counts=True)
+    member_codes = member_codes.ravel()
+    member_labels = dict(zip(member_ids.tolist(), labels.tolist()))
+    other_keys, other_codes = _factorize(others)
+    other_links = np.bincount(other_codes, minlength=len(other_keys))
+
+    # Ограничиваем обе стороны: лишние члены отбрасываются, лишние соседи — в «остальные»
+    member_rank = np.argsort(-member_links, kind='stable')[:limit]
+    other_rank = np.argsort(-other_links, kind='stable')
+    other_slot = np.empty_like(other_rank)
+    other_slot[other_rank] = np.minimum(np.arange(len(other_rank)), limit - 1)
+    overflow = len(other_rank) > limit
+    other_id = cluster_id(other_kind, OTHER_KEY)
+
+    nodes = [
+        {'id': f'{member_prefix}-{members[i]}', 'label': member_labels[int(members[i])], 'type': member_type,
+         'cluster': value, 'links': int(member_links[i])}
+        for i in member_rank.tolist()
+    ]
+    neighbour_ids = [
+        other_keys[other_rank[slot]] if not (overflow and slot == limit - 1) else other_id
+        for slot in range(min(len(other_rank), limit))
+    ]
+    for neighbour in neighbour_ids:
+        neighbour_key = parse_cluster_id(neighbour)[1]
+        label = 'other' if neighbour_key == OTHER_KEY else neighbour_key or 'Unknown'
+        nodes.append({'id': neighbour, 'label': label, 'type': 'cluster', 'kind': other_kind})
+
+    kept = np.isin(member_codes, member_rank)
+    keys, counts = np.unique(member_codes[kept] * limit + other_slot[other_codes[kept]], return_counts=True)
+    edges = [
+        _aggregate_edge(f'{member_prefix}-{members[key // limit]}', neighbour_ids[key % limit], count)
+        for key, count in zip(keys.tolist(), counts.tolist())
+    ]
+
+    return {
+        'level': 'cluster', 'cluster': value, 'grouping': grouping, 'nodes': nodes, 'edges': edges,
+        'summary': {'members': len(members), 'shown': len(member_rank), 'truncated': len(members) - len(member_rank)},
+    }
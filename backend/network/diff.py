@@ -0,0 +1,75 @@
+# backend/network/diff.py
+
+"""
+Разница между двумя сессиями: какие домены, IP и связи появились и исчезли.
+
+Множества сравниваются в базе анти-соединениями (NOT EXISTS) поверх session_links(),
+поэтому сессии могут лежать в разных хранилищах (Link или Edge), а в память
+не загружается ни одна сессия целиком: строки читаются курсором кусками
+и сразу отдаются потребителю. Связь сравнивается по (домен, IP, метод).
+"""
+
+from django.db.models import Exists, OuterRef
+from .models import Domain, Edge, IPAddress
+from .storage import session_links
+import json
+
+# Сколько строк курсор забирает из базы за раз
+CHUNK_SIZE = 2000
+
+
+def _links(session):
+    return session_links(session).order_by()
+
+
+def _missing_links(session, other):
+    """Связи session, которых нет в other."""
+    links, other_links = _links(session), _links(other)
+    if other_links.model is Edge:
+        # Одна Edge на (домен, IP, метод): множество id other считается один раз,
+        # связь session находит свою Edge по уникальному ключу
+        other_ids = other_links.values('id')
+        if links.model is Edge:
+            return links.exclude(id__in=other_ids)
+        same = Edge.objects.filter(id__in=other_ids)
+    else:
+        same = other_links
+    same = same.filter(domain_id=OuterRef('domain_id'), ip_id=OuterRef('ip_id'), method=OuterRef('method'))
+    return links.exclude(Exists(same))
+
+
+def _missing(model, field, session, other):
+    """
+    Домены или IP (field — domain_id / ip_id в связях), которые есть в session и нет в other.
+    IN / NOT IN по подзапросам, а не коррелированный EXISTS: подзапрос вычисляется один раз,
+    а EXISTS по ip_id не покрыт индексом (scan_session, domain, ip) и перебирает всю сессию.
+    """
+    return model.objects.filter(pk__in=_links(session).values(field)).exclude(pk__in=_links(other).values(field)).order_by()
+
+
+def iter_session_diff(old, new):
+    """
+    Записи разницы old -> new по одной: {'op': 'added'|'removed', 'kind': 'domain'|'ip'|'link', ...}.
+    Последняя запись — {'op': 'summary', ...} с количествами по каждому виду.
+    """
+    counts = {}
+    for op, (source, other) in (('added', (new, old)), ('removed', (old, new))):
+        for kind, model, field, value in (('domain', Domain, 'domain_id', 'name'), ('ip', IPAddress, 'ip_id', 'address')):
+            count = 0
+            for name in _missing(model, field, source, other).values_list(value, flat=True).iterator(chunk_size=CHUNK_SIZE):
+                count += 1
+                yield {'op': op, 'kind': kind, 'value': name}
+            counts[f'{kind}s_{op}'] = count
+        count = 0
+        rows = _missing_links(source, other).values_list('domain__name', 'ip__address', 'method')
+        for domain, ip, method in rows.iterator(chunk_size=CHUNK_SIZE):
+            count += 1
+            yield {'op': op, 'kind': 'link', 'domain': domain, 'ip': ip, 'method': method}
+        counts[f'links_{op}'] = count
+    yield {'op': 'summary', 'from': old.id, 'to': new.id, **counts}
+
+
+def iter_session_diff_ndjson(old, new):
+    """iter_session_diff в виде строк NDJSON для StreamingHttpResponse."""
+    for record in iter_session_diff(old, new):
+        yield json.dumps(record, ensure_ascii=False) + '\n'
@@ -0,0 +1,282 @@
+# backend/network/enrichment.py
+
+"""
+Обогащение IP данными RDAP (сеть и организация) отдельно от обхода.
+
+Запросы выполняются в пуле потоков под общим ограничением частоты, обход
+в это время продолжается. IP, попадающие в уже известную сеть, новых запросов
+не порождают: на одну /24 в полете не больше одного запроса, остальные адреса
+ждут его ответа и проверяются на вхождение в полученную сеть. Сети, сохраненные
+в прошлых сканах (IPAddress.network), ищутся в базе запросом вхождения.
+
+Потоки только ходят в RDAP; запись в базу (bulk_update) делает тот, кто
+забирает результаты через poll(), — соединения Django привязаны к потоку.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from .caches import MISSING, get_cache, is_active as caches_active
+from .fields import parse_network, primary_network
+from .models import IPAddress
+from . import tools
+import ipaddress
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+# RDAP-запросов в секунду на один обогатитель (реестры ограничивают частоту по IP клиента)
+DEFAULT_RATE_LIMIT = 5.0
+# Адреса группируются по этой длине префикса, пока их настоящая сеть неизвестна
+GROUP_PREFIX = {4: 24, 6: 48}
+UPDATE_BATCH_SIZE = 500
+
+
+class RateLimiter:
+    """Не чаще rate вызовов wait() в секунду на все потоки вместе; rate 0/None — без ограничения."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _networks(cidr):
+    """Сети из ответа RDAP: cidr бывает списком через запятую (диапазон, свернутый в сети)."""
+    networks = []
+    for part in (cidr or '').split(','):
+        try:
+            networks.append(ipaddress.ip_network(part.strip(), strict=False))
+        except ValueError:
+            continue
+    return networks
+
+
+def _group_key(address: str):
+    ip = ipaddress.ip_address(address)
+    return ipaddress.ip_network(f'{address}/{GROUP_PREFIX[ip.version]}', strict=False)
+
+
+class RdapEnricher:
+    """
+    Очередь RDAP-запросов по IP. submit() не блокирует; poll() отдает готовые
+    результаты [(address, cidr, organization, context)] в порядке постановки.
+    context — произвольное значение вызывающего (pk, глубина обхода), возвращается как есть.
+    Неудавшийся запрос дает cidr и organization None.
+    cache — кэш ответов вместо кэша процесса 'rdap' (общий кэш пакетного скана).
+    """
+
+    def __init__(self, max_workers: int = None, rate: float = None, stats=None, cache=None):
+        if max_workers is None:
+            max_workers = getattr(settings, 'RDAP_MAX_WORKERS', DEFAULT_MAX_WORKERS)
+        if rate is None:
+            rate = getattr(settings, 'RDAP_RATE_LIMIT', DEFAULT_RATE_LIMIT)
+        self.stats = stats
+        self.lookups = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='rdap')
+        self._limiter = RateLimiter(rate)
+        self._cache = get_cache('rdap') if cache is None else cache
+        # Сети из уже полученных ответов: длина префикса -> {сеть: (cidr, organization)}
+        self._known = {}
+        # Запрос в полете по группе /24: следующие адреса группы ждут его
+        self._inflight = {}
+        # (address, context, future, result); future None — ответ уже известен и лежит в result
+        self._pending = deque()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _lookup(self, address: str):
+        self._limiter.wait()
+        if self.stats is None:
+            return tools.rdap_lookup(address)
+        with self.stats.stage('rdap'):
+            return tools.rdap_lookup(address)
+
+    def _known_network(self, address: str):
+        ip = ipaddress.ip_address(address)
+        for prefix, networks in self._known.items():
+            if prefix > ip.max_prefixlen:
+                continue
+            found = networks.get(ipaddress.ip_network(f'{address}/{prefix}', strict=False))
+            if found:
+                return found
+        return None
+
+    def _stored_network(self, address: str):
+        """
+        (cidr, organization) самой узкой сохраненной сети, содержащей address:
+        сосед по сети уже обогащен в прошлых сканах — запрос в RDAP не нужен.
+        """
+        rows = list(IPAddress.objects.filter(network__net_contains=address).values_list('network', 'cidr', 'organization'))
+        if not rows:
+            return None
+        _, cidr, organization = max(rows, key=lambda row: parse_network(row[0]).prefixlen)
+        self._remember(cidr, organization)
+        return cidr, organization
+
+    def _remember(self, cidr, organization):
+        for network in _networks(cidr):
+            self._known.setdefault(network.prefixlen, {})[network] = (cidr, organization)
+
+    def _start(self, address: str):
+        key = _group_key(address)
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._inflight[key] = self._executor.submit(self._lookup, address)
+            future.address = address
+            self.lookups += 1
+        return future
+
+    def submit(self, address: str, context=None):
+        cached = self._cache.get(address, MISSING)
+        if self.stats is not None and caches_active():
+            self.stats.cache('rdap', hit=cached is not MISSING)
+        if cached is MISSING:
+            cached = self._known_network(address)
+        if cached is None and _group_key(address) not in self._inflight:
+            cached = self._stored_network(address)
+        if cached is not None:
+            self._pending.append((address, context, None, cached))
+        else:
+            self._pending.append((address, context, self._start(address), None))
+
+    def poll(self, block: bool = False):
+        """
+        Готовые результаты с головы очереди. block=True ждет, пока не будет готов
+        хотя бы один; пустой список при block=True — очередь исчерпана.
+        """
+        ready = []
+        while self._pending:
+            address, context, future, result = self._pending[0]
+            if future is not None:
+                if not future.done():
+                    if ready or not block:
+                        break
+                    wait([future], return_when=FIRST_COMPLETED)
+                result = self._finish(address, future)
+                if result is MISSING:
+                    # Адрес ждал чужой запрос своей /24, но в ее сеть не попал — нужен свой
+                    self._pending.popleft()
+                    self._pending.append((address, context, self._start(address), None))
+                    continue
+            self._pending.popleft()
+            ready.append((address, result[0], result[1], context))
+        return ready
+
+    def _finish(self, address: str, future):
+        """(cidr, organization) для address по завершенному future; MISSING — нужен свой запрос."""
+        key = _group_key(future.address)
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        try:
+            result = tuple(future.result())
+        except Exception as e:
+            if future.address == address:
+                logger.warning(f"RDAP для {address} не получен: {e}")
+                return None, None
+            return MISSING
+        if future.address == address:
+            self._remember(*result)
+            self._cache.set(address, result)
+            return result
+        if not getattr(future, 'remembered', False):
+            # Ответ лидера группы еще не учтен (лидер стоит в очереди дальше)
+            self._remember(*result)
+            future.remembered = True
+        ip = ipaddress.ip_address(address)
+        if any(ip in network for network in _networks(result[0])):
+            self._cache.set(address, result)
+            return result
+        return MISSING
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._pending.clear()
+        self._inflight.clear()
+
+
+def save_enrichment(results, pk_of):
+    """
+    Пишет результаты poll() в IPAddress одним bulk_update.
+    pk_of(address, context) — pk строки; адреса без ответа RDAP пропускаются.
+    """
+    rows = [
+        IPAddress(
+            pk=pk_of(address, context), cidr=cidr, organization=organization,
+            network=primary_network(address, cidr),
+        )
+        for address, cidr, organization, context in results if cidr is not None
+    ]
+    if rows:
+        IPAddress.objects.bulk_update(rows, ['cidr', 'network', 'organization'], batch_size=UPDATE_BATCH_SIZE)
+    return len(rows)
+
+
+def _mark_checked(pks):
+    """Отмечает попытку RDAP по адресам, чем бы она ни кончилась."""
+    pks = list(pks)
+    now = timezone.now()
+    for start in range(0, len(pks), UPDATE_BATCH_SIZE):
+        IPAddress.objects.filter(pk__in=pks[start:start + UPDATE_BATCH_SIZE]).update(rdap_checked_at=now)
+
+
+def enrich_ips(queryset, max_workers: int = None, rate: float = None) -> int:
+    """
+    Обогащает IP из queryset (обычно — без cidr) и возвращает число обновленных строк.
+    У всех отправленных адресов отмечается rdap_checked_at — и у тех, по которым ответа нет.
+    """
+    enricher = RdapEnricher(max_workers=max_workers, rate=rate)
+    submitted = []
+    try:
+        for pk, address in queryset.values_list('id', 'address'):
+            enricher.submit(address, pk)
+            submitted.append(pk)
+        updated = 0
+        while True:
+            results = enricher.poll(block=True)
+            if not results:
+                break
+            updated += save_enrichment(results, lambda address, pk: pk)
+    finally:
+        enricher.close()
+        _mark_checked(submitted)
+    logger.info(f"RDAP-обогащение: обновлено {updated} IP, запросов {enricher.lookups}")
+    return updated
+
+
+def enrich_pending_ips(limit: int) -> int:
+    """
+    Фоновое обогащение IP без сети: сначала ни разу не проверенные, потом — давно проверенные.
+    Адреса вне глобального пространства (частные, зарезервированные) RDAP не знает:
+    они не запрашиваются, а только отмечаются как проверенные.
+    """
+    candidates = list(
+        IPAddress.objects.filter(cidr__isnull=True)
+        .order_by(F('rdap_checked_at').asc(nulls_first=True), '-id')
+        .values_list('id', 'address')[:limit]
+    )
+    public, skipped = [], []
+    for pk, address in candidates:
+        (public if ipaddress.ip_address(address).is_global else skipped).append(pk)
+    _mark_checked(skipped)
+    if skipped:
+        logger.info(f"RDAP-обогащение: пропущено {len(skipped)} неглобальных IP")
+    if not public:
+        return 0
+    return enrich_ips(IPAddress.objects.filter(pk__in=public))
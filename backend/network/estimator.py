@@ -0,0 +1,158 @@
+# backend/network/estimator.py
+
+from django.conf import settings
+from django.db.models import Count
+from .models import IPAddress, ScanSession
+from .storage import session_links
+from .tools import iter_cached_crtsh_names
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько новых доменов в среднем дает один обработанный домен, если истории нет
+DEFAULT_BRANCHING = 8
+# Средние значения, если по корню еще не было сканов
+DEFAULT_IPS_PER_DOMAIN = 1.5
+DEFAULT_CIDRS_PER_DOMAIN = 0.2
+# Адресов в подсети /24, которую проходит nmap
+SUBNET_PROBES = 256
+
+# Примерное время одной пробы по этапам, секунды
+STAGE_SECONDS = {
+    'dns': 0.1,
+    'reverse_dns': 0.1,
+    'tls': 0.5,
+    'rdap': 1.0,
+    'harvester': 60.0,
+    'nmap': 120.0,
+}
+
+
+def _collect_signals(root_domain: str) -> dict:
+    """Дешевые сигналы о размере графа: кэш crt.sh и история прошлых сканов."""
+    signals = {
+        'crtsh_names': None,
+        'history_session_id': None,
+        'history_depth': None,
+        'history_domains': None,
+        'history_links': None,
+        'known_cidrs': 0,
+    }
+
+    # Кэш crt.sh читается потоком: имена считаются, файл целиком в память не грузится
+    cached_names = iter_cached_crtsh_names(root_domain)
+    if cached_names is not None:
+        signals['crtsh_names'] = sum(1 for _ in cached_names)
+
+    previous = ScanSession.objects.filter(
+        root_domain=root_domain,
+        status='completed'
+    ).order_by('-depth', '-created_at').first()
+    if previous:
+        history = session_links(previous).aggregate(
+            links=Count('id'),
+            domains=Count('domain', distinct=True),
+        )
+        signals['history_session_id'] = previous.id
+        signals['history_depth'] = previous.depth
+        signals['history_domains'] = history['domains']
+        signals['history_links'] = history['links']
+
+    # Сети из сессий в обоих хранилищах: свои строки Link и общие Edge корня
+    known = IPAddress.objects.exclude(cidr__isnull=True)
+    signals['known_cidrs'] = len(
+        set(known.filter(domain_links__scan_session__root_domain=root_domain).values_list('cidr', flat=True).distinct())
+        | set(known.filter(edges__intervals__root_domain=root_domain).values_list('cidr', flat=True).distinct())
+    )
+    return signals
+
+
+def _layer_sizes(signals: dict, depth: int) -> list:
+    """Оценка числа доменов на каждом уровне BFS от 0 до depth-1."""
+    history_depth = signals['history_depth']
+    history_domains = signals['history_domains']
+
+    if history_depth and history_domains:
+        # Прошлый скан глубины h нашел D доменов: рост на уровень ~ D^(1/h)
+        growth = max(1.0, history_domains ** (1.0 / history_depth))
+        return [growth ** level for level in range(depth)]
+
+    first_layer = signals['crtsh_names'] or DEFAULT_BRANCHING
+    growth = getattr(settings, 'SCAN_ESTIMATE_GROWTH', DEFAULT_BRANCHING)
+    return [1.0] + [first_layer * growth ** (level - 1) for level in range(1, depth)]
+
+
+def estimate_scan_cost(root_domain: str, depth: int, base_depth: int = 0, signals: dict = None) -> dict:
+    """
+    Предсказывает число сетевых проб и время скана до его запуска.
+    base_depth > 0 — углубление готового скана: считаются только новые уровни.
+    """
+    if signals is None:
+        signals = _collect_signals(root_domain)
+    layers = _layer_sizes(signals, depth)
+    domains = sum(layers[base_depth:])
+
+    ips_per_domain = DEFAULT_IPS_PER_DOMAIN
+    cidrs_per_domain = DEFAULT_CIDRS_PER_DOMAIN
+    if signals['history_domains']:
+        ips_per_domain = max(1.0, signals['history_links'] / signals['history_domains'])
+        cidrs_per_domain = signals['known_cidrs'] / signals['history_domains']
+
+    ips = domains * ips_per_domain
+    subnets = domains * cidrs_per_domain
+    stage_probes = {
+        'dns': domains,
+        'harvester': domains,
+        'reverse_dns': ips,
+        'tls': ips,
+        'rdap': ips,
+        'nmap': subnets,
+    }
+
+    probes = sum(stage_probes.values()) - subnets + subnets * SUBNET_PROBES
+    runtime = sum(STAGE_SECONDS[stage] * count for stage, count in stage_probes.items())
+
+    return {
+        'domain': root_domain,
+        'depth': depth,
+        'base_depth': base_depth,
+        'domains': int(round(domains)),
+        'probes': int(round(probes)),
+        'runtime_seconds': int(round(runtime)),
+        'signals': signals,
+    }
+
+
+def admit_scan(root_domain: str, depth: int, base_depth: int = 0) -> tuple:
+    """
+    Проверяет скан по бюджетам SCAN_BUDGET_MAX_PROBES / SCAN_BUDGET_MAX_RUNTIME.
+    Возвращает (допущенная глубина, оценка); глубина None — скан отклонен.
+    При политике 'downgrade' глубина понижается, пока оценка не уложится в бюджет.
+    """
+    max_probes = getattr(settings, 'SCAN_BUDGET_MAX_PROBES', None)
+    max_runtime = getattr(settings, 'SCAN_BUDGET_MAX_RUNTIME', None)
+    policy = getattr(settings, 'SCAN_BUDGET_POLICY', 'downgrade')
+
+    def within_budget(estimate):
+        if max_probes is not None and estimate['probes'] > max_probes:
+            return False
+        if max_runtime is not None and estimate['runtime_seconds'] > max_runtime:
+            return False
+        return True
+
+    signals = _collect_signals(root_domain)
+    estimate = estimate_scan_cost(root_domain, depth, base_depth, signals)
+    if within_budget(estimate):
+        return depth, estimate
+    if policy != 'downgrade':
+        logger.warning(f"Скан {root_domain} (глубина {depth}) отклонен: оценка {estimate['probes']} проб")
+        return None, estimate
+
+    for lower_depth in range(depth - 1, 0, -1):
+        lower_estimate = estimate_scan_cost(root_domain, lower_depth, min(base_depth, lower_depth), signals)
+        if within_budget(lower_estimate):
+            logger.info(f"Скан {root_domain} понижен с глубины {depth} до {lower_depth} по бюджету")
+            return lower_depth, lower_estimate
+
+    logger.warning(f"Скан {root_domain} не укладывается в бюджет даже на глубине 1")
+    return None, estimate
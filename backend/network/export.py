@@ -0,0 +1,153 @@
+# backend/network/export.py
+
+"""
+Потоковая выгрузка сессии в файлы: CSV, Arrow (IPC/Feather v2) и Parquet.
+
+Каждая таблица (links, domains, ips) читается серверным курсором (QuerySet.iterator)
+кусками по CHUNK_SIZE строк, и каждый кусок сразу превращается в байты: строку CSV,
+RecordBatch Arrow или группу строк Parquet. В памяти не бывает больше одного куска,
+поэтому размер сессии на потребление памяти не влияет, а ответ API начинает отдаваться
+до того, как прочитана вся сессия.
+
+Arrow и Parquet требуют pyarrow (необязательная зависимость, импортируется при вызове);
+CSV работает без нее.
+"""
+
+from .models import Domain, Edge, IPAddress
+from .storage import session_links
+import csv
+import io
+
+# Строк в одном куске: одна порция курсора, один RecordBatch / группа строк Parquet
+CHUNK_SIZE = 50000
+
+TABLES = ('links', 'domains', 'ips')
+FORMATS = {
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Колонки таблиц: (имя, тип) — 'string' или 'timestamp'
+COLUMNS = {
+    'links': [('domain', 'string'), ('ip', 'string'), ('method', 'string'), ('discovered_at', 'timestamp')],
+    'domains': [('name', 'string'), ('created_at', 'timestamp')],
+    'ips': [('address', 'string'), ('organization', 'string'), ('network', 'string'), ('created_at', 'timestamp')],
+}
+
+
+def table_rows(session, table):
+    """Кортежи строк таблицы сессии в порядке COLUMNS[table], серверным курсором."""
+    links = session_links(session).order_by()
+    if table == 'links':
+        discovered = 'first_seen' if links.model is Edge else 'discovered_at'
+        rows = links.values_list('domain__name', 'ip__address', 'method', discovered)
+    elif table == 'domains':
+        rows = Domain.objects.filter(pk__in=links.values('domain_id')).order_by().values_list('name', 'created_at')
+    elif table == 'ips':
+        rows = IPAddress.objects.filter(pk__in=links.values('ip_id')).order_by().values_list(
+            'address', 'organization', 'network', 'created_at'
+        )
+    else:
+        raise ValueError(f"Неизвестная таблица: '{table}', доступны: {', '.join(TABLES)}")
+    return rows.iterator(chunk_size=CHUNK_SIZE)
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_csv(table, rows):
+    """Байты CSV с заголовком; время — ISO 8601."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in COLUMNS[table]])
+    for chunk in _chunks(rows):
+        writer.writerows(tuple(v.isoformat() if hasattr(v, 'isoformat') else v for v in row) for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _Sink:
+    """Файлоподобный приемник для писателей pyarrow: копит байты, генератор их забирает."""
+
+    def __init__(self):
+        self.parts, self.position, self.closed = [], 0, False
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError('Для выгрузки в Arrow и Parquet нужен пакет pyarrow')
+    return pyarrow
+
+
+def iter_columnar(table, rows, file_format):
+    """Байты файла Arrow IPC или Parquet: по RecordBatch / группе строк на кусок."""
+    pa = _pyarrow()
+    types = {'string': pa.string(), 'timestamp': pa.timestamp('us', tz='UTC')}
+    schema = pa.schema([(name, types[kind]) for name, kind in COLUMNS[table]])
+    sink = _Sink()
+    if file_format == 'parquet':
+        writer = pa.parquet.ParquetWriter(sink, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(sink, schema)
+    for chunk in _chunks(rows):
+        columns = [
+            pa.array([str(v) if v is not None and kind == 'string' else v for v in column], type=types[kind])
+            for column, (_, kind) in zip(zip(*chunk), COLUMNS[table])
+        ]
+        writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def iter_export(session, table, file_format):
+    """
+    Байты выгрузки таблицы сессии в формате file_format ('csv' | 'arrow' | 'parquet').
+    ValueError — неизвестные таблица или формат, либо нет pyarrow; проверяется до чтения строк.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Неизвестный формат: '{file_format}', доступны: {', '.join(FORMATS)}")
+    if table not in TABLES:
+        raise ValueError(f"Неизвестная таблица: '{table}', доступны: {', '.join(TABLES)}")
+    if file_format == 'csv':
+        return iter_csv(table, table_rows(session, table))
+    _pyarrow()
+    return iter_columnar(table, table_rows(session, table), file_format)
+
+
+def export_filename(session, table, file_format):
+    return f'session_{session.id}_{table}.{FORMATS[file_format][0]}'
@@ -0,0 +1,140 @@
+# backend/network/fields.py
+
+"""
+Поля и lookups для адресов и сетей.
+
+В PostgreSQL адрес хранится как inet (GenericIPAddressField), сеть — как cidr (CidrField),
+а проверки вхождения выполняет сама база операторами <<= и >>= по GiST-индексу
+(inet_ops, см. миграцию 0010). На других СУБД поля текстовые, а lookups вызывают
+функцию network_contains, которую apps.ready регистрирует в соединениях SQLite.
+
+    IPAddress.objects.filter(address__net_within='10.0.0.0/24')   # адреса в подсети
+    IPAddress.objects.filter(network__net_contains='10.0.0.7')     # известные сети адреса
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Lookup
+import ipaddress
+
+# Самая длинная запись: IPv6-адрес и /128
+CIDR_MAX_LENGTH = 43
+
+
+def parse_network(value: str):
+    """ip_network из адреса или сети (биты хоста отбрасываются); ValueError — не адрес."""
+    return ipaddress.ip_network(str(value).strip(), strict=False)
+
+
+def network_contains(outer, inner):
+    """outer (сеть или адрес) содержит inner (сеть или адрес) — как оператор >>= PostgreSQL."""
+    if outer is None or inner is None:
+        return None
+    try:
+        outer, inner = parse_network(outer), parse_network(inner)
+    except ValueError:
+        return False
+    return outer.version == inner.version and inner.subnet_of(outer)
+
+
+def primary_network(address: str, cidr: str):
+    """
+    Сеть из ответа RDAP (cidr бывает списком через запятую), содержащая address;
+    None — address ни в одну не попал или cidr пуст.
+    """
+    if not cidr:
+        return None
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return None
+    for part in cidr.split(','):
+        try:
+            network = parse_network(part)
+        except ValueError:
+            continue
+        if network.version == ip.version and ip in network:
+            return str(network)
+    return None
+
+
+class CidrField(models.Field):
+    """Сеть IPv4/IPv6 в каноническом виде (10.0.0.0/24); в PostgreSQL — тип cidr."""
+
+    description = 'IP-сеть (CIDR)'
+
+    def __init__(self, *args, **kwargs):
+        kwargs['max_length'] = CIDR_MAX_LENGTH
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        del kwargs['max_length']
+        return name, path, args, kwargs
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'cidr'
+        return f'varchar({CIDR_MAX_LENGTH})'
+
+    def to_python(self, value):
+        if value is None or value == '':
+            return None
+        try:
+            return str(parse_network(value))
+        except ValueError:
+            raise ValidationError(f'{value!r} — не IP-сеть', code='invalid')
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return self.to_python(value)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'max_length': CIDR_MAX_LENGTH, **kwargs})
+
+
+class NetworkLookup(Lookup):
+    """Вхождение сетей: operator — оператор PostgreSQL, reverse — порядок аргументов network_contains."""
+
+    operator = None
+    reverse = False
+
+    def get_prep_lookup(self):
+        # Параметр проверяется здесь: ошибка — ValueError до запроса, а не ошибка базы
+        return str(parse_network(self.rhs))
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} {self.operator} {rhs}::inet', (*lhs_params, *rhs_params)
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        if self.reverse:
+            return f'network_contains({rhs}, {lhs})', (*rhs_params, *lhs_params)
+        return f'network_contains({lhs}, {rhs})', (*lhs_params, *rhs_params)
+
+
+class NetWithin(NetworkLookup):
+    """Адрес или сеть поля лежит внутри заданной сети (<<=)."""
+    lookup_name = 'net_within'
+    operator = '<<='
+    reverse = True
+
+
+class NetContains(NetworkLookup):
+    """Сеть поля содержит заданный адрес или сеть (>>=)."""
+    lookup_name = 'net_contains'
+    operator = '>>='
+
+
+for field_class in (models.GenericIPAddressField, CidrField):
+    field_class.register_lookup(NetWithin)
+    field_class.register_lookup(NetContains)
+
+
+def register_sqlite_functions(sender, connection, **kwargs):
+    """connection_created: network_contains для lookups в SQLite."""
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('network_contains', 2, network_contains, deterministic=True)
@@ -0,0 +1,257 @@
+# backend/network/graph.py
+
+"""
+Сборка графа сессии для фронтенда на колоночных массивах NumPy.
+
+Связи выбираются одним values_list, дальше все группировки делаются над
+массивами: id доменов и IP факторизуются в плотные коды, посредники
+группируются сортировкой, родительские домены находятся через searchsorted.
+Python-циклы остаются только на выдаче словарей узлов и ребер.
+
+Граф завершенной сессии не меняется, поэтому он собирается и раскладывается
+один раз и хранится в SessionGraph; фронтенду остается только отрисовка.
+"""
+
+from .clusters import compute_cluster_aggregates
+from .layout import LAYOUT_NAME, compute_layout
+from .models import SessionGraph
+from .storage import session_links
+from . import psl
+import logging
+import numpy as np
+import re
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних связей сессии попадает в граф
+GRAPH_LINK_LIMIT = 500
+
+# Буква в имени — признак доменного имени (у IPv4 в поле домена букв нет)
+_has_alpha = re.compile(r'[^\W\d_]').search
+
+
+def _factorize(values):
+    """
+    Коды значений в порядке первого появления.
+    Возвращает (first, codes): first[k] — строка, где k-е уникальное значение
+    встретилось впервые; codes[i] — код значения в строке i.
+    """
+    _, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], rank[inverse.ravel()]
+
+
+def _group_pairs(groups, members):
+    """
+    Все неупорядоченные пары members внутри каждой группы groups, без цикла по группам.
+    На входе пары (группа, член) уже уникальны. Возвращает (group, a, b).
+    """
+    order = np.lexsort((members, groups))
+    groups, members = groups[order], members[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    ends = np.repeat(np.r_[starts[1:], len(groups)], np.diff(np.r_[starts, len(groups)]))
+
+    # Элемент на позиции p образует пары со всеми следующими до конца своей группы
+    partners = ends - np.arange(len(groups)) - 1
+    first = np.repeat(np.arange(len(groups)), partners)
+    offsets = np.arange(len(first)) - np.repeat(np.cumsum(partners) - partners, partners)
+    second = first + 1 + offsets
+    return groups[first], members[first], members[second]
+
+
+def _parent_index(names):
+    """
+    Для каждого имени — индекс родительского домена (имя без первой метки) в names или -1.
+    Родитель ищется только у имен ниже своего регистрируемого домена (по PSL): у example.co.uk
+    родителя нет, у a.example.co.uk — example.co.uk.
+    """
+    names = np.asarray(names, dtype=str)
+    parent = np.full(len(names), -1, dtype=np.int64)
+    if not len(names):
+        return parent
+    bases = np.array(psl.registrable_domains(names.tolist()), dtype=object)
+    candidates = np.flatnonzero((bases != None) & (bases != names.astype(object)))  # noqa: E711 — поэлементно
+    if not len(candidates):
+        return parent
+    parents = np.char.partition(names[candidates], '.')[:, 2]
+
+    order = np.argsort(names)
+    sorted_names = names[order]
+    pos = np.minimum(np.searchsorted(sorted_names, parents), len(names) - 1)
+    found = sorted_names[pos] == parents
+    parent[candidates[found]] = order[pos[found]]
+    return parent
+
+
+def build_session_graph(session, limit=GRAPH_LINK_LIMIT):
+    """
+    Граф последних limit связей сессии: узлы доменов, IP и подсетей, прямые ребра
+    домен→IP, принадлежность IP подсети, косвенные ребра между доменами через
+    общий IP и ребра «поддомен». None — у сессии нет связей.
+    """
+    rows = list(
+        session_links(session).values_list(
+            'id', 'domain_id', 'domain__name', 'ip_id', 'ip__address', 'ip__organization', 'ip__cidr', 'method'
+        )[:limit]
+    )
+    if not rows:
+        return None
+
+    link_ids, domain_ids, domain_names, ip_ids, addresses, organizations, cidrs, methods = (
+        np.array(column, dtype=object) for column in zip(*rows)
+    )
+    domain_ids = domain_ids.astype(np.int64)
+    ip_ids = ip_ids.astype(np.int64)
+
+    domain_first, domain_codes = _factorize(domain_ids)
+    ip_first, ip_codes = _factorize(ip_ids)
+    has_cidr = np.flatnonzero(np.fromiter(map(bool, cidrs), dtype=bool, count=len(cidrs)))
+    subnet_first = has_cidr[_factorize(cidrs[has_cidr].astype(str))[0]] if len(has_cidr) else has_cidr
+
+    # Ключи узлов — объектные массивы: ребра собираются выборкой по кодам, без индексации в цикле
+    domain_keys = np.array([f'd-{pk}' for pk in domain_ids[domain_first].tolist()], dtype=object)
+    ip_keys = np.array([f'ip-{pk}' for pk in ip_ids[ip_first].tolist()], dtype=object)
+    unique_names = domain_names[domain_first]
+    is_domain = np.fromiter((bool(_has_alpha(name)) for name in unique_names), dtype=bool, count=len(unique_names))
+    ip_addresses = addresses[ip_first].tolist()
+    ip_cidrs = cidrs[ip_first].tolist()
+
+    # --- Узлы ---
+    nodes = []
+    for key, name, named in zip(domain_keys.tolist(), unique_names.tolist(), is_domain.tolist()):
+        if named:
+            nodes.append({'id': key, 'label': name, 'type': 'domain', 'data': name})
+        else:
+            nodes.append({'id': key, 'label': name, 'type': 'ip', 'data': name, 'organization': 'Unknown'})
+    for key, address, organization in zip(ip_keys.tolist(), ip_addresses, organizations[ip_first].tolist()):
+        nodes.append({'id': key, 'label': address, 'type': 'ip', 'data': address, 'organization': organization or 'Unknown'})
+    for cidr in cidrs[subnet_first].tolist():
+        nodes.append({'id': f'sub-{cidr}', 'label': cidr, 'type': 'subnet', 'data': cidr})
+
+    # --- Прямые ребра домен → IP ---
+    edges = [
+        {'id': f'e-{pk}', 'source': source, 'target': target, 'type': 'direct', 'label': method}
+        for pk, source, target, method in zip(
+            link_ids.tolist(), domain_keys[domain_codes].tolist(), ip_keys[ip_codes].tolist(), methods.tolist()
+        )
+    ]
+
+    # --- Принадлежность IP подсети (по одному ребру на IP) ---
+    edges.extend(
+        {'id': f'member_{key}_sub-{cidr}', 'source': key, 'target': f'sub-{cidr}', 'type': 'member_of', 'label': 'belongs to'}
+        for key, cidr in zip(ip_keys.tolist(), ip_cidrs) if cidr
+    )
+
+    # --- Косвенные ребра между доменами через общий IP ---
+    pairs = np.unique(ip_codes * len(domain_first) + domain_codes)
+    connectors, first_domains, second_domains = _group_pairs(pairs // len(domain_first), pairs % len(domain_first))
+    via_prefixes = np.array([f'via_{key}_' for key in ip_keys.tolist()], dtype=object)
+    via_labels = np.array([f'via {address}' for address in ip_addresses], dtype=object)
+    edges.extend(
+        {'id': f'{prefix}{source}_{target}', 'source': source, 'target': target, 'type': 'via_ip', 'label': label}
+        for prefix, label, source, target in zip(
+            via_prefixes[connectors].tolist(), via_labels[connectors].tolist(),
+            domain_keys[first_domains].tolist(), domain_keys[second_domains].tolist(),
+        )
+    )
+
+    # --- Ребра «поддомен» ---
+    named = np.flatnonzero(is_domain)
+    parents = _parent_index(unique_names[named])
+    children = named[parents >= 0]
+    edges.extend(
+        {'id': f'sub_{parent}_{child}', 'source': parent, 'target': child, 'type': 'subdomain', 'label': 'subdomain of'}
+        for parent, child in zip(domain_keys[named[parents[parents >= 0]]].tolist(), domain_keys[children].tolist())
+    )
+
+    return {
+        'nodes': nodes,
+        'edges': edges,
+        'summary': {
+            'total_nodes': len(nodes),
+            'total_edges': len(edges),
+            'domains': int(is_domain.sum()),
+            'ips': len(ip_first) + int((~is_domain).sum()),
+            'subnets': len(subnet_first),
+        },
+    }
+
+
+def layout_graph(graph, root_domain):
+    """
+    Проставляет узлам графа координаты position {x, y}.
+    Раскладка идет по прямым ребрам, подсетям и поддоменам: косвенные ребра через
+    общий IP дублируют путь домен—IP—домен и только раздувают число пар.
+    """
+    nodes = graph['nodes']
+    index = {node['id']: i for i, node in enumerate(nodes)}
+    structural = [e for e in graph['edges'] if e['type'] != 'via_ip']
+    sources = np.fromiter((index[e['source']] for e in structural), dtype=np.int64, count=len(structural))
+    targets = np.fromiter((index[e['target']] for e in structural), dtype=np.int64, count=len(structural))
+
+    # Группа узла задает соседство на кольце: IP — по подсети, домен — по родителю
+    groups = np.arange(len(nodes))
+    for edge, source, target in zip(structural, sources.tolist(), targets.tolist()):
+        if edge['type'] == 'member_of':
+            groups[source] = target
+        elif edge['type'] == 'subdomain':
+            groups[target] = source
+
+    root = next((i for i, node in enumerate(nodes) if node['type'] == 'domain' and node['label'] == root_domain), None)
+    positions = compute_layout(len(nodes), sources, targets, root=root, groups=groups)
+    for node, (x, y) in zip(nodes, np.round(positions, 1).tolist()):
+        node['position'] = {'x': x, 'y': y}
+    return graph
+
+
+def materialize_session_graph(session):
+    """
+    Собирает граф сессии, раскладывает его и вместе с агрегатами кластеров
+    сохраняет в SessionGraph. None — связей нет.
+    """
+    graph = build_session_graph(session)
+    if graph is None:
+        return None
+    layout_graph(graph, session.root_domain)
+    SessionGraph.objects.update_or_create(
+        session=session,
+        defaults={
+            'nodes': graph['nodes'], 'edges': graph['edges'], 'summary': graph['summary'], 'layout': LAYOUT_NAME,
+            'clusters': compute_cluster_aggregates(session),
+        },
+    )
+    logger.info(f"Граф сессии {session.id} материализован: {graph['summary']['total_nodes']} узлов")
+    return graph
+
+
+def get_session_graph(session):
+    """
+    Граф сессии для API. У завершенной — из SessionGraph (материализуется при первом
+    обращении, если задача не успела); у незавершенной — собирается на лету без координат.
+    """
+    if session.status != 'completed':
+        return build_session_graph(session)
+    stored = SessionGraph.objects.filter(session=session, layout=LAYOUT_NAME).first()
+    if stored:
+        return {'nodes': stored.nodes, 'edges': stored.edges, 'summary': stored.summary}
+    return materialize_session_graph(session)
+
+
+def get_cluster_aggregates(session):
+    """
+    Агрегаты кластеров сессии. У завершенной — из SessionGraph (досчитываются и
+    сохраняются, если граф материализован раньше, чем появились кластеры).
+    """
+    if session.status != 'completed':
+        return compute_cluster_aggregates(session)
+    stored = SessionGraph.objects.filter(session=session).values_list('clusters', flat=True).first()
+    if stored:
+        return stored
+    if stored is None and materialize_session_graph(session) is not None:
+        return SessionGraph.objects.values_list('clusters', flat=True).get(session=session)
+    aggregates = compute_cluster_aggregates(session)
+    if stored is not None:
+        SessionGraph.objects.filter(session=session).update(clusters=aggregates)
+    return aggregates
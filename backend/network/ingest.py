@@ -0,0 +1,312 @@
+# backend/network/ingest.py
+
+"""
+Массовый импорт внешних наборов связей домен → IP (пассивный DNS, выгрузки CT-логов)
+в отдельную синтетическую сессию ScanSession.
+
+Файл читается потоком (CSV с заголовком или NDJSON, в том числе .gz) и режется на куски
+по CHUNK_SIZE нормализованных строк. В PostgreSQL кусок грузится через COPY во временную
+таблицу, после чего три запроса на множествах добавляют недостающие Domain и IPAddress
+(ON CONFLICT DO NOTHING) и связи сессии — JOIN временной таблицы со справочниками;
+у повторной связи остается самое раннее время наблюдения.
+Ни одна строка не проходит через ORM, поэтому импорт упирается в COPY и индексы,
+а не в круговые поездки к базе, как _save_link сканера.
+
+В других базах (SQLite в тестах) тот же кусок пишется bulk_create с ignore_conflicts:
+медленнее, но с тем же результатом.
+"""
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Domain, IPAddress, Link, ScanSession
+from .storage import store_completed_session, _chunks, BATCH_SIZE
+import csv
+import datetime
+import gzip
+import io
+import ipaddress
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Строк в одном куске: один COPY и одна тройка запросов на множествах
+CHUNK_SIZE = 100000
+
+# Имена колонок/ключей в распространенных форматах: свои CSV, dnsdb (rrname/rdata), crt.sh
+DOMAIN_KEYS = ('domain', 'name', 'rrname', 'query', 'common_name', 'name_value')
+IP_KEYS = ('ip', 'address', 'rdata', 'answer', 'value')
+SEEN_KEYS = ('seen', 'discovered_at', 'time_first', 'first_seen', 'timestamp', 'not_before')
+METHODS = {choice for choice, _ in Link.MethodChoices.choices}
+# Записи пассивного DNS других типов (CNAME, NS, MX...) связей домен → IP не дают
+ADDRESS_RRTYPES = {'A', 'AAAA'}
+
+STAGE_TABLE = 'network_import_stage'
+
+
+def open_dataset(path):
+    """Текстовый поток файла; .gz распаковывается на лету."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace', newline='')
+    return open(path, encoding='utf-8', errors='replace', newline='')
+
+
+def dataset_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'ndjson' if os.path.splitext(name)[1] in ('.ndjson', '.jsonl', '.json') else 'csv'
+
+
+def iter_records(stream, file_format):
+    """Словари записей: строки CSV с заголовком или объекты NDJSON (битые строки пропускаются)."""
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            yield record
+
+
+def _first(record, keys):
+    for key in keys:
+        value = record.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _seen(value):
+    """Время наблюдения: unix-время или ISO 8601; None — не указано или не разобрано."""
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.datetime.fromtimestamp(float(value), tz=datetime.timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        pass
+    try:
+        seen = parse_datetime(str(value))
+    except ValueError:
+        return None
+    if seen is not None and timezone.is_naive(seen):
+        seen = timezone.make_aware(seen, datetime.timezone.utc)
+    return seen
+
+
+def normalize(record, default_method, now):
+    """
+    Запись -> список (домен, IP, метод, время) — у dnsdb rdata бывает списком адресов.
+    Домен в нижнем регистре без точки в конце и без '*.', IP — каноническая запись.
+    """
+    rrtype = record.get('rrtype')
+    if rrtype and str(rrtype).upper() not in ADDRESS_RRTYPES:
+        return []
+    domain = _first(record, DOMAIN_KEYS)
+    values = _first(record, IP_KEYS)
+    if not isinstance(domain, str) or values is None:
+        return []
+    domain = domain.strip().lower().rstrip('.')
+    if domain.startswith('*.'):
+        domain = domain[2:]
+    if not domain or len(domain) > 255 or any(c.isspace() for c in domain):
+        return []
+    method = record.get('method') or default_method
+    if method not in METHODS:
+        method = default_method
+    seen = _seen(_first(record, SEEN_KEYS)) or now
+
+    rows = []
+    for value in values if isinstance(values, list) else [values]:
+        try:
+            address = str(ipaddress.ip_address(str(value).strip()))
+        except ValueError:
+            continue
+        rows.append((domain, address, method, seen))
+    return rows
+
+
+def _copy_text(rows):
+    """Строки куска в текстовом формате COPY (табуляция, \\N — NULL)."""
+    buffer = io.StringIO()
+    for domain, address, method, seen in rows:
+        domain = domain.replace('\\', '\\\\').replace('\t', '\\t')
+        buffer.write(f'{domain}\t{address}\t{method}\t{seen.isoformat()}\n')
+    buffer.seek(0)
+    return buffer
+
+
+def _copy(cursor, sql, buffer):
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):
+        # psycopg2
+        raw.copy_expert(sql, buffer)
+    else:
+        # psycopg 3
+        with raw.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def _load_chunk_postgresql(session, rows):
+    """Кусок через COPY во временную таблицу и три INSERT ... SELECT. Возвращает счетчики."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE IF NOT EXISTS {STAGE_TABLE} '
+            f'(domain text, ip inet, method text, seen timestamptz)'
+        )
+        # Таблица живет до конца соединения; TRUNCATE, а не ON COMMIT DELETE ROWS —
+        # внутри внешней транзакции коммита между кусками нет
+        cursor.execute(f'TRUNCATE {STAGE_TABLE}')
+        _copy(cursor, f'COPY {STAGE_TABLE} (domain, ip, method, seen) FROM STDIN', _copy_text(rows))
+        cursor.execute(
+            f'INSERT INTO network_domain (name, created_at) '
+            f'SELECT DISTINCT domain, now() FROM {STAGE_TABLE} ON CONFLICT (name) DO NOTHING'
+        )
+        domains = cursor.rowcount
+        cursor.execute(
+            f'INSERT INTO network_ipaddress (address, created_at) '
+            f'SELECT DISTINCT ip, now() FROM {STAGE_TABLE} ON CONFLICT (address) DO NOTHING'
+        )
+        ips = cursor.rowcount
+        # Одна связь на (домен, IP) в сессии — с самым ранним наблюдением, в том числе
+        # по всем кускам: связь из прошлого куска получает более раннее время из этого.
+        # Считаются только вставленные строки (xmax = 0), не обновленные
+        cursor.execute(
+            f'WITH upserted AS ('
+            f'INSERT INTO network_link (scan_session_id, domain_id, ip_id, method, discovered_at) '
+            f'SELECT DISTINCT ON (d.id, i.id) %s, d.id, i.id, s.method, s.seen FROM {STAGE_TABLE} s '
+            f'JOIN network_domain d ON d.name = s.domain JOIN network_ipaddress i ON i.address = s.ip '
+            f'ORDER BY d.id, i.id, s.seen '
+            f'ON CONFLICT (scan_session_id, domain_id, ip_id) DO UPDATE '
+            f'SET discovered_at = LEAST(network_link.discovered_at, EXCLUDED.discovered_at) '
+            f'WHERE EXCLUDED.discovered_at < network_link.discovered_at '
+            f'RETURNING xmax = 0 AS inserted'
+            f') SELECT count(*) FILTER (WHERE inserted) FROM upserted',
+            [session.id],
+        )
+        links = cursor.fetchone()[0]
+    return {'domains': domains, 'ips': ips, 'links': links}
+
+
+def _pks(model, field, values):
+    pks = {}
+    for chunk in _chunks(sorted(values)):
+        pks.update(model.objects.filter(**{f'{field}__in': chunk}).values_list(field, 'pk'))
+    return pks
+
+
+def _create_missing(model, field, values):
+    """Создает недостающие строки справочника; {значение: pk} и число созданных."""
+    pks = _pks(model, field, values)
+    new = values - pks.keys()
+    model.objects.bulk_create([model(**{field: value}) for value in new], batch_size=BATCH_SIZE, ignore_conflicts=True)
+    if new:
+        pks.update(_pks(model, field, new))
+    return pks, len(new)
+
+
+def _chunk_links(session, domain_ids):
+    """{(domain_id, ip_id): Link} связей сессии с доменами из domain_ids."""
+    links = {}
+    for chunk in _chunks(sorted(domain_ids)):
+        for link in Link.objects.filter(scan_session=session, domain_id__in=chunk).only('id', 'domain_id', 'ip_id', 'discovered_at'):
+            links[(link.domain_id, link.ip_id)] = link
+    return links
+
+
+def _load_chunk_orm(session, rows):
+    """
+    Тот же кусок через ORM — для баз без COPY. auto_now_add ставит discovered_at на время
+    вставки, поэтому время наблюдения записывается отдельным bulk_update: новой связи —
+    самое раннее из куска, связи из прошлого куска — если в этом оно раньше.
+    """
+    with transaction.atomic():
+        domain_pks, domains = _create_missing(Domain, 'name', {row[0] for row in rows})
+        ip_pks, ips = _create_missing(IPAddress, 'address', {row[1] for row in rows})
+        earliest = {}
+        for domain, address, method, seen in rows:
+            key = (domain_pks[domain], ip_pks[address])
+            if key not in earliest or seen < earliest[key][1]:
+                earliest[key] = (method, seen)
+        domain_ids = {domain_id for domain_id, _ in earliest}
+        new = earliest.keys() - _chunk_links(session, domain_ids).keys()
+        Link.objects.bulk_create(
+            [Link(scan_session=session, domain_id=domain_id, ip_id=ip_id, method=earliest[domain_id, ip_id][0]) for domain_id, ip_id in new],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        changed = []
+        for key, link in _chunk_links(session, domain_ids).items():
+            if key not in earliest:
+                continue
+            seen = earliest[key][1]
+            if key in new or seen < link.discovered_at:
+                link.discovered_at = seen
+                changed.append(link)
+        Link.objects.bulk_update(changed, ['discovered_at'], batch_size=BATCH_SIZE)
+    return {'domains': domains, 'ips': ips, 'links': len(new)}
+
+
+def load_chunk(session, rows):
+    if connection.vendor == 'postgresql':
+        return _load_chunk_postgresql(session, rows)
+    return _load_chunk_orm(session, rows)
+
+
+def import_records(records, root_domain, default_method='dns', progress=None):
+    """
+    Импорт записей (словарей) в новую сессию root_domain. Возвращает сессию;
+    в session.stats['import'] — прочитано/пропущено записей и добавлено доменов, IP, связей.
+    progress(counts) вызывается после каждого куска.
+    """
+    session = ScanSession.objects.create(
+        root_domain=root_domain, depth=0, status='running', requester='import'
+    )
+    counts = {'records': 0, 'skipped': 0, 'domains': 0, 'ips': 0, 'links': 0}
+    now = timezone.now()
+    try:
+        chunk = []
+        for record in records:
+            counts['records'] += 1
+            rows = normalize(record, default_method, now)
+            if not rows:
+                counts['skipped'] += 1
+            chunk.extend(rows)
+            if len(chunk) >= CHUNK_SIZE:
+                for key, value in load_chunk(session, chunk).items():
+                    counts[key] += value
+                chunk = []
+                if progress:
+                    progress(counts)
+        if chunk:
+            for key, value in load_chunk(session, chunk).items():
+                counts[key] += value
+            if progress:
+                progress(counts)
+        session.status = 'completed'
+    except Exception as e:
+        logger.error(f"Ошибка импорта в сессию {session.id} ({root_domain}): {e}", exc_info=True)
+        session.status = 'failed'
+        raise
+    finally:
+        session.completed_at = timezone.now()
+        session.stats = {'import': counts}
+        session.save(update_fields=['status', 'completed_at', 'stats'])
+        logger.info(f"Импорт в сессию {session.id} ({root_domain}) завершен: {counts}")
+
+    store_completed_session(session)
+    return session
+
+
+def import_dataset(path, root_domain=None, default_method='dns', file_format=None, progress=None):
+    """Импорт файла; корень сессии по умолчанию — import:<имя файла>."""
+    root_domain = root_domain or f'import:{os.path.basename(path)}'[:255]
+    with open_dataset(path) as stream:
+        records = iter_records(stream, file_format or dataset_format(path))
+        return import_records(records, root_domain, default_method, progress)
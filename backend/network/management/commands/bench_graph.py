@@ -0,0 +1,124 @@
+# backend/network/management/commands/bench_graph.py
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from network.bench.seed import seed_session
+import json
+import logging
+import statistics
+import time
+import tracemalloc
+
+ENDPOINTS = {
+    'links': '/api/links/graph/',
+    'domains': '/api/domains/graph/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк API графа (/api/links/graph/ и /api/domains/graph/) на синтетических '
+        'сессиях заданного размера: задержка, число SQL-запросов, размер ответа и пик памяти. '
+        'Работает на отдельной тестовой базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Размеры сессий (число связей)')
+        parser.add_argument('--fan-in', type=int, default=300,
+                            help='Сколько доменов делят один «горячий» IP (0 — без адверсариального случая)')
+        parser.add_argument('--endpoints', nargs='+', choices=sorted(ENDPOINTS), default=sorted(ENDPOINTS),
+                            help='Какие эндпоинты мерить')
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов на каждый замер')
+        parser.add_argument('--no-memory', action='store_true', help='Не замерять пиковую память')
+        parser.add_argument('--output', help='Куда записать результаты в JSON')
+        parser.add_argument('--keepdb', action='store_true', help='Не пересоздавать тестовую базу')
+
+    def handle(self, *args, **options):
+        logging.getLogger('network').setLevel(logging.ERROR)
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            results = []
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                client = Client()
+                for index, size in enumerate(options['sizes']):
+                    fan_in = min(options['fan_in'], size)
+                    variants = [(0, f'plain-{size}.bench.test')]
+                    if fan_in:
+                        variants.append((fan_in, f'fanin-{size}.bench.test'))
+                    for variant, (variant_fan_in, root) in enumerate(variants):
+                        started = time.perf_counter()
+                        session = seed_session(root, size, fan_in=variant_fan_in,
+                                               ip_offset=(index * 2 + variant) * 2 ** 18)
+                        seed_seconds = time.perf_counter() - started
+                        for endpoint in options['endpoints']:
+                            result = self._measure(client, endpoint, session, options['repeat'], not options['no_memory'])
+                            result.update({'links': size, 'fan_in': variant_fan_in, 'seed_seconds': round(seed_seconds, 2)})
+                            results.append(result)
+                            self._print(result)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'benchmark': 'graph', 'results': results}, f, indent=2)
+            self.stdout.write(f"Результаты записаны в {options['output']}")
+
+    def _measure(self, client, endpoint, session, repeat, measure_memory):
+        url = ENDPOINTS[endpoint]
+        params = {'domain': session.root_domain}
+        if endpoint == 'links':
+            params['session_id'] = session.id
+
+        # Прогревочный запрос: импорт сериализаторов, кэш схемы и т.п. в замер не идут
+        client.get(url, params)
+
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url, params)
+            latencies.append(time.perf_counter() - started)
+
+        # CaptureQueriesContext тут не годится: request_started сбрасывает queries_log
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            response = client.get(url, params)
+
+        peak_memory = None
+        if measure_memory:
+            tracemalloc.start()
+            client.get(url, params)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        body = response.content
+        payload = json.loads(body) if response.status_code == 200 else {}
+        return {
+            'endpoint': url,
+            'status': response.status_code,
+            'latency_ms_median': round(statistics.median(latencies) * 1000, 2),
+            'latency_ms_min': round(min(latencies) * 1000, 2),
+            'latency_ms_max': round(max(latencies) * 1000, 2),
+            'db_queries': queries,
+            'response_bytes': len(body),
+            'nodes': len(payload.get('nodes', [])),
+            'edges': len(payload.get('edges', [])),
+            'peak_memory_mb': round(peak_memory / 2 ** 20, 2) if peak_memory is not None else None,
+        }
+
+    def _print(self, result):
+        memory = f"{result['peak_memory_mb']} MB" if result['peak_memory_mb'] is not None else '—'
+        self.stdout.write(
+            f"{result['endpoint']:<20} связей {result['links']:>7}, fan-in {result['fan_in']:>4}: "
+            f"медиана {result['latency_ms_median']:>9.2f} мс, запросов {result['db_queries']}, "
+            f"ответ {result['response_bytes']} байт ({result['nodes']} узлов, {result['edges']} ребер), "
+            f"пик памяти {memory}"
+        )
@@ -0,0 +1,110 @@
+# backend/network/management/commands/bench_scanner.py
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from network.bench.simnet import ROOT_DOMAIN, SimulatedInternet, SyntheticZone
+from network.models import Domain, IPAddress, Link, ScanSession
+from network.scanner import InternetMapScanner
+import json
+import logging
+import time
+import tracemalloc
+
+
+class Command(BaseCommand):
+    help = (
+        'Офлайн-бенчмарк InternetMapScanner.scan на симулированном интернете '
+        '(DNS, TLS, crt.sh, RDAP, nmap и theHarvester — локальные заглушки). '
+        'Работает на отдельной тестовой базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 800],
+                            help='Размеры синтетической зоны (число доменов)')
+        parser.add_argument('--depth', type=int, default=8, help='Глубина скана')
+        parser.add_argument('--repeat', type=int, default=1, help='Повторов на каждый размер')
+        parser.add_argument('--no-memory', action='store_true',
+                            help='Не замерять пиковую память (tracemalloc замедляет сканер)')
+        parser.add_argument('--output', help='Куда записать результаты в JSON')
+        parser.add_argument('--keepdb', action='store_true', help='Не пересоздавать тестовую базу')
+        parser.add_argument('--verbose-scanner', action='store_true', help='Оставить INFO-логи сканера')
+
+    def handle(self, *args, **options):
+        if not options['verbose_scanner']:
+            logging.getLogger('network').setLevel(logging.ERROR)
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            results = []
+            for size in options['sizes']:
+                zone = SyntheticZone(size)
+                with SimulatedInternet(zone):
+                    for _ in range(options['repeat']):
+                        result = self._run_once(zone, options['depth'], not options['no_memory'])
+                        results.append(result)
+                        self._print(result)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'benchmark': 'scanner', 'results': results}, f, indent=2)
+            self.stdout.write(f"Результаты записаны в {options['output']}")
+
+    def _run_once(self, zone, depth, measure_memory):
+        # Каждый прогон — с пустой базой, чтобы не мерить теплые get_or_create
+        Link.objects.all().delete()
+        ScanSession.objects.all().delete()
+        Domain.objects.all().delete()
+        IPAddress.objects.all().delete()
+
+        session = ScanSession.objects.create(root_domain=ROOT_DOMAIN, depth=depth)
+        scanner = InternetMapScanner(session=session, max_depth=depth)
+        writes = 0
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal writes, queries
+            queries += 1
+            if sql.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+                writes += 1
+            return execute(sql, params, many, context)
+
+        if measure_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            scanner.scan(ROOT_DOMAIN)
+        elapsed = time.perf_counter() - started
+        peak_memory = None
+        if measure_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        stats = scanner.stats.summary()
+        return {
+            'zone_size': zone.size,
+            'depth': depth,
+            'elapsed_seconds': round(elapsed, 3),
+            'domains': stats['items'].get('domain', 0),
+            'ips': stats['items'].get('ip', 0),
+            'links': stats['items'].get('link', 0),
+            'probes': stats['network_calls'],
+            'db_queries': queries,
+            'db_writes': writes,
+            'scans_per_sec': round(1 / elapsed, 4),
+            'domains_per_sec': round(stats['items'].get('domain', 0) / elapsed, 2),
+            'probes_per_sec': round(stats['network_calls'] / elapsed, 2),
+            'db_writes_per_sec': round(writes / elapsed, 2),
+            'peak_memory_mb': round(peak_memory / 2 ** 20, 2) if peak_memory is not None else None,
+            'stages': stats['stages'],
+        }
+
+    def _print(self, result):
+        memory = f"{result['peak_memory_mb']} MB" if result['peak_memory_mb'] is not None else '—'
+        self.stdout.write(
+            f"зона {result['zone_size']:>6}: {result['elapsed_seconds']:>8.2f} с, "
+            f"доменов {result['domains']}, связей {result['links']}, "
+            f"проб/с {result['probes_per_sec']}, записей БД/с {result['db_writes_per_sec']}, "
+            f"пик памяти {memory}"
+        )
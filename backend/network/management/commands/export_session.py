@@ -0,0 +1,40 @@
+# backend/network/management/commands/export_session.py
+
+from django.core.management.base import BaseCommand, CommandError
+from network.models import ScanSession
+from network.export import iter_export, export_filename, FORMATS, TABLES
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает связи, домены и IP сессии в CSV, Arrow (Feather v2) или Parquet. '
+        'Строки читаются серверным курсором и пишутся кусками, память не зависит от размера сессии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('session_id', type=int)
+        parser.add_argument('--format', dest='file_format', choices=list(FORMATS), default='parquet')
+        parser.add_argument('--tables', nargs='+', choices=TABLES, default=list(TABLES))
+        parser.add_argument('--output', default='.', help='Каталог для файлов session_<id>_<таблица>.<формат>')
+
+    def handle(self, *args, **options):
+        try:
+            session = ScanSession.objects.get(pk=options['session_id'])
+        except ScanSession.DoesNotExist:
+            raise CommandError(f"Сессия {options['session_id']} не найдена")
+        os.makedirs(options['output'], exist_ok=True)
+
+        for table in options['tables']:
+            try:
+                content = iter_export(session, table, options['file_format'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            path = os.path.join(options['output'], export_filename(session, table, options['file_format']))
+            started = time.monotonic()
+            with open(path, 'wb') as f:
+                for data in content:
+                    f.write(data)
+            self.stdout.write(f'{path}: {os.path.getsize(path)} байт за {time.monotonic() - started:.1f} с')
+        self.stdout.write(self.style.SUCCESS(f'Сессия {session.id} выгружена'))
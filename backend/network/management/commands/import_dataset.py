@@ -0,0 +1,43 @@
+# backend/network/management/commands/import_dataset.py
+
+from django.core.management.base import BaseCommand, CommandError
+from network.ingest import import_dataset, METHODS
+import logging
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует внешние наборы связей домен → IP (пассивный DNS, выгрузки CT-логов) '
+        'из CSV или NDJSON (можно .gz) в новую сессию. В PostgreSQL куски грузятся через COPY '
+        'и сливаются со справочниками запросами на множествах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Файлы .csv / .ndjson / .jsonl, можно .gz')
+        parser.add_argument('--root', help='root_domain сессии (по умолчанию import:<имя файла>)')
+        parser.add_argument('--method', choices=sorted(METHODS), default='dns', help='Метод связей, если в записи не указан')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'ndjson'], help='Формат (по умолчанию — по расширению)')
+
+    def handle(self, *args, **options):
+        logging.getLogger('network').setLevel(logging.WARNING)
+        for path in options['paths']:
+            if not os.path.exists(path):
+                raise CommandError(f'Файл {path} не найден')
+
+        for path in options['paths']:
+            started = time.monotonic()
+
+            def progress(counts):
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"{path}: {counts['records']} записей, {counts['links']} связей, "
+                                  f"{counts['records'] / max(elapsed, 1e-6):.0f} записей/с")
+
+            session = import_dataset(path, options['root'], options['method'], options['file_format'], progress)
+            counts = session.stats['import']
+            self.stdout.write(self.style.SUCCESS(
+                f"{path} → сессия {session.id} ({session.root_domain}): связей {counts['links']}, "
+                f"новых доменов {counts['domains']}, новых IP {counts['ips']}, пропущено записей {counts['skipped']} "
+                f"за {time.monotonic() - started:.1f} с"
+            ))
@@ -0,0 +1,37 @@
+# backend/network/management/commands/prune_sessions.py
+
+from django.core.management.base import BaseCommand
+from network.models import ScanSession
+from network.retention import apply_retention, plan_retention
+import logging
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет старые сессии по политике settings.SCAN_RETENTION: свежие хранятся все, '
+        'более старые — периодическими снимками на корень. Освободившиеся секции network_link '
+        'удаляются целиком, интервалы Edge сжимаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, какие сессии будут удалены')
+
+    def handle(self, *args, **options):
+        logging.getLogger('network').setLevel(logging.WARNING)
+        if options['dry_run']:
+            sessions = list(ScanSession.objects.values('id', 'root_domain', 'status', 'created_at', 'base_session_id'))
+            doomed = plan_retention(sessions)
+            for session in sorted(sessions, key=lambda s: (s['root_domain'], s['created_at'])):
+                if session['id'] in doomed:
+                    self.stdout.write(f"сессия {session['id']} ({session['root_domain']}, {session['created_at']:%Y-%m-%d})")
+            self.stdout.write(self.style.SUCCESS(f'Будет удалено сессий: {len(doomed)}'))
+            return
+
+        summary = apply_retention()
+        for name in summary['partitions_dropped']:
+            self.stdout.write(f'секция {name} удалена')
+        self.stdout.write(self.style.SUCCESS(
+            f"Удалено сессий: {summary['sessions_deleted']}, "
+            f"интервалов: {summary.get('intervals_deleted', 0)}, слито: {summary.get('intervals_merged', 0)}, "
+            f"связей Edge: {summary.get('edges_deleted', 0)}"
+        ))
@@ -0,0 +1,45 @@
+# backend/network/management/commands/scan_batch.py
+
+from django.core.management.base import BaseCommand, CommandError
+from network.batch import create_batch, parse_roots, run_batch, submit_batch
+import logging
+
+
+class Command(BaseCommand):
+    help = (
+        'Пакетный скан корневых доменов из файла (по домену на строку, # — комментарий). '
+        'Все корни проходятся одной задачей с общими кэшами DNS, TLS, RDAP, theHarvester и nmap; '
+        'по умолчанию задача уходит в пакетную очередь Celery, с --inline выполняется здесь же.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл со списком корневых доменов')
+        parser.add_argument('--depth', type=int, default=2)
+        parser.add_argument('--name', default='', help='Название пакета (по умолчанию — имя файла)')
+        parser.add_argument('--inline', action='store_true', help='Сканировать в этом процессе, а не в Celery')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8') as f:
+                roots = parse_roots(f)
+        except OSError as e:
+            raise CommandError(f"Не удалось прочитать {options['path']}: {e}")
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        batch = create_batch(roots, options['depth'], options['name'] or options['path'], requester='command', check_requester=False)
+        self.stdout.write(f'Пакет {batch.id}: {len(roots)} корней, глубина {options["depth"]}')
+        if not options['inline']:
+            submit_batch(batch)
+            self.stdout.write(self.style.SUCCESS(f'Пакет {batch.id} поставлен в очередь'))
+            return
+
+        logging.getLogger('network').setLevel(logging.WARNING)
+
+        def progress(p):
+            self.stdout.write(f"[{p['percent']:5.1f}%] {p['completed']} готово, {p['failed']} с ошибкой из {p['total']}; "
+                              f"доменов {p['domains']}, IP {p['ips']}, связей {p['links']}, "
+                              f"сетевых вызовов {p['network_calls']}, попаданий в кэш {p['cache_hits']}")
+
+        batch = run_batch(batch, progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Пакет {batch.id} завершен: {batch.stats['totals']}"))
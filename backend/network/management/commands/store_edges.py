@@ -0,0 +1,36 @@
+# backend/network/management/commands/store_edges.py
+
+from django.core.management.base import BaseCommand
+from network.models import ScanSession
+from network.storage import store_session_edges
+import logging
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит связи завершенных сессий из собственных строк Link в общее хранилище '
+        'Edge/EdgeInterval. Сессии каждого корня обрабатываются в порядке создания, '
+        'чтобы неизменные связи ложились в общие интервалы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', help='Только сессии этого корневого домена')
+        parser.add_argument('--limit', type=int, help='Не больше стольких сессий за запуск')
+
+    def handle(self, *args, **options):
+        logging.getLogger('network').setLevel(logging.WARNING)
+        sessions = ScanSession.objects.filter(status='completed', storage='links').order_by('root_domain', 'created_at')
+        if options['root']:
+            sessions = sessions.filter(root_domain=options['root'])
+        if options['limit']:
+            sessions = sessions[:options['limit']]
+
+        stored = links = 0
+        for session in sessions.iterator():
+            count = store_session_edges(session)
+            if count is None:
+                continue
+            stored += 1
+            links += count
+            self.stdout.write(f'сессия {session.id} ({session.root_domain}): {count} связей')
+        self.stdout.write(self.style.SUCCESS(f'Перенесено сессий: {stored}, связей: {links}'))
@@ -0,0 +1,293 @@
+# backend/network/metrics.py
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы корзин гистограммы задержек, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+REGISTRY = []
+
+
+def _format_labels(labelnames, labelvalues, extra=None) -> str:
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Metric:
+    """Метрика процесса с метками; значения хранятся по кортежу значений меток."""
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def samples(self):
+        """Пары (имя с метками, значение) в формате Prometheus."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            yield f'{self.name}{_format_labels(self.labelnames, key)}', value
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{sample} {value}' for sample, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def remove(self, **labels):
+        """Убирает ряд с этими метками из экспорта."""
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][i] += 1
+            state['count'] += 1
+            state['sum'] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, dict(state, buckets=list(state['buckets']))) for key, state in self._values.items()]
+        for key, state in sorted(items, key=lambda item: item[0]):
+            for bound, count in zip(self.buckets, state['buckets']):
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", bound))}', count
+            yield f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", "+Inf"))}', state['count']
+            yield f'{self.name}_count{_format_labels(self.labelnames, key)}', state['count']
+            yield f'{self.name}_sum{_format_labels(self.labelnames, key)}', state['sum']
+
+
+def render_prometheus() -> str:
+    """Текст всех метрик процесса в формате экспозиции Prometheus."""
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+# --- Метрики сканера ---
+
+SCANNER_STAGE_CALLS = Counter(
+    'internetmap_scanner_stage_calls_total',
+    'Вызовы этапов сканера (dns, reverse_dns, tls, rdap, nmap, harvester, crtsh)',
+    ('stage', 'outcome'),
+)
+SCANNER_STAGE_SECONDS = Histogram(
+    'internetmap_scanner_stage_seconds',
+    'Длительность одного вызова этапа сканера',
+    ('stage',),
+)
+SCANNER_STAGE_INFLIGHT = Gauge(
+    'internetmap_scanner_stage_inflight',
+    'Вызовы этапов сканера, выполняющиеся прямо сейчас',
+    ('stage',),
+)
+SCANNER_CACHE_LOOKUPS = Counter(
+    'internetmap_scanner_cache_lookups_total',
+    'Обращения сканера к кэшам',
+    ('cache', 'result'),
+)
+SCANNER_ITEMS = Counter(
+    'internetmap_scanner_items_total',
+    'Обработанные сканером домены, IP и созданные связи',
+    ('kind',),
+)
+SCANNER_QUEUE_SIZE = Gauge(
+    'internetmap_scanner_queue_size',
+    'Текущий размер очереди BFS по сессиям, которые сканируются сейчас',
+    ('session',),
+)
+
+
+class ScanStats:
+    """
+    Статистика одного запуска сканера. Каждое измерение попадает и в глобальные
+    метрики процесса, и в итоговую сводку по сессии. Этапы и кэши можно замерять
+    из фоновых потоков сканера (RDAP). Размер очереди экспортируется с меткой session:
+    параллельные сканеры процесса не перезаписывают друг друга; close() убирает ряд.
+    """
+
+    def __init__(self, session_id=None):
+        self.session_id = '' if session_id is None else str(session_id)
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.caches = {}
+        self.items = {}
+        self.links_by_method = {}
+        self.peak_queue = 0
+        self.started = time.monotonic()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замеряет вызов этапа: счетчик, гистограмма задержки и gauge in-flight."""
+        SCANNER_STAGE_INFLIGHT.inc(stage=name)
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            yield
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            SCANNER_STAGE_INFLIGHT.dec(stage=name)
+            SCANNER_STAGE_SECONDS.observe(elapsed, stage=name)
+            SCANNER_STAGE_CALLS.inc(stage=name, outcome=outcome)
+            with self._lock:
+                totals = self.stages.setdefault(name, {'calls': 0, 'errors': 0, 'seconds': 0.0})
+                totals['calls'] += 1
+                totals['seconds'] += elapsed
+                if outcome == 'error':
+                    totals['errors'] += 1
+
+    def cache(self, name: str, hit: bool):
+        result = 'hit' if hit else 'miss'
+        SCANNER_CACHE_LOOKUPS.inc(cache=name, result=result)
+        with self._lock:
+            totals = self.caches.setdefault(name, {'hit': 0, 'miss': 0})
+            totals[result] += 1
+
+    def count(self, kind: str, amount: int = 1):
+        SCANNER_ITEMS.inc(amount, kind=kind)
+        self.items[kind] = self.items.get(kind, 0) + amount
+
+    def link(self, method: str):
+        """Учитывает созданную связь с разбивкой по методу обнаружения."""
+        self.count('link')
+        self.links_by_method[method] = self.links_by_method.get(method, 0) + 1
+
+    def queue_size(self, size: int):
+        SCANNER_QUEUE_SIZE.set(size, session=self.session_id)
+        if size > self.peak_queue:
+            self.peak_queue = size
+
+    def close(self):
+        """Скан закончен: его очередь больше не экспортируется."""
+        SCANNER_QUEUE_SIZE.remove(session=self.session_id)
+
+    def summary(self) -> dict:
+        """Сводка по запуску: время и вызовы по этапам, доля попаданий в кэши."""
+        caches = {}
+        for name, totals in self.caches.items():
+            lookups = totals['hit'] + totals['miss']
+            caches[name] = dict(totals, hit_ratio=round(totals['hit'] / lookups, 3) if lookups else None)
+        return {
+            'elapsed_seconds': round(time.monotonic() - self.started, 3),
+            'stages': {
+                name: dict(totals, seconds=round(totals['seconds'], 3))
+                for name, totals in self.stages.items()
+            },
+            'caches': caches,
+            'network_calls': sum(totals['calls'] for totals in self.stages.values()),
+            'cache_hits': sum(totals['hit'] for totals in self.caches.values()),
+            'items': dict(self.items),
+            'links_by_method': dict(self.links_by_method),
+            'peak_queue': self.peak_queue,
+        }
+
+
+# --- Экспорт из воркеров Celery ---
+
+_server = None
+_server_pid = None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, max_port_tries: int = 32):
+    """
+    Поднимает HTTP-экспорт метрик в фоновом потоке процесса. Вызывается только там, где
+    выполняются задачи: в дочерних процессах prefork (они занимают первые свободные порты
+    начиная с port) или в единственном процессе пула solo/threads. Родитель prefork задач
+    не выполняет, и его метрики пусты — порт ему не нужен.
+    """
+    global _server, _server_pid
+    # Сервер, унаследованный от родителя через fork, в дочернем процессе не работает
+    if _server is not None and _server_pid == os.getpid():
+        return _server.server_address[1]
+    for candidate in range(port, port + max_port_tries):
+        try:
+            _server = ThreadingHTTPServer(('0.0.0.0', candidate), _MetricsHandler)
+        except OSError:
+            continue
+        _server_pid = os.getpid()
+        threading.Thread(target=_server.serve_forever, name='metrics-exporter', daemon=True).start()
+        logger.info(f"Метрики воркера доступны на порту {candidate}")
+        return candidate
+    logger.warning(f"Не удалось занять порт для метрик в диапазоне {port}-{port + max_port_tries - 1}")
+    return None
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scansession',
+            name='base_session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='extensions', to='network.scansession'),
+        ),
+        migrations.AddField(
+            model_name='scansession',
+            name='frontier',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0002_scansession_frontier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scansession',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scansession',
+            name='priority',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='scansession',
+            name='queue',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='scansession',
+            name='requester',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0003_scansession_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scansession',
+            name='estimated_probes',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scansession',
+            name='estimated_runtime',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
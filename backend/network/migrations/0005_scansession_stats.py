@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0004_scansession_estimate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scansession',
+            name='stats',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0005_scansession_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionGraph',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nodes', models.JSONField(default=list)),
+                ('edges', models.JSONField(default=list)),
+                ('summary', models.JSONField(default=dict)),
+                ('layout', models.CharField(blank=True, default='', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='graph', to='network.scansession')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0006_sessiongraph'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessiongraph',
+            name='clusters',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0007_sessiongraph_clusters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Edge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(choices=[('dns', 'DNS A Record'), ('tls', 'TLS Certificate'), ('reverse_dns', 'Reverse DNS')], default='dns', max_length=50)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-first_seen'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EdgeInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('root_domain', models.CharField(max_length=255)),
+                ('start_sequence', models.PositiveIntegerField()),
+                ('end_sequence', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='scansession',
+            name='sequence',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scansession',
+            name='storage',
+            field=models.CharField(choices=[('links', 'Строки Link'), ('edges', 'Edge + EdgeInterval')], default='links', max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='scansession',
+            constraint=models.UniqueConstraint(fields=('root_domain', 'sequence'), name='scansession_root_sequence_unique'),
+        ),
+        migrations.AddField(
+            model_name='edge',
+            name='domain',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges', to='network.domain'),
+        ),
+        migrations.AddField(
+            model_name='edge',
+            name='ip',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges', to='network.ipaddress'),
+        ),
+        migrations.AddField(
+            model_name='edgeinterval',
+            name='edge',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='intervals', to='network.edge'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='edge',
+            unique_together={('domain', 'ip', 'method')},
+        ),
+        migrations.AddIndex(
+            model_name='edgeinterval',
+            index=models.Index(fields=['root_domain', 'end_sequence', 'start_sequence'], name='edgeinterval_root_seq_idx'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:12
+
+"""
+Секционирование network_link по scan_session_id (см. network/partitions.py).
+
+Только PostgreSQL: на других СУБД миграция ничего не делает. Состояние моделей
+Django не меняется — первичный ключ таблицы становится (id, scan_session_id),
+потому что ключ секционирования обязан входить в первичный ключ и уникальные
+ограничения, но id по-прежнему выдается одной последовательностью и уникален.
+"""
+
+from django.conf import settings
+from django.db import migrations
+
+TABLE = 'network_link'
+
+
+def _columns(cursor, table):
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = %s ORDER BY ordinal_position",
+        [table],
+    )
+    return ', '.join(row[0] for row in cursor.fetchall())
+
+
+def _copy(cursor, source, columns):
+    # Ограничения и индексы создаются после переноса строк: так быстрее,
+    # и их имена не конфликтуют с именами старой таблицы
+    cursor.execute(f'INSERT INTO {TABLE} ({columns}) OVERRIDING SYSTEM VALUE SELECT {columns} FROM {source}')
+    cursor.execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), coalesce(max(id), 0) + 1, false) FROM {TABLE}")
+    cursor.execute(f'DROP TABLE {source} CASCADE')
+
+
+def _constraints(cursor, primary_key):
+    cursor.execute(f"""
+        ALTER TABLE {TABLE} ADD PRIMARY KEY ({primary_key});
+        ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_session_domain_ip_uniq
+            UNIQUE (scan_session_id, domain_id, ip_id);
+        ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_scan_session_fk FOREIGN KEY (scan_session_id)
+            REFERENCES network_scansession (id) DEFERRABLE INITIALLY DEFERRED;
+        ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_domain_fk FOREIGN KEY (domain_id)
+            REFERENCES network_domain (id) DEFERRABLE INITIALLY DEFERRED;
+        ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_ip_fk FOREIGN KEY (ip_id)
+            REFERENCES network_ipaddress (id) DEFERRABLE INITIALLY DEFERRED;
+        CREATE INDEX {TABLE}_domain_id_idx ON {TABLE} (domain_id);
+        CREATE INDEX {TABLE}_ip_id_idx ON {TABLE} (ip_id);
+    """)
+
+
+def partition_link(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    size = getattr(settings, 'LINK_PARTITION_SIZE', 1000)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_plain')
+        columns = _columns(cursor, f'{TABLE}_plain')
+        cursor.execute(f"""
+            CREATE TABLE {TABLE} (LIKE {TABLE}_plain INCLUDING DEFAULTS INCLUDING IDENTITY)
+                PARTITION BY RANGE (scan_session_id);
+            CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT;
+        """)
+        # Секции для всех существующих сессий и одна впереди
+        cursor.execute('SELECT min(id), max(id) FROM network_scansession')
+        low, high = cursor.fetchone()
+        for index in range((low or 0) // size, (high or 0) // size + 2):
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_p{index} PARTITION OF {TABLE} '
+                f'FOR VALUES FROM ({index * size}) TO ({(index + 1) * size})'
+            )
+        _copy(cursor, f'{TABLE}_plain', columns)
+        _constraints(cursor, 'id, scan_session_id')
+        cursor.execute(f'CREATE INDEX {TABLE}_session_discovered_idx ON {TABLE} (scan_session_id, discovered_at DESC)')
+
+
+def unpartition_link(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_partitioned')
+        columns = _columns(cursor, f'{TABLE}_partitioned')
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_partitioned INCLUDING DEFAULTS INCLUDING IDENTITY)')
+        _copy(cursor, f'{TABLE}_partitioned', columns)
+        _constraints(cursor, 'id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0008_edge_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_link, unpartition_link),
+    ]
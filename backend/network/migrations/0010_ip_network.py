@@ -0,0 +1,122 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:15
+
+import ipaddress
+import logging
+
+import network.fields
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+
+def _merge_ip(apps, duplicate_id, kept_id):
+    """Связи строки-дубля переходят к строке с тем же нормализованным адресом."""
+    Link = apps.get_model('network', 'Link')
+    Edge = apps.get_model('network', 'Edge')
+    EdgeInterval = apps.get_model('network', 'EdgeInterval')
+    # Link уникальна по (сессия, домен, IP): совпавшие с уже имеющимися удаляются
+    kept_links = set(Link.objects.filter(ip_id=kept_id).values_list('scan_session_id', 'domain_id'))
+    for link in Link.objects.filter(ip_id=duplicate_id):
+        if (link.scan_session_id, link.domain_id) in kept_links:
+            link.delete()
+        else:
+            Link.objects.filter(pk=link.pk).update(ip_id=kept_id)
+    # Edge уникальна по (домен, IP, метод): при совпадении интервалы переносятся на имеющуюся
+    kept_edges = {
+        (edge.domain_id, edge.method): edge for edge in Edge.objects.filter(ip_id=kept_id)
+    }
+    for edge in Edge.objects.filter(ip_id=duplicate_id):
+        target = kept_edges.get((edge.domain_id, edge.method))
+        if target is None:
+            Edge.objects.filter(pk=edge.pk).update(ip_id=kept_id)
+            continue
+        EdgeInterval.objects.filter(edge_id=edge.pk).update(edge_id=target.pk)
+        Edge.objects.filter(pk=target.pk).update(
+            first_seen=min(target.first_seen, edge.first_seen), last_seen=max(target.last_seen, edge.last_seen),
+        )
+        edge.delete()
+
+
+def normalize_addresses(apps, schema_editor):
+    """
+    Перед сменой типа address (в PostgreSQL — inet) адреса приводятся к каноническому
+    виду ipaddress. Строки, которые не разбираются как IP, пишутся в лог и удаляются
+    вместе со связями: приведение varchar → inet на них упало бы. Дубли, появившиеся
+    после нормализации, сливаются со строкой, уже хранящей этот адрес.
+    """
+    IPAddress = apps.get_model('network', 'IPAddress')
+    invalid = []
+    for pk, address in IPAddress.objects.order_by('id').values_list('id', 'address').iterator(chunk_size=BATCH_SIZE):
+        try:
+            normalized = str(ipaddress.ip_address(address.strip()))
+        except ValueError:
+            logger.warning(f"IPAddress {pk}: '{address}' — не IP-адрес, строка удалена")
+            invalid.append(pk)
+            continue
+        if normalized == address:
+            continue
+        kept = IPAddress.objects.filter(address=normalized).exclude(pk=pk).values_list('id', flat=True).first()
+        if kept is None:
+            IPAddress.objects.filter(pk=pk).update(address=normalized)
+        else:
+            logger.warning(f"IPAddress {pk}: '{address}' совпал с {kept} ('{normalized}'), связи перенесены")
+            _merge_ip(apps, pk, kept)
+            IPAddress.objects.filter(pk=pk).delete()
+    for start in range(0, len(invalid), BATCH_SIZE):
+        IPAddress.objects.filter(pk__in=invalid[start:start + BATCH_SIZE]).delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        # Отложенные проверки FK после удалений не дают в той же транзакции выполнить ALTER TABLE
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def fill_network(apps, schema_editor):
+    IPAddress = apps.get_model('network', 'IPAddress')
+    rows = []
+    for ip in IPAddress.objects.filter(cidr__isnull=False).only('id', 'address', 'cidr').iterator(chunk_size=BATCH_SIZE):
+        ip.network = network.fields.primary_network(ip.address, ip.cidr)
+        if ip.network:
+            rows.append(ip)
+        if len(rows) >= BATCH_SIZE:
+            IPAddress.objects.bulk_update(rows, ['network'])
+            rows = []
+    IPAddress.objects.bulk_update(rows, ['network'])
+
+
+def create_gist_indexes(apps, schema_editor):
+    # Индексы для <<= и >>=: GiST с классом операторов inet_ops есть только в PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE INDEX ipaddress_address_gist ON network_ipaddress USING gist (address inet_ops)')
+    schema_editor.execute('CREATE INDEX ipaddress_network_gist ON network_ipaddress USING gist (network inet_ops)')
+
+
+def drop_gist_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS ipaddress_address_gist')
+    schema_editor.execute('DROP INDEX IF EXISTS ipaddress_network_gist')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0009_partition_link'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ipaddress',
+            name='network',
+            field=network.fields.CidrField(blank=True, null=True),
+        ),
+        migrations.RunPython(normalize_addresses, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ipaddress',
+            name='address',
+            field=models.GenericIPAddressField(unique=True),
+        ),
+        migrations.RunPython(fill_network, migrations.RunPython.noop),
+        migrations.RunPython(create_gist_indexes, drop_gist_indexes),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:40
+
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    # Триграммы (pg_trgm) для LIKE '%x%' и 'x%' и B-дерево по reverse(name) для суффиксов;
+    # в SQLite и других базах поиск работает без индексов
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE INDEX domain_name_trgm ON network_domain USING gin (name gin_trgm_ops)')
+    schema_editor.execute('CREATE INDEX domain_name_reverse ON network_domain (reverse(name) text_pattern_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS domain_name_trgm')
+    schema_editor.execute('DROP INDEX IF EXISTS domain_name_reverse')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0010_ip_network'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
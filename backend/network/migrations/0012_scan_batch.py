@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0011_domain_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, default='', max_length=255)),
+                ('depth', models.PositiveIntegerField(default=2)),
+                ('status', models.CharField(choices=[('pending', 'Ожидание'), ('running', 'Выполняется'), ('completed', 'Завершено'), ('failed', 'Ошибка')], default='pending', max_length=20)),
+                ('requester', models.CharField(blank=True, db_index=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('stats', models.JSONField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='scansession',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessions', to='network.scanbatch'),
+        ),
+    ]
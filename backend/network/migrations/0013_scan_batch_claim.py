@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0012_scan_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanbatch',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scanbatch',
+            name='worker',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0013_scan_batch_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ipaddress',
+            name='rdap_checked_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
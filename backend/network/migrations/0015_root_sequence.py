@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0014_ip_rdap_checked_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RootSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('root_domain', models.CharField(max_length=255, unique=True)),
+                ('last_sequence', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
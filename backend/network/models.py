@@ -1,4 +1,5 @@
 from django.db import models
+from .fields import CidrField, primary_network
 import ipaddress
 import uuid
 
@@ -15,9 +16,15 @@ class Domain(models.Model):
 
 class IPAddress(models.Model):
     """IP-адрес"""
-    address = models.CharField(max_length=45, unique=True)  # IPv4 или IPv6
+    address = models.GenericIPAddressField(unique=True)  # IPv4 или IPv6; в PostgreSQL — inet
     organization = models.CharField(max_length=255, null=True, blank=True)
+    # Ответ RDAP как есть: сеть или несколько сетей через запятую
     cidr = models.CharField(max_length=50, null=True, blank=True)
+    # Сеть из cidr, в которую входит адрес; по ней — запросы вхождения (network/fields.py)
+    network = CidrField(null=True, blank=True)
+    # Последний запрос RDAP из фонового обогащения, удачный или нет: по нему
+    # адреса без ответа уходят в конец очереди и не забирают каждый запуск
+    rdap_checked_at = models.DateTimeField(null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -25,8 +32,43 @@ class IPAddress(models.Model):
     
     def __str__(self):
         return self.address
+
+    def save(self, *args, **kwargs):
+        self.network = primary_network(self.address, self.cidr)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'cidr' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'network'}
+        super().save(*args, **kwargs)
     
     
+class ScanBatch(models.Model):
+    """
+    Пакет корневых доменов, сканируемых одной задачей по очереди с общими кэшами
+    (network/batch.py). Каждый корень — своя ScanSession со ссылкой на пакет.
+    """
+    name = models.CharField(max_length=255, blank=True, default='')
+    depth = models.PositiveIntegerField(default=2)
+    status = models.CharField(max_length=20, default='pending', choices=[
+        ('pending', 'Ожидание'),
+        ('running', 'Выполняется'),
+        ('completed', 'Завершено'),
+        ('failed', 'Ошибка'),
+    ])
+    requester = models.CharField(max_length=255, blank=True, default='', db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Итоги по пройденным корням: посещенные домены/IP, связи, сетевые вызовы, попадания в общие кэши
+    stats = models.JSONField(null=True, blank=True)
+    # Процесс, захвативший пакет (хост:pid), и время его последней отметки о работе:
+    # повторно доставленная задача не трогает пакет, пока отметка свежая
+    worker = models.CharField(max_length=255, blank=True, default='')
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Batch {self.name or self.id} ({self.created_at})"
+
+
 class ScanSession(models.Model):
     # Поле для корневого домена, который сканировали
     root_domain = models.CharField(max_length=255, db_index=True)
@@ -43,6 +85,44 @@ class ScanSession(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     # Дата завершения
     completed_at = models.DateTimeField(null=True, blank=True)
+    # Сессия, которую углубляет текущая (None — полный скан с нуля)
+    base_session = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='extensions'
+    )
+    # Домены, на которых обход остановился по лимиту глубины.
+    # None — граница не записывалась (старые сессии), [] — обход исчерпан до лимита.
+    frontier = models.JSONField(null=True, blank=True)
+    # Кто запросил скан (пользователь или IP клиента) — для квот планировщика
+    requester = models.CharField(max_length=255, blank=True, default='', db_index=True)
+    # Очередь Celery и приоритет, назначенные планировщиком
+    queue = models.CharField(max_length=50, blank=True, default='')
+    priority = models.PositiveSmallIntegerField(default=0)
+    # Момент отправки задачи в Celery (None — ждет свободного слота квоты)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    # Оценка стоимости до запуска: число сетевых проб и время в секундах
+    estimated_probes = models.PositiveIntegerField(null=True, blank=True)
+    estimated_runtime = models.PositiveIntegerField(null=True, blank=True)
+    # Итоговая статистика обхода: посещенные домены/IP, связи по методам,
+    # время по этапам, сетевые вызовы против попаданий в кэш, пик очереди
+    stats = models.JSONField(null=True, blank=True)
+    # Где лежат связи сессии: свои строки Link (пока скан идет) или общие Edge с интервалами
+    # (см. network/storage.py). sequence — номер сессии среди сессий своего корня в хранилище Edge.
+    storage = models.CharField(max_length=10, default='links', choices=[
+        ('links', 'Строки Link'),
+        ('edges', 'Edge + EdgeInterval'),
+    ])
+    sequence = models.PositiveIntegerField(null=True, blank=True)
+    # Пакет, в составе которого сканируется корень (None — одиночный скан)
+    batch = models.ForeignKey(ScanBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='sessions')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['root_domain', 'sequence'], name='scansession_root_sequence_unique'),
+        ]
 
     def __str__(self):
         return f"Scan for {self.root_domain} at {self.created_at}"
@@ -83,3 +163,72 @@ class Link(models.Model):
         return f"[{self.scan_session_id}] {self.domain.name} → {self.ip.address}"
 
     
+
+
+class Edge(models.Model):
+    """
+    Связь домен → IP, найденная методом method, — одна строка на все сессии, где она наблюдалась.
+    Поля domain, ip и method называются как у Link, чтобы выборки по сессии не зависели от хранилища.
+    """
+    domain = models.ForeignKey(Domain, on_delete=models.CASCADE, related_name='edges')
+    ip = models.ForeignKey(IPAddress, on_delete=models.CASCADE, related_name='edges')
+    method = models.CharField(max_length=50, default=Link.MethodChoices.DNS, choices=Link.MethodChoices.choices)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('domain', 'ip', 'method')
+        ordering = ['-first_seen']
+
+    def __str__(self):
+        return f"{self.domain_id} → {self.ip_id} ({self.method})"
+
+
+class EdgeInterval(models.Model):
+    """
+    Непрерывный отрезок сессий корня root_domain (по ScanSession.sequence), в каждой из
+    которых связь наблюдалась. Связь, не менявшаяся между ежедневными пересканами,
+    занимает один интервал, который только продлевается.
+    """
+    edge = models.ForeignKey(Edge, on_delete=models.CASCADE, related_name='intervals')
+    root_domain = models.CharField(max_length=255)
+    start_sequence = models.PositiveIntegerField()
+    end_sequence = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['root_domain', 'end_sequence', 'start_sequence'], name='edgeinterval_root_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.edge_id} in {self.root_domain} [{self.start_sequence}..{self.end_sequence}]"
+
+
+class RootSequence(models.Model):
+    """
+    Счетчик номеров сессий корня в хранилище Edge (ScanSession.sequence). Номер только растет
+    и не берется из оставшихся сессий: интервалы удаленной сессии остаются, и повторно
+    выданный номер показал бы новой сессии связи, которых она не видела.
+    """
+    root_domain = models.CharField(max_length=255, unique=True)
+    last_sequence = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.root_domain}: {self.last_sequence}"
+
+
+class SessionGraph(models.Model):
+    """Материализованный граф завершенной сессии с раскладкой узлов"""
+    session = models.OneToOneField(ScanSession, on_delete=models.CASCADE, related_name='graph')
+    # Узлы уже с координатами position {x, y}, ребра и сводка — как в ответе /api/links/graph/
+    nodes = models.JSONField(default=list)
+    edges = models.JSONField(default=list)
+    summary = models.JSONField(default=dict)
+    # Алгоритм раскладки с версией: граф с устаревшей раскладкой пересчитывается
+    layout = models.CharField(max_length=50, blank=True, default='')
+    # Агрегаты кластеров по всем связям сессии (см. network.clusters) — для обзора с уровнем детализации
+    clusters = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Graph of session {self.session_id} ({self.layout})"
@@ -0,0 +1,20 @@
+# backend/network/pagination.py
+
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Пагинация по ключу (keyset): страница — WHERE id < <курсор> ORDER BY id DESC LIMIT n
+    по первичному ключу, без OFFSET и без COUNT(*). Стоимость страницы не зависит от того,
+    насколько далеко она от начала таблицы; в ответе — ссылки next/previous.
+    """
+    ordering = '-id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class NameCursorPagination(IdCursorPagination):
+    """То же по уникальному имени: результаты поиска доменов идут по алфавиту."""
+    ordering = 'name'
@@ -0,0 +1,121 @@
+# backend/network/partitions.py
+
+"""
+Секционирование таблицы network_link в PostgreSQL.
+
+Таблица разбита по диапазонам scan_session_id (LINK_PARTITION_SIZE сессий на секцию,
+секция network_link_p<N> покрывает [N * size, (N + 1) * size)) плюс секция по умолчанию
+для всего, что не попало в диапазоны. Запрос по одной сессии читает только ее секцию,
+а секцию, все сессии которой удалены или перенесены в Edge, можно удалить целиком
+(DROP TABLE) вместо построчного DELETE.
+
+Секции создаются заранее, при создании сессии (ensure_partition). На других СУБД
+(SQLite в тестах) таблица обычная, и функции модуля ничего не делают.
+"""
+
+from django.conf import settings
+from django.db import connection
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'network_link'
+DEFAULT_PARTITION_SIZE = 1000
+# Границы из pg_get_expr: FOR VALUES FROM ('0') TO ('1000')
+BOUND_RE = re.compile(r"FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)")
+
+
+def partition_size() -> int:
+    return getattr(settings, 'LINK_PARTITION_SIZE', DEFAULT_PARTITION_SIZE)
+
+
+def partition_name(index: int) -> str:
+    return f'{TABLE}_p{index}'
+
+
+def is_partitioned() -> bool:
+    """network_link — секционированная таблица PostgreSQL."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def ensure_partition(session_id: int, ahead: int = 1):
+    """
+    Секция для session_id и ahead следующих: строки сессии сразу ложатся в свою секцию,
+    а не в секцию по умолчанию (из которой диапазон потом не выделить без переноса строк).
+    """
+    if not is_partitioned():
+        return
+    size = partition_size()
+    first = session_id // size
+    with connection.cursor() as cursor:
+        for index in range(first, first + ahead + 1):
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {partition_name(index)} PARTITION OF {TABLE} '
+                f'FOR VALUES FROM ({index * size}) TO ({(index + 1) * size})'
+            )
+
+
+def list_partitions():
+    """[(имя, нижняя граница, верхняя граница)] диапазонных секций по возрастанию."""
+    if not is_partitioned():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        # Секция по умолчанию (DEFAULT) диапазона не имеет и не удаляется
+        match = BOUND_RE.search(bound or '')
+        if match:
+            partitions.append((name, int(match.group(1)), int(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def drop_partition(name: str):
+    """Отсоединяет и удаляет секцию — время не зависит от числа строк в ней."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+        cursor.execute(f'DROP TABLE {name}')
+    logger.info(f"Секция {name} удалена")
+
+
+def drop_unused_partitions(keep_session_ids):
+    """
+    Удаляет секции, в диапазон которых не попадает ни одна сессия из keep_session_ids
+    (сессии, чьи строки Link еще нужны). Секция последней сессии не трогается — в нее пишут.
+    Возвращает имена удаленных секций.
+    """
+    partitions = list_partitions()
+    if not partitions:
+        return []
+    keep = sorted(keep_session_ids)
+    newest = partitions[-1][1]
+    dropped = []
+    for name, low, high in partitions:
+        if low >= newest:
+            break
+        if any(low <= session_id < high for session_id in keep):
+            continue
+        drop_partition(name)
+        dropped.append(name)
+    return dropped
+
+
+def create_session_partition(sender, instance, created, **kwargs):
+    """post_save ScanSession: секция для новой сессии появляется до первой строки Link."""
+    if created:
+        ensure_partition(instance.id)
@@ -0,0 +1,198 @@
+# backend/network/psl.py
+
+"""
+Public Suffix List: регистрируемый домен имени по правилам publicsuffix.org.
+
+Список из network/data/public_suffix_list.dat компилируется в префиксное дерево
+по меткам справа налево (com -> example -> ...). Компиляция делается один раз:
+дерево сохраняется marshal-снимком в личном каталоге пользователя процесса внутри
+временного каталога системы (PSL_SNAPSHOT_DIR — свой путь), и следующие процессы
+(воркеры Celery, runserver) только загружают снимок. Загрузка ленивая — при первом
+обращении. Каталог и снимок используются, только если принадлежат пользователю процесса
+и недоступны на запись группе и остальным; иначе дерево просто компилируется в памяти.
+
+Обновить список: скачать https://publicsuffix.org/list/public_suffix_list.dat
+в network/data/ — снимок пересоберется сам, он привязан к хэшу файла.
+"""
+
+from typing import Iterable, List, Optional
+import hashlib
+import logging
+import marshal
+import os
+import stat
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+PSL_PATH = os.path.join(os.path.dirname(__file__), 'data', 'public_suffix_list.dat')
+SNAPSHOT_DIR = os.environ.get(
+    'PSL_SNAPSHOT_DIR',
+    os.path.join(tempfile.gettempdir(), f"internetmap-psl-{getattr(os, 'getuid', lambda: 'user')()}"),
+)
+
+# Служебные ключи узла дерева (не строки, поэтому не пересекаются с метками)
+_END = 0        # на узле заканчивается правило
+_EXCEPTION = 1  # правило-исключение вида !city.kawasaki.jp
+
+_trie = None
+_lock = threading.Lock()
+
+
+def _labels(rule: str) -> List[str]:
+    """Метки правила справа налево; IDN-метки приводятся к punycode, как в DNS."""
+    labels = []
+    for label in reversed(rule.split('.')):
+        if label != '*' and not label.isascii():
+            try:
+                label = label.encode('idna').decode('ascii')
+            except UnicodeError:
+                pass
+        labels.append(label)
+    return labels
+
+
+def compile_rules(lines: Iterable[str]) -> dict:
+    """Строит дерево из строк файла PSL (комментарии и пустые строки пропускаются)."""
+    trie = {}
+    for line in lines:
+        rule = line.strip().split(' ')[0].lower()
+        if not rule or rule.startswith('//'):
+            continue
+        exception = rule.startswith('!')
+        node = trie
+        for label in _labels(rule.lstrip('!')):
+            node = node.setdefault(label, {})
+        node[_EXCEPTION if exception else _END] = True
+    return trie
+
+
+def _snapshot_path(digest: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f'internetmap-psl-{digest[:16]}.marshal')
+
+
+def _trusted_stat(st) -> bool:
+    """Файл или каталог принадлежит этому пользователю и не может быть подменен чужим процессом."""
+    getuid = getattr(os, 'getuid', None)
+    if getuid is not None and st.st_uid != getuid():
+        return False
+    return not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def load(path: str = PSL_PATH) -> dict:
+    """Дерево из снимка, а если его нет, он чужой или от другой версии списка — компилирует и сохраняет."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    snapshot = _snapshot_path(hashlib.sha256(raw).hexdigest())
+    try:
+        os.makedirs(SNAPSHOT_DIR, mode=0o700, exist_ok=True)
+        trusted_dir = _trusted_stat(os.stat(SNAPSHOT_DIR))
+    except OSError:
+        trusted_dir = False
+    if not trusted_dir:
+        logger.warning(f"Каталог снимка PSL {SNAPSHOT_DIR} чужой или открыт на запись, снимок не используется")
+        return compile_rules(raw.decode('utf-8').splitlines())
+
+    try:
+        with open(snapshot, 'rb') as f:
+            if _trusted_stat(os.fstat(f.fileno())):
+                trie = marshal.load(f)
+                if isinstance(trie, dict):
+                    return trie
+            logger.warning(f"Снимок PSL {snapshot} не принят, список компилируется заново")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, EOFError, TypeError) as e:
+        logger.warning(f"Не удалось прочитать снимок PSL {snapshot}: {e}")
+
+    trie = compile_rules(raw.decode('utf-8').splitlines())
+    try:
+        # Пишем во временный файл (mkstemp создает его с правами 0600) и переименовываем,
+        # чтобы параллельные воркеры не читали недописанный
+        fd, tmp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, prefix='internetmap-psl-')
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump(trie, f)
+        os.replace(tmp_path, snapshot)
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить снимок PSL в {snapshot}: {e}")
+    return trie
+
+
+def get_trie() -> dict:
+    global _trie
+    if _trie is None:
+        with _lock:
+            if _trie is None:
+                _trie = load()
+    return _trie
+
+
+def _suffix_length(trie: dict, reversed_labels: List[str]) -> int:
+    """
+    Число меток публичного суффикса. Без совпадений действует правило по умолчанию «*» — одна метка.
+    Исключение отменяет свою последнюю метку, подстановочный «*» совпадает с любой меткой.
+    """
+    node = trie
+    length = 1
+    for depth, label in enumerate(reversed_labels, 1):
+        child = node.get(label)
+        wildcard = node.get('*')
+        if child is not None:
+            if _EXCEPTION in child:
+                return depth - 1
+            if _END in child or wildcard is not None:
+                length = depth
+            node = child
+        elif wildcard is not None:
+            length = depth
+            node = wildcard
+        else:
+            break
+    return length
+
+
+def _normalize(name: str) -> str:
+    name = name.strip().rstrip('.').lower()
+    return name[2:] if name.startswith('*.') else name
+
+
+def public_suffix(name: str) -> Optional[str]:
+    """Публичный суффикс имени: www.example.co.uk -> co.uk."""
+    name = _normalize(name)
+    if not name:
+        return None
+    labels = name.split('.')
+    length = _suffix_length(get_trie(), labels[::-1])
+    return '.'.join(labels[-length:])
+
+
+def registrable_domains(names: Iterable[str]) -> List[Optional[str]]:
+    """
+    Пакетный вариант registrable_domain: один проход по дереву на уникальное имя.
+    Для имен, которые сами являются публичным суффиксом, — None.
+    """
+    trie = get_trie()
+    seen = {}
+    result = []
+    append = result.append
+    for name in names:
+        base = seen.get(name, seen)
+        if base is seen:
+            normalized = _normalize(name)
+            labels = normalized.split('.') if normalized else []
+            length = _suffix_length(trie, labels[::-1])
+            base = '.'.join(labels[-length - 1:]) if len(labels) > length else None
+            seen[name] = base
+        append(base)
+    return result
+
+
+def registrable_domain(name: str) -> Optional[str]:
+    """Регистрируемый домен: a.b.example.co.uk -> example.co.uk; co.uk -> None."""
+    return registrable_domains([name])[0]
+
+
+def is_public_suffix(name: str) -> bool:
+    """Имя само является публичным суффиксом (com, co.uk, github.io) — под ним нечего сканировать."""
+    return bool(_normalize(name)) and registrable_domain(name) is None
@@ -0,0 +1,149 @@
+# backend/network/retention.py
+
+"""
+Политика хранения сессий и сжатие истории.
+
+Для каждого корневого домена (settings.SCAN_RETENTION):
+- сессии младше keep_all_days хранятся все;
+- старше — по одной последней завершенной на каждые snapshot_days дней (снимок);
+- старше max_age_days удаляются (None — хранятся бессрочно);
+- неудачные сессии старше keep_all_days удаляются;
+- незавершенные сессии, их базовые сессии и последняя завершенная сессия корня не удаляются никогда.
+
+Удаление сессий в хранилище Link сначала сбрасывает освободившиеся секции
+network_link целиком (partitions.drop_unused_partitions), а затем удаляет строки сессий.
+В хранилище Edge номера удаленных сессий становятся дырами: интервалы, не содержащие
+ни одной оставшейся сессии, удаляются, соседние интервалы одной связи, между которыми
+не осталось сессий, сливаются, Edge без интервалов удаляются.
+"""
+
+from bisect import bisect_right
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .models import Edge, EdgeInterval, ScanSession
+from . import partitions
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLICY = {'keep_all_days': 14, 'snapshot_days': 7, 'max_age_days': 365}
+DELETE_CHUNK = 500
+
+
+def retention_policy() -> dict:
+    return {**DEFAULT_POLICY, **getattr(settings, 'SCAN_RETENTION', {})}
+
+
+def plan_retention(sessions, now=None, policy=None):
+    """
+    id сессий на удаление. sessions — словари с id, root_domain, status, created_at,
+    base_session_id (values() ScanSession).
+    """
+    now = now or timezone.now()
+    policy = policy or retention_policy()
+    keep_all = now - timedelta(days=policy['keep_all_days'])
+    max_age = now - timedelta(days=policy['max_age_days']) if policy['max_age_days'] is not None else None
+    snapshot_days = max(1, policy['snapshot_days'])
+
+    by_root = {}
+    for session in sessions:
+        by_root.setdefault(session['root_domain'], []).append(session)
+
+    protected = {s['base_session_id'] for s in sessions if s['status'] in ('pending', 'running') and s['base_session_id']}
+    doomed = set()
+    for root_sessions in by_root.values():
+        root_sessions.sort(key=lambda s: (s['created_at'], s['id']), reverse=True)
+        completed = [s for s in root_sessions if s['status'] == 'completed']
+        if completed:
+            protected.add(completed[0]['id'])
+        snapshots = set()
+        for session in root_sessions:
+            if session['status'] in ('pending', 'running') or session['created_at'] >= keep_all:
+                continue
+            if session['status'] != 'completed' or (max_age is not None and session['created_at'] < max_age):
+                doomed.add(session['id'])
+                continue
+            # Корзины отсчитываются от начала эпохи, а не от now: снимки не «плывут» между запусками
+            bucket = session['created_at'].date().toordinal() // snapshot_days
+            if bucket in snapshots:
+                doomed.add(session['id'])
+            else:
+                snapshots.add(bucket)
+    return doomed - protected
+
+
+def _merge_intervals(root_domain: str) -> int:
+    """Сливает соседние интервалы одной связи, между которыми не осталось сессий корня."""
+    surviving = sorted(
+        ScanSession.objects.filter(root_domain=root_domain, sequence__isnull=False).values_list('sequence', flat=True)
+    )
+    merged = 0
+    previous = None
+    updates, deletes = {}, []
+    for interval in EdgeInterval.objects.filter(root_domain=root_domain).order_by('edge_id', 'start_sequence').only(
+        'id', 'edge_id', 'start_sequence', 'end_sequence'
+    ).iterator():
+        if previous is not None and previous.edge_id == interval.edge_id:
+            # Есть ли оставшаяся сессия с номером в (previous.end, interval.start)
+            gap = bisect_right(surviving, interval.start_sequence - 1) - bisect_right(surviving, previous.end_sequence)
+            if gap == 0:
+                previous.end_sequence = interval.end_sequence
+                updates[previous.id] = previous
+                deletes.append(interval.id)
+                merged += 1
+                continue
+        previous = interval
+    with transaction.atomic():
+        EdgeInterval.objects.bulk_update(updates.values(), ['end_sequence'], batch_size=DELETE_CHUNK)
+        for start in range(0, len(deletes), DELETE_CHUNK):
+            EdgeInterval.objects.filter(id__in=deletes[start:start + DELETE_CHUNK]).delete()
+    return merged
+
+
+def compact_edges(roots, older_than) -> dict:
+    """
+    Приводит интервалы корней roots в соответствие с оставшимися сессиями.
+    Edge без интервалов удаляются, если не видели их с older_than (свежие могут
+    быть как раз перенесены store_session_edges, интервалы у них появятся).
+    """
+    alive = ScanSession.objects.filter(
+        root_domain=OuterRef('root_domain'),
+        sequence__gte=OuterRef('start_sequence'),
+        sequence__lte=OuterRef('end_sequence'),
+    )
+    result = {'intervals_deleted': 0, 'intervals_merged': 0, 'edges_deleted': 0}
+    for root_domain in sorted(roots):
+        deleted, _ = EdgeInterval.objects.filter(root_domain=root_domain).exclude(Exists(alive)).delete()
+        result['intervals_deleted'] += deleted
+        result['intervals_merged'] += _merge_intervals(root_domain)
+    result['edges_deleted'], _ = Edge.objects.filter(intervals__isnull=True, last_seen__lt=older_than).delete()
+    return result
+
+
+def apply_retention(now=None, dry_run: bool = False) -> dict:
+    """Применяет политику хранения; возвращает сводку (при dry_run — только план)."""
+    now = now or timezone.now()
+    policy = retention_policy()
+    sessions = list(ScanSession.objects.values('id', 'root_domain', 'status', 'created_at', 'base_session_id', 'storage'))
+    doomed = plan_retention(sessions, now=now, policy=policy)
+    summary = {'sessions_deleted': len(doomed), 'partitions_dropped': []}
+    if dry_run or not doomed:
+        return summary
+
+    # Секции, где не осталось ни одной сессии в хранилище Link, удаляются целиком
+    keep_links = [s['id'] for s in sessions if s['id'] not in doomed and s['storage'] == 'links']
+    summary['partitions_dropped'] = partitions.drop_unused_partitions(keep_links)
+
+    ids = sorted(doomed)
+    for start in range(0, len(ids), DELETE_CHUNK):
+        ScanSession.objects.filter(id__in=ids[start:start + DELETE_CHUNK]).delete()
+
+    roots = {s['root_domain'] for s in sessions if s['id'] in doomed and s['storage'] == 'edges'}
+    summary.update(compact_edges(roots, older_than=now - timedelta(days=policy['keep_all_days'])))
+    logger.info(f"Хранение сессий: удалено {summary['sessions_deleted']} сессий, "
+                f"секций {len(summary['partitions_dropped'])}, интервалов {summary['intervals_deleted']}, "
+                f"слито {summary['intervals_merged']}, связей Edge {summary['edges_deleted']}")
+    return summary
@@ -1,17 +1,22 @@
 # backend/network/scanner.py
 
 from collections import deque
+from contextlib import nullcontext
+from django.db import DatabaseError, IntegrityError, transaction
 from .models import Domain, IPAddress, Link
+from .storage import session_links
 from .tools import (
     get_domains_from_ip_reverse_dns,
-    rdap_lookup,
-    fetch_crtsh_json,
-    extract_common_names,
+    iter_crtsh_names,
+    iter_cached_crtsh_names,
     get_domains_from_tls, 
     scan_subnet_for_tls,
     scan_subnet_with_nmap,
-    get_subdomains_with_theharvester
-)
+    get_subdomains_with_theharvester)
+from .enrichment import RdapEnricher, save_enrichment
+from .caches import MISSING, NullCache, get_cache
+from .metrics import ScanStats
+from .psl import registrable_domains
 import logging
 import dns.resolver
 import dns.exception
@@ -24,91 +29,181 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Сколько имен в одном SELECT ... IN при заполнении словарей pk
+PK_LOOKUP_CHUNK = 900
+# Предел длины имени в DNS
+MAX_DOMAIN_LENGTH = 253
+
+
 class InternetMapScanner:
-    def __init__(self, session, max_depth=3, max_rate_limit=1.0):
+    # Порт, на котором снимается TLS-сертификат с IP
+    tls_port = 443
+
+    def __init__(self, session, max_depth=3, max_rate_limit=1.0, context=None):
         self.session = session
+        # Общие кэши пакетного скана (network/batch.py, ScanContext); None — кэши процесса
+        self.context = context
         self.max_depth = max_depth
         self.max_rate_limit = max_rate_limit
         self.visited_domains = set()
         self.visited_ips = set()
         self.scanned_subnets = set()
         self.queue = deque()
+        # Домены, отброшенные по лимиту глубины, — точка продолжения для углубления
+        self.frontier = []
+        # Время по этапам, кэши и счетчики этого запуска (+ глобальные метрики процесса)
+        self.stats = ScanStats(session_id=getattr(session, 'id', None))
+        # name -> pk для Domain и IPAddress: связи сохраняются без SELECT по уникальным таблицам
+        self.domain_pks = {}
+        self.ip_pks = {}
+        # RDAP идет в фоне (network/enrichment.py); пул создается при первом IP
+        self.enricher = None
 
     def scan(self, root_domain: str):
         logger.info(f"Начинаем сканирование: {root_domain}")
         self.queue.clear()
         self.queue.append((root_domain, 0))
+        return self._crawl()
 
-        while self.queue:
-            domain, depth = self.queue.popleft()
-            
-            if domain in self.visited_domains:
-                continue
-            
-            logger.info(f"[Глубина {depth}] Сканируем: {domain}")
-            self.visited_domains.add(domain)
+    def extend(self, base_session):
+        """
+        Углубляет завершенный скан base_session до self.max_depth.
+        Связи базовой сессии переносятся в текущую, а BFS продолжается только
+        с ее границы (доменов, отброшенных по лимиту глубины base_session.depth).
+        """
+        logger.info(f"Углубляем скан {base_session.id} ({base_session.root_domain}): "
+                    f"{base_session.depth} → {self.max_depth}")
+        frontier = set(base_session.frontier or [])
+        base_links = list(
+            session_links(base_session)
+            .values_list('domain_id', 'domain__name', 'ip_id', 'ip__address', 'ip__cidr', 'method')
+        )
 
-            if depth >= self.max_depth:
-                logger.info(f"Достигнут лимит глубины {self.max_depth} для ветки {domain}")
-                continue
+        Link.objects.bulk_create(
+            [
+                Link(scan_session=self.session, domain_id=domain_id, ip_id=ip_id, method=method)
+                for domain_id, _, ip_id, _, _, method in base_links
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        logger.info(f"Перенесено {len(base_links)} связей из сессии {base_session.id}")
 
-            # ШАГ 1: DNS запрос (с правильной обработкой CNAME)
-            ips = self._get_ips_for_domain(domain)
-            if not ips:
-                logger.warning(f"Не найдено IP адресов для {domain}, пропускаем.")
-                # Если IP нет, нужно обработать crt.sh и выйти
-                self._process_crtsh_subdomains(domain, depth)
-                continue
+        # Все, что базовый скан уже обошел, повторно не трогаем
+        for domain_id, domain_name, ip_id, ip_address, cidr, method in base_links:
+            self.domain_pks[domain_name] = domain_id
+            self.ip_pks[ip_address] = ip_id
+            if domain_name not in frontier:
+                self.visited_domains.add(domain_name)
+            if method == 'dns':
+                self.visited_ips.add(ip_address)
+                if cidr:
+                    self.scanned_subnets.add(cidr)
 
-            logger.info(f"Найдено {len(ips)} IP адресов для {domain}: {ips}")
+        self.queue.clear()
+        for domain in sorted(frontier):
+            self.queue.append((domain, base_session.depth))
+        return self._crawl()
 
-            for ip in ips:
-                # Сохраняем основную связь Домен -> IP
-                self._save_link(self.session, domain, ip, method='dns')
-                
-                if ip in self.visited_ips:
-                    continue
-                
-                self.visited_ips.add(ip)
-
-                # ШАГ 2: Reverse DNS
-                reverse_domains = get_domains_from_ip_reverse_dns(ip)
-                logger.info(f"Найдено {len(reverse_domains)} обратных доменов для IP {ip}")
-                for rev_domain in reverse_domains:
-                    if rev_domain not in self.visited_domains:
-                        self.queue.append((rev_domain, depth + 1))
-                        logger.info(f"Добавлен в очередь (Reverse DNS): {rev_domain}")
-
-                # ШАГ 2.5: SSL-сертификат на самом IP
-                tls_domains = get_domains_from_tls(ip)
-                logger.info(f"Найдено {len(tls_domains)} доменов из SSL для IP {ip}")
-                for tls_domain in tls_domains:
-                    if tls_domain not in self.visited_domains:
-                        self._save_link(self.session, tls_domain, ip, method='tls-cert')
-                        self.queue.append((tls_domain, depth + 1))
-                        logger.info(f"Добавлен в очередь (SSL): {tls_domain}")
-                
-                # ШАГ 2.6: Сканирование подсети
-                self._scan_ip_subnet(ip, depth)
+    def _crawl(self):
+        try:
+            while True:
+                # Ответы RDAP, пришедшие в фоне; когда очередь пуста, ждем оставшиеся
+                self._apply_enrichment(block=not self.queue)
+                if not self.queue:
+                    break
+                self.stats.queue_size(len(self.queue))
+                self._visit(*self.queue.popleft())
+        finally:
+            self.stats.close()
+            if self.enricher is not None:
+                self.enricher.close()
+                self.enricher = None
+
+        logger.info(f"Сканирование завершено. Найдено доменов: {len(self.visited_domains)}, IP: {len(self.visited_ips)}")
+        return len(self.visited_domains), len(self.visited_ips)
+
+    def _visit(self, domain: str, depth: int):
+        """Один шаг BFS: домен из очереди."""
+        if domain in self.visited_domains:
+            return
+        
+        logger.info(f"[Глубина {depth}] Сканируем: {domain}")
+        self.visited_domains.add(domain)
+
+        if depth >= self.max_depth:
+            logger.info(f"Достигнут лимит глубины {self.max_depth} для ветки {domain}")
+            self.frontier.append(domain)
+            return
+
+        self.stats.count('domain')
+
+        # ШАГ 1: DNS запрос (с правильной обработкой CNAME)
+        ips = self._cached('resolve', domain, 'dns', lambda: self._get_ips_for_domain(domain))
+        if not ips:
+            logger.warning(f"Не найдено IP адресов для {domain}, пропускаем.")
+            # Если IP нет, нужно обработать crt.sh и выйти
+            self._process_crtsh_subdomains(domain, depth)
+            return
+
+        logger.info(f"Найдено {len(ips)} IP адресов для {domain}: {ips}")
 
-            # ШАГ 3: Поиск поддоменов через theHarvester
-            logger.info(f"Запускаем theHarvester для поиска поддоменов {domain}...")
+        self._warm_pks(domains=[domain], ips=ips)
+        for ip in ips:
+            # Сохраняем основную связь Домен -> IP
+            self._save_link(self.session, domain, ip, method='dns')
             
+            if ip in self.visited_ips:
+                continue
             
-            subdomains_info = get_subdomains_with_theharvester(domain)
+            self.visited_ips.add(ip)
+            self.stats.count('ip')
 
-            for sub_domain, sub_ip in subdomains_info:
-                # Добавляем найденный поддомен в очередь, если еще не были на нем
-                if sub_domain not in self.visited_domains:
-                    self.queue.append((sub_domain, depth + 1))
-                    logger.info(f"Добавлен в очередь (theHarvester): {sub_domain}")
-                
-                # Если theHarvester сразу нашел IP, создаем связь
-                if sub_ip:
-                    self._save_link(self.session, sub_domain, sub_ip, method='harvester')
+            # ШАГ 2: Reverse DNS
+            reverse_domains = self._scannable(
+                self._cached('reverse_dns', ip, 'reverse_dns', lambda: get_domains_from_ip_reverse_dns(ip))
+            )
+            logger.info(f"Найдено {len(reverse_domains)} обратных доменов для IP {ip}")
+            for rev_domain in reverse_domains:
+                if rev_domain not in self.visited_domains:
+                    self.queue.append((rev_domain, depth + 1))
+                    logger.info(f"Добавлен в очередь (Reverse DNS): {rev_domain}")
 
-        logger.info(f"Сканирование завершено. Найдено доменов: {len(self.visited_domains)}, IP: {len(self.visited_ips)}")
-        return len(self.visited_domains), len(self.visited_ips)
+            # ШАГ 2.5: SSL-сертификат на самом IP
+            tls_domains = self._scannable(
+                self._cached('tls', ip, 'tls', lambda: get_domains_from_tls(ip, self.tls_port))
+            )
+            logger.info(f"Найдено {len(tls_domains)} доменов из SSL для IP {ip}")
+            self._warm_pks(domains=[name for name in tls_domains if name not in self.visited_domains])
+            for tls_domain in tls_domains:
+                if tls_domain not in self.visited_domains:
+                    self._save_link(self.session, tls_domain, ip, method='tls-cert')
+                    self.queue.append((tls_domain, depth + 1))
+                    logger.info(f"Добавлен в очередь (SSL): {tls_domain}")
+            
+            # ШАГ 2.6: Сканирование подсети
+            self._scan_ip_subnet(ip, domain, depth)
+
+        # ШАГ 3: Поиск поддоменов через theHarvester
+        logger.info(f"Запускаем theHarvester для поиска поддоменов {domain}...")
+        
+        
+        subdomains_info = self._cached('harvester', domain, 'harvester', lambda: get_subdomains_with_theharvester(domain))
+
+        scannable = set(self._scannable(sub_domain for sub_domain, _ in subdomains_info))
+        resolved = [(sub_domain, sub_ip) for sub_domain, sub_ip in subdomains_info if sub_ip and sub_domain in scannable]
+        self._warm_pks(domains=[sub_domain for sub_domain, _ in resolved], ips=[sub_ip for _, sub_ip in resolved])
+        for sub_domain, sub_ip in subdomains_info:
+            if sub_domain not in scannable:
+                continue
+            # Добавляем найденный поддомен в очередь, если еще не были на нем
+            if sub_domain not in self.visited_domains:
+                self.queue.append((sub_domain, depth + 1))
+                logger.info(f"Добавлен в очередь (theHarvester): {sub_domain}")
+            
+            # Если theHarvester сразу нашел IP, создаем связь
+            if sub_ip:
+                self._save_link(self.session, sub_domain, sub_ip, method='harvester')
 
     def _get_ips_for_domain(self, domain_name: str, max_cname_hops=5) -> list:
         """Рекурсивно получает IP-адреса для домена, следуя по цепочке CNAME."""
@@ -140,25 +235,56 @@ class InternetMapScanner:
             logger.error(f"Непредвиденная ошибка DNS для {domain_name}: {e}")
             return []
 
+    def _scannable(self, names) -> list:
+        """
+        Отбрасывает имена, которые сами являются публичными суффиксами (com, co.uk, github.io):
+        такие встречаются в SAN сертификатов и PTR-записях, а crt.sh и theHarvester по ним
+        выгружают чужие домены всей зоны.
+        """
+        names = list(names)
+        return [name for name, base in zip(names, registrable_domains(names)) if base]
+
     def _process_crtsh_subdomains(self, domain: str, depth: int):
-        """Получает поддомены из crt.sh и добавляет их в очередь."""
-        subdomains = self._get_subdomains_from_crtsh(domain)
-        logger.info(f"Найдено {len(subdomains)} прямых поддоменов из crt.sh для {domain}")
-        for subdomain in subdomains:
+        """Добавляет в очередь поддомены из crt.sh по мере разбора ответа."""
+        found = 0
+        for subdomain in self._get_subdomains_from_crtsh(domain):
+            found += 1
             if subdomain not in self.visited_domains:
                 self.queue.append((subdomain, depth + 1))
                 logger.info(f"Добавлен в очередь (crt.sh): {subdomain}")
+        logger.info(f"Найдено {found} прямых поддоменов из crt.sh для {domain}")
 
     def _scan_ip_subnet(self, ip: str, parent_domain: str, current_depth: int):
-        """Определяет подсеть для IP и запускает ее сканирование."""
+        """
+        Ставит IP в очередь RDAP и сразу возвращается. Сеть и организация запишутся,
+        а подсеть просканируется, когда придет ответ (_apply_enrichment).
+        """
+        if self.enricher is None:
+            self.enricher = RdapEnricher(stats=self.stats, cache=self._cache('rdap'))
+        self.enricher.submit(ip, (parent_domain, current_depth))
+
+    def _apply_enrichment(self, block: bool = False):
+        """
+        Забирает готовые ответы RDAP: пишет их одним bulk_update и сканирует новые подсети.
+        block=True — дождаться хотя бы одного ответа, если запросы еще в полете.
+        """
+        if self.enricher is None or not len(self.enricher):
+            return
+        results = self.enricher.poll(block=block)
+        if not results:
+            return
         try:
-            cidr, org = rdap_lookup(ip)
-            ip_obj, _ = IPAddress.objects.get_or_create(address=ip)
-            ip_obj.organization = org
-            ip_obj.cidr = cidr
-            ip_obj.save()
-            
-            if cidr and cidr not in self.scanned_subnets:
+            save_enrichment(results, lambda address, _: self._pk(self.ip_pks, 'ip_pk', IPAddress, 'address', address))
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить данные RDAP для {len(results)} IP: {e}")
+        for ip, cidr, _, (parent_domain, depth) in results:
+            if cidr:
+                self._scan_subnet(ip, cidr, parent_domain, depth)
+
+    def _scan_subnet(self, ip: str, cidr: str, parent_domain: str, current_depth: int):
+        """Nmap-сканирование подсети cidr, найденной по RDAP для ip."""
+        try:
+            if cidr not in self.scanned_subnets:
                 network = ipaddress.ip_network(cidr, strict=False)
                 if network.prefixlen < 24: # Ограничиваем размер подсети
                     logger.warning(f"Подсеть {cidr} слишком большая, пропускаем.")
@@ -167,8 +293,10 @@ class InternetMapScanner:
                 logger.info(f"Начинаем Nmap-сканирование новой подсети: {cidr} (найдена от {parent_domain})")
                 self.scanned_subnets.add(cidr)
 
-                subnet_results = scan_subnet_with_nmap(cidr)
+                subnet_results = self._cached('nmap', cidr, 'nmap', lambda: scan_subnet_with_nmap(cidr))
                 for found_ip, found_domains in subnet_results:
+                    found_domains = self._scannable(found_domains)
+                    self._warm_pks(domains=found_domains)
                     for found_domain in found_domains:
                         # Создаем связь между НАЙДЕННЫМ доменом и РОДИТЕЛЬСКИМ доменом,
                         # используя IP родительского домена как точку связи.
@@ -178,52 +306,164 @@ class InternetMapScanner:
                             self.queue.append((found_domain, current_depth + 1)) # Увеличиваем глубину
                             logger.info(f"Добавлен в очередь (Subnet Scan): {found_domain}")
             
-            elif cidr:
+            else:
                 logger.debug(f"Подсеть {cidr} уже сканировалась, пропускаем.")
         
         except Exception as e:
             logger.warning(f"Не удалось обработать подсеть для IP {ip}: {e}")
     
-    def _get_subdomains_from_crtsh(self, domain: str) -> set:
-        """Получить ТОЛЬКО ПРЯМЫЕ поддомены из crt.sh."""
-        subdomains = set()
+    def _get_subdomains_from_crtsh(self, domain: str):
+        """
+        ТОЛЬКО ПРЯМЫЕ поддомены из crt.sh (CN и SAN), по одному по мере загрузки ответа.
+        Имена приходят уже уникальными.
+        """
+        suffix = '.' + domain
+        labels = domain.count('.') + 2
+        names = iter_cached_crtsh_names(domain)
+        self.stats.cache('crtsh', hit=names is not None)
+        total = direct = 0
+        if names is None:
+            names, stage = iter_crtsh_names(domain, use_cache=True), self.stats.stage('crtsh')
+        else:
+            stage = nullcontext()
         try:
-            crtsh_data = fetch_crtsh_json(domain, use_cache=True, debug=False)
-            common_names = extract_common_names(crtsh_data)
-            base_parts = domain.split('.')
-            
-            for name in common_names:
-                if name == domain or name.startswith('*.'):
-                    continue
-                if not name.endswith('.' + domain):
-                    continue
-                
-                name_parts = name.split('.')
-                if len(name_parts) == len(base_parts) + 1:
-                    subdomains.add(name)
-            
-            logger.debug(f"crt.sh {domain}: {len(common_names)} записей, {len(subdomains)} прямых")
+            with stage:
+                for name in names:
+                    total += 1
+                    if name.startswith('*.') or not name.endswith(suffix) or name.count('.') + 1 != labels:
+                        continue
+                    direct += 1
+                    yield name
         except Exception as e:
             logger.warning(f"crt.sh ошибка для {domain}: {e}")
-        return subdomains
-    
+        logger.debug(f"crt.sh {domain}: {total} имен, {direct} прямых")
+
+    def _cache(self, name: str):
+        """Кэш name: общий кэш пакета, если сканер в пакете и кэш в нем есть, иначе кэш процесса."""
+        if self.context is not None:
+            cache = self.context.cache(name)
+            if cache is not None:
+                return cache
+        return get_cache(name)
+
+    def _cached(self, name: str, key, stage: str, compute):
+        """
+        Значение из кэша name (см. _cache), а при промахе — compute() под замером этапа stage.
+        Без кэша (NullCache: кэши процесса выключены, сканер не в пакете) — просто вызов compute().
+        Пустой ответ кэшируется только на negative_ttl кэша: это может быть временный сбой.
+        """
+        cache = self._cache(name)
+        value = cache.get(key, MISSING)
+        if value is not MISSING:
+            self.stats.cache(name, hit=True)
+            return value
+        if not isinstance(cache, NullCache):
+            self.stats.cache(name, hit=False)
+        with self.stats.stage(stage):
+            value = compute()
+        cache.set_result(key, value)
+        return value
+
+    def _warm_pks(self, domains=(), ips=()):
+        """
+        Заполняет domain_pks/ip_pks для пачки имен, которые сейчас будут связаны:
+        сначала из кэша процесса, остальное — одним SELECT ... IN на пачку.
+        Отсутствующие строки создаются одним bulk_create. Значения, которые не могут быть
+        именем или адресом, в пачку не попадают: их отбросит _save_link по одной связи.
+        """
+        self._warm(self.domain_pks, 'domain_pk', Domain, 'name', [
+            name for name in domains
+            if isinstance(name, str) and 0 < len(name) <= MAX_DOMAIN_LENGTH
+        ])
+        self._warm(self.ip_pks, 'ip_pk', IPAddress, 'address', [ip for ip in ips if self._valid_ip(ip)])
+
+    @staticmethod
+    def _valid_ip(value) -> bool:
+        try:
+            ipaddress.ip_address(value)
+        except ValueError:
+            return False
+        return True
+
+    def _warm(self, pks: dict, cache_name: str, model, field: str, values):
+        """
+        Прогрев одной таблицы. Ошибка базы на пачке не роняет сессию: точка сохранения
+        откатывается, и pk добираются по одному через _pk.
+        """
+        cache = self._cache(cache_name)
+        missing = []
+        for value in set(values):
+            if value in pks:
+                continue
+            pk = cache.get(value)
+            if pk is None:
+                missing.append(value)
+            else:
+                pks[value] = pk
+        if not missing:
+            return
+
+        try:
+            with transaction.atomic():
+                found = self._pks_by(model, field, missing)
+                new = [value for value in missing if value not in found]
+                if new:
+                    model.objects.bulk_create([model(**{field: value}) for value in new], ignore_conflicts=True)
+                    found.update(self._pks_by(model, field, new))
+        except DatabaseError as e:
+            logger.warning(f"Пакетный поиск pk {model.__name__} не удался, переходим к построчному: {e}")
+            return
+        pks.update(found)
+        cache.update(found.items())
+
+    @staticmethod
+    def _pks_by(model, field: str, values: list) -> dict:
+        """Словарь значение -> pk, порциями по PK_LOOKUP_CHUNK (лимит параметров SQLite — 999)."""
+        pks = {}
+        for start in range(0, len(values), PK_LOOKUP_CHUNK):
+            chunk = values[start:start + PK_LOOKUP_CHUNK]
+            pks.update(model.objects.filter(**{f'{field}__in': chunk}).values_list(field, 'id'))
+        return pks
+
+    def _pk(self, pks: dict, cache_name: str, model, field: str, value: str) -> int:
+        """
+        pk строки Domain/IPAddress по уникальному полю: словарь сканера, кэш процесса
+        и только в последнюю очередь get_or_create (для имен, не прошедших через _warm_pks).
+        """
+        pk = pks.get(value)
+        if pk is None:
+            cache = self._cache(cache_name)
+            pk = cache.get(value)
+            if pk is None:
+                pk = model.objects.get_or_create(**{field: value})[0].pk
+                cache.set(value, pk)
+            pks[value] = pk
+        return pk
+
     def _save_link(self, session, domain_name_arg: str, ip_address_arg: str, method: str = 'dns'):
         """
         Сохраняет связь.
         """
         try:
-            domain_obj, _ = Domain.objects.get_or_create(name=domain_name_arg)
-            ip_obj, _ = IPAddress.objects.get_or_create(address=ip_address_arg)
-            
-            link, created = Link.objects.get_or_create(
-                scan_session=session,
-                domain=domain_obj,
-                ip=ip_obj,
-                defaults={'method': method}
-            )
+            for retry in (False, True):
+                domain_id = self._pk(self.domain_pks, 'domain_pk', Domain, 'name', domain_name_arg)
+                ip_id = self._pk(self.ip_pks, 'ip_pk', IPAddress, 'address', ip_address_arg)
+                try:
+                    link, created = Link.objects.get_or_create(
+                        scan_session=session, domain_id=domain_id, ip_id=ip_id, defaults={'method': method}
+                    )
+                    break
+                except IntegrityError:
+                    if retry:
+                        raise
+                    # pk из кэша устарел: строку удалили в другом процессе — берем заново
+                    self.domain_pks.pop(domain_name_arg, None)
+                    self.ip_pks.pop(ip_address_arg, None)
+                    self._cache('domain_pk').discard(domain_name_arg)
+                    self._cache('ip_pk').discard(ip_address_arg)
             if created:
+                self.stats.link(method)
                 logger.info(f" Создана связь: {domain_name_arg} → {ip_address_arg}")
 
         except Exception as e:
             logger.error(f"Критическая ошибка при сохранении связи '{domain_name_arg}' -> '{ip_address_arg}': {e}")
-
@@ -0,0 +1,106 @@
+# backend/network/scheduler.py
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import ScanSession
+from .tasks import run_scanner_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE_QUEUE = 'scans.interactive'
+BATCH_QUEUE = 'scans.batch'
+
+# Классы приоритета: (макс. глубина, очередь, приоритет Celery).
+# Для Redis меньшее число — более высокий приоритет.
+DEFAULT_PRIORITY_CLASSES = [
+    (1, INTERACTIVE_QUEUE, 0),
+    (2, INTERACTIVE_QUEUE, 3),
+    (None, BATCH_QUEUE, 6),
+]
+
+
+def classify(depth: int, estimated_cost: int = None) -> tuple:
+    """
+    Возвращает (очередь, приоритет) для скана по запрошенной глубине и оценке стоимости.
+    Дорогие сканы уходят в пакетную очередь независимо от глубины.
+    """
+    max_interactive_cost = getattr(settings, 'SCAN_INTERACTIVE_MAX_COST', None)
+    if estimated_cost is not None and max_interactive_cost is not None and estimated_cost > max_interactive_cost:
+        return BATCH_QUEUE, DEFAULT_PRIORITY_CLASSES[-1][2]
+
+    for max_depth, queue, priority in getattr(settings, 'SCAN_PRIORITY_CLASSES', DEFAULT_PRIORITY_CLASSES):
+        if max_depth is None or depth <= max_depth:
+            return queue, priority
+    return BATCH_QUEUE, DEFAULT_PRIORITY_CLASSES[-1][2]
+
+
+def requester_from_request(request) -> str:
+    """
+    Идентификатор заказчика скана: имя пользователя или IP клиента.
+    X-Forwarded-For учитывается, только если запрос пришел от прокси из settings.TRUSTED_PROXIES:
+    адреса цепочки идут справа налево, доверенные прокси пропускаются, первый чужой — клиент.
+    Иначе заголовок задает сам клиент и обходит квоту, меняя его в каждом запросе.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.get_username()}"
+    trusted = set(getattr(settings, 'TRUSTED_PROXIES', []))
+    address = request.META.get('REMOTE_ADDR', '')
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded and address in trusted:
+        for hop in reversed([hop.strip() for hop in forwarded.split(',') if hop.strip()]):
+            address = hop
+            if hop not in trusted:
+                break
+    return f"ip:{address}"
+
+
+def submit_scan(session: ScanSession, estimated_cost: int = None) -> bool:
+    """
+    Ставит сессию в планировщик вместо прямого run_scanner_task.delay.
+    Возвращает True, если задача сразу ушла в Celery, и False, если ждет квоты.
+    """
+    session.queue, session.priority = classify(session.depth, estimated_cost)
+    session.save(update_fields=['queue', 'priority'])
+    dispatched = dispatch_waiting(session.requester)
+    return session.id in dispatched
+
+
+def dispatch_waiting(requester: str) -> list:
+    """
+    Отправляет в Celery ожидающие сессии заказчика, пока не исчерпана его квота
+    одновременных сканов. Вызывается при постановке и при завершении каждого скана.
+    Сессии пакетов (network/batch.py) не в счет: их проходит задача пакета.
+    """
+    quota = getattr(settings, 'SCAN_REQUESTER_CONCURRENCY', 2)
+    # Слот, занятый задачей, которая так и не завершилась, со временем освобождается
+    slot_timeout = getattr(settings, 'SCAN_SLOT_TIMEOUT', timedelta(hours=6))
+    now = timezone.now()
+    dispatched = []
+
+    with transaction.atomic():
+        # Блокируем незавершенные сессии заказчика, чтобы параллельные вызовы не превысили квоту
+        sessions = list(
+            ScanSession.objects.select_for_update()
+            .filter(requester=requester, status__in=['pending', 'running'], batch__isnull=True)
+            .order_by('priority', 'created_at')
+        )
+        active = sum(1 for s in sessions if s.dispatched_at and s.dispatched_at >= now - slot_timeout)
+        slots = quota - active
+        if slots <= 0:
+            return dispatched
+
+        waiting = [s for s in sessions if s.dispatched_at is None and s.status == 'pending'][:slots]
+        for session in waiting:
+            session.dispatched_at = now
+            session.save(update_fields=['dispatched_at'])
+            dispatched.append(session.id)
+            transaction.on_commit(
+                lambda s=session: run_scanner_task.apply_async(args=[s.id], queue=s.queue, priority=s.priority)
+            )
+            logger.info(f"Сессия {session.id} отправлена в очередь {session.queue} (приоритет {session.priority})")
+
+    return dispatched
@@ -0,0 +1,58 @@
+# backend/network/search.py
+
+"""
+Поиск доменов по шаблону с одной звездочкой:
+
+    *.tyuiu.ru  — поддомены (суффикс): индекс по reverse(name) с text_pattern_ops,
+                  запрос reverse(name) LIKE 'ur.uiuyt.%' идет по B-дереву;
+    mail*       — префикс, LIKE 'mail%';
+    tyuiu       — подстрока, LIKE '%tyuiu%'.
+
+Префикс и подстрока покрыты GIN-индексом pg_trgm по name (миграция 0011), поэтому
+ни один вид запроса не сканирует таблицу Domain целиком. Имена хранятся в нижнем регистре,
+шаблон приводится к нему же и сравнивается LIKE, а не ILIKE: UPPER(name) индексом не покрыт.
+"""
+
+from django.db.models.functions import Reverse
+from .models import Domain
+from .storage import session_links
+
+# Короче трех символов подстрока не дает ни одной триграммы и читает весь индекс
+MIN_SUBSTRING = 3
+
+
+def parse_query(query):
+    """
+    Шаблон -> (вид, строка): 'suffix' | 'prefix' | 'substring'.
+    ValueError — пустой шаблон, звездочка в середине или слишком короткая подстрока.
+    """
+    query = (query or '').strip().lower().rstrip('.')
+    if query.startswith('*'):
+        kind, text = 'suffix', query[1:]
+    elif query.endswith('*'):
+        kind, text = 'prefix', query[:-1]
+    else:
+        kind, text = 'substring', query
+    if not text or '*' in text:
+        raise ValueError(f"Некорректный шаблон: '{query}'")
+    if kind == 'substring' and len(text) < MIN_SUBSTRING:
+        raise ValueError(f"Подстрока короче {MIN_SUBSTRING} символов")
+    return kind, text
+
+
+def search_domains(query, session=None, queryset=None):
+    """
+    Домены по шаблону (см. модуль); с session — только встреченные в связях этой сессии.
+    Возвращает ленивый queryset без сортировки: порядок задает вызывающий.
+    """
+    kind, text = parse_query(query)
+    domains = (Domain.objects.all() if queryset is None else queryset).order_by()
+    if kind == 'suffix':
+        domains = domains.annotate(reversed_name=Reverse('name')).filter(reversed_name__startswith=text[::-1])
+    elif kind == 'prefix':
+        domains = domains.filter(name__startswith=text)
+    else:
+        domains = domains.filter(name__contains=text)
+    if session is not None:
+        domains = domains.filter(pk__in=session_links(session).values('domain_id'))
+    return domains
@@ -1,7 +1,8 @@
 # backend/network/serializers.py
 
 from rest_framework import serializers
-from .models import Domain, IPAddress, Link
+from .models import Domain, IPAddress, Link, ScanBatch, ScanSession
+from .batch import batch_progress
 
 class DomainSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,8 +13,8 @@ class DomainSerializer(serializers.ModelSerializer):
 class IPAddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = IPAddress
-        fields = ['id', 'address', 'organization', 'cidr', 'created_at']
-        read_only_fields = ['created_at']
+        fields = ['id', 'address', 'organization', 'cidr', 'network', 'created_at']
+        read_only_fields = ['network', 'created_at']
 
 class LinkSerializer(serializers.ModelSerializer):
     domain_name = serializers.CharField(source='domain.name', read_only=True)
@@ -23,3 +24,62 @@ class LinkSerializer(serializers.ModelSerializer):
         model = Link
         fields = ['id', 'domain', 'domain_name', 'ip', 'ip_address', 'method', 'discovered_at']
         read_only_fields = ['discovered_at']
+
+class LinkListSerializer(serializers.Serializer):
+    """
+    Связь в списках: только чтение, строки — словари values() с именем домена и адресом IP
+    из того же запроса, без модели и без обращений к связанным объектам.
+    У связей сессии, перенесенной в Edge, вместо id — edge_id: это id строки Edge, а не Link.
+    """
+    id = serializers.IntegerField(read_only=True)
+    edge_id = serializers.IntegerField(read_only=True)
+    domain = serializers.IntegerField(source='domain_id', read_only=True)
+    domain_name = serializers.CharField(read_only=True)
+    ip = serializers.IntegerField(source='ip_id', read_only=True)
+    ip_address = serializers.CharField(read_only=True)
+    method = serializers.CharField(read_only=True)
+    discovered_at = serializers.DateTimeField(source='discovered', read_only=True)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'edge_id' in data:
+            del data['id']
+        return data
+
+
+class ScanSessionSerializer(serializers.ModelSerializer):
+    duration_seconds = serializers.SerializerMethodField()
+    queue_wait_seconds = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ScanSession
+        fields = [
+            'id', 'root_domain', 'depth', 'status', 'created_at', 'dispatched_at', 'completed_at',
+            'duration_seconds', 'queue_wait_seconds',
+            'base_session', 'queue', 'priority', 'estimated_probes', 'estimated_runtime', 'stats', 'batch',
+        ]
+        read_only_fields = fields
+
+    def get_duration_seconds(self, obj):
+        """Время самого скана: от отправки воркеру, без ожидания в очереди."""
+        if not obj.completed_at:
+            return None
+        return round((obj.completed_at - (obj.dispatched_at or obj.created_at)).total_seconds(), 3)
+
+    def get_queue_wait_seconds(self, obj):
+        """Ожидание в очереди: от создания сессии до отправки воркеру."""
+        if not obj.dispatched_at:
+            return None
+        return round((obj.dispatched_at - obj.created_at).total_seconds(), 3)
+
+
+class ScanBatchSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ScanBatch
+        fields = ['id', 'name', 'depth', 'status', 'requester', 'created_at', 'started_at', 'heartbeat_at', 'completed_at', 'progress', 'stats']
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        return batch_progress(obj)
@@ -0,0 +1,167 @@
+# backend/network/storage.py
+
+"""
+Хранение связей сессий.
+
+Пока скан идет, сканер пишет собственные строки Link сессии — по ним строится
+живой граф. Завершенная сессия переносится в общее хранилище: каждая связь
+(домен, IP, метод) хранится одной строкой Edge с first_seen/last_seen, а членство
+в сессиях — интервалами EdgeInterval по номеру сессии внутри корня (ScanSession.sequence).
+Ежедневное пересканирование того же корня продлевает интервалы неизменившихся связей
+одним UPDATE вместо копии всех строк.
+
+Читать связи сессии нужно через session_links(): она возвращает QuerySet Link или
+Edge с одинаковыми именами полей (id, domain, ip, method), так что values_list,
+фильтры и агрегаты потребителей от хранилища не зависят.
+"""
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import Edge, EdgeInterval, Link, RootSequence, ScanSession
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ограничение на число параметров в одном IN (у SQLite — 999)
+LOOKUP_CHUNK = 900
+BATCH_SIZE = 5000
+# Попыток занять номер сессии, если параллельно создается счетчик того же корня
+SEQUENCE_RETRIES = 3
+
+
+def session_links(session):
+    """
+    Связи сессии в любом хранилище. У Edge нет discovered_at — порядок «новые первыми»
+    задает first_seen (Meta.ordering обеих моделей).
+    """
+    if session.storage == 'edges' and session.sequence is not None:
+        return Edge.objects.filter(
+            intervals__root_domain=session.root_domain,
+            intervals__start_sequence__lte=session.sequence,
+            intervals__end_sequence__gte=session.sequence,
+        )
+    return Link.objects.filter(scan_session=session)
+
+
+def _chunks(values, size=LOOKUP_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _lookup_edges(keys):
+    """{(domain_id, ip_id, method): pk} для существующих Edge из keys."""
+    ids = {}
+    domain_ids = sorted({domain_id for domain_id, _, _ in keys})
+    for chunk in _chunks(domain_ids):
+        for pk, domain_id, ip_id, method in Edge.objects.filter(domain_id__in=chunk).values_list(
+            'id', 'domain_id', 'ip_id', 'method'
+        ):
+            if (domain_id, ip_id, method) in keys:
+                ids[domain_id, ip_id, method] = pk
+    return ids
+
+
+def _edge_ids(rows):
+    """
+    pk Edge для строк (domain_id, ip_id, method, discovered_at), создавая недостающие.
+    При повторном скане почти все связи уже есть, поэтому сначала — выборка, вставка — только новых.
+    """
+    seen_at = {}
+    for domain_id, ip_id, method, discovered_at in rows:
+        key = (domain_id, ip_id, method)
+        if key not in seen_at or discovered_at < seen_at[key]:
+            seen_at[key] = discovered_at
+    ids = _lookup_edges(seen_at)
+    new = {key: at for key, at in seen_at.items() if key not in ids}
+    if new:
+        Edge.objects.bulk_create(
+            [
+                Edge(domain_id=domain_id, ip_id=ip_id, method=method, first_seen=at, last_seen=at)
+                for (domain_id, ip_id, method), at in new.items()
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        ids.update(_lookup_edges(new))
+    return list(ids.values())
+
+
+def _next_sequence(root_domain: str) -> int:
+    """
+    Следующий номер сессии корня из счетчика RootSequence; строка счетчика заблокирована
+    до конца транзакции. Номер удаленной сессии повторно не выдается. Счетчик корня
+    создается при первом переносе — с максимума уже выданных номеров (сессии и интервалы).
+    """
+    counter = RootSequence.objects.select_for_update().filter(root_domain=root_domain).first()
+    if counter is None:
+        issued = max(
+            ScanSession.objects.filter(root_domain=root_domain).aggregate(Max('sequence'))['sequence__max'] or 0,
+            EdgeInterval.objects.filter(root_domain=root_domain).aggregate(Max('end_sequence'))['end_sequence__max'] or 0,
+        )
+        counter = RootSequence.objects.create(root_domain=root_domain, last_sequence=issued)
+    counter.last_sequence += 1
+    counter.save(update_fields=['last_sequence'])
+    return counter.last_sequence
+
+
+@transaction.atomic
+def _store(session, edge_ids):
+    sequence = _next_sequence(session.root_domain)
+    previous = sequence - 1
+    # Связи, бывшие в предыдущей сессии корня, продлевают свой интервал
+    extended = set()
+    for chunk in _chunks(edge_ids):
+        intervals = EdgeInterval.objects.filter(
+            root_domain=session.root_domain, end_sequence=previous, edge_id__in=chunk
+        )
+        extended.update(intervals.values_list('edge_id', flat=True))
+        intervals.update(end_sequence=sequence)
+    EdgeInterval.objects.bulk_create(
+        [
+            EdgeInterval(edge_id=edge_id, root_domain=session.root_domain, start_sequence=sequence, end_sequence=sequence)
+            for edge_id in edge_ids if edge_id not in extended
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    seen = session.completed_at or timezone.now()
+    for chunk in _chunks(edge_ids):
+        Edge.objects.filter(id__in=chunk, last_seen__lt=seen).update(last_seen=seen)
+
+    session.storage = 'edges'
+    session.sequence = sequence
+    session.save(update_fields=['storage', 'sequence'])
+    Link.objects.filter(scan_session=session).delete()
+    return len(extended), sequence
+
+
+def store_session_edges(session):
+    """
+    Переносит связи завершенной сессии из Link в Edge/EdgeInterval.
+    Возвращает число связей сессии; None — сессия уже в хранилище Edge.
+    """
+    if session.storage == 'edges':
+        return None
+    rows = list(Link.objects.filter(scan_session=session).values_list('domain_id', 'ip_id', 'method', 'discovered_at'))
+    edge_ids = _edge_ids(rows)
+
+    for attempt in range(1, SEQUENCE_RETRIES + 1):
+        try:
+            extended, sequence = _store(session, edge_ids)
+            break
+        except IntegrityError:
+            # Счетчик корня параллельно создан другой сессией — повторяем уже с ним
+            session.storage, session.sequence = 'links', None
+            if attempt == SEQUENCE_RETRIES:
+                raise
+    logger.info(f"Связи сессии {session.id} перенесены в Edge: {len(edge_ids)} связей, "
+                f"{extended} интервалов продлено (номер {sequence} для {session.root_domain})")
+    return len(edge_ids)
+
+
+def store_completed_session(session):
+    """Перенос после завершения скана, если так настроено (settings.SCAN_STORAGE)."""
+    if getattr(settings, 'SCAN_STORAGE', 'links') == 'edges' and session.status == 'completed':
+        return store_session_edges(session)
+    return None
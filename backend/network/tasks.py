@@ -1,46 +1,124 @@
 # backend/network/tasks.py
 
 from celery import shared_task
-from .models import ScanSession
+from .models import ScanBatch, ScanSession
 from .scanner import InternetMapScanner
+from .graph import materialize_session_graph
+from .enrichment import enrich_pending_ips
+from .storage import store_completed_session
+from .retention import apply_retention
+from django.conf import settings
 import logging
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
-@shared_task
-def run_scanner_task(session_id: int):
+def scan_session(session, context=None):
     """
-    Асинхронная задача для запуска сканера для указанной сессии.
-    Эта задача является отказоустойчивой.
+    Обход одной сессии: статус running, сканирование или углубление, итоговый статус
+    и статистика. Общая часть одиночного (run_scanner_task) и пакетного скана.
     """
-    session = None
-    
+    scanner = None
     try:
-        session = ScanSession.objects.get(id=session_id)
         session.status = 'running'
+        if session.dispatched_at is None:
+            # Сессии пакета уходят воркеру без планировщика: отсчет времени скана — отсюда
+            session.dispatched_at = timezone.now()
         session.save()
 
         logger.info(f"Начало задачи сканирования для сессии {session.id} ({session.root_domain})")
-        
+
         # Создаем и запускаем сканер
-        scanner = InternetMapScanner(session=session, max_depth=session.depth)
-        scanner.scan(session.root_domain)
+        scanner = InternetMapScanner(session=session, max_depth=session.depth, context=context)
+        if session.base_session_id:
+            # Режим углубления: продолжаем обход с границы базовой сессии
+            scanner.extend(session.base_session)
+        else:
+            scanner.scan(session.root_domain)
+        session.frontier = scanner.frontier
 
         # Если скан прошел без ошибок, помечаем сессию как завершенную
         session.status = 'completed'
         logger.info(f"Задача сканирования для сессии {session.id} успешно завершена.")
 
+    except Exception as e:
+        logger.error(f"Ошибка в задаче сканирования для сессии {session.id}: {e}", exc_info=True)
+        session.status = 'failed'
+
+    finally:
+        session.completed_at = timezone.now()
+        if scanner:
+            # Статистику сохраняем и для упавших сессий — по ней видно, где застряли
+            session.stats = scanner.stats.summary()
+            logger.info(f"Статистика сессии {session.id}: {session.stats}")
+        session.save()
+        logger.info(f"Финальный статус сессии {session.id} сохранен: '{session.status}'")
+
+
+def finish_session(session):
+    """Перенос связей в Edge и материализация графа завершенной сессии."""
+    if session.status != 'completed':
+        return
+
+    # Связи завершенной сессии — в общее хранилище Edge, если оно включено
+    try:
+        store_completed_session(session)
+    except Exception as e:
+        logger.error(f"Не удалось перенести связи сессии {session.id} в Edge: {e}", exc_info=True)
+
+    # Граф завершенной сессии больше не меняется — собираем и раскладываем его сразу
+    try:
+        materialize_session_graph(session)
+    except Exception as e:
+        logger.error(f"Не удалось материализовать граф сессии {session.id}: {e}", exc_info=True)
+
+
+@shared_task
+def run_scanner_task(session_id: int):
+    """
+    Асинхронная задача для запуска сканера для указанной сессии.
+    Эта задача является отказоустойчивой.
+    """
+    try:
+        session = ScanSession.objects.get(id=session_id)
     except ScanSession.DoesNotExist:
         logger.error(f"Сессия с ID {session_id} не найдена. Задача не может быть выполнена.")
+        return
 
-    except Exception as e:
-        logger.error(f"Ошибка в задаче сканирования для сессии {session_id}: {e}", exc_info=True)
-        if session:
-            session.status = 'failed'
-    
-    finally:
-        if session:
-            session.finished_at = timezone.now()
-            session.save()
-            logger.info(f"Финальный статус сессии {session.id} сохранен: '{session.status}'")
\ No newline at end of file
+    scan_session(session)
+
+    # Слот квоты освободился — отправляем следующий ожидающий скан этого заказчика
+    from .scheduler import dispatch_waiting
+    dispatch_waiting(session.requester)
+
+    finish_session(session)
+
+
+@shared_task
+def run_scan_batch_task(batch_id: int):
+    """Пакетный скан: корни пакета по очереди в одном процессе с общими кэшами (network/batch.py)."""
+    from .batch import run_batch
+    try:
+        batch = ScanBatch.objects.get(id=batch_id)
+    except ScanBatch.DoesNotExist:
+        logger.error(f"Пакет с ID {batch_id} не найден. Задача не может быть выполнена.")
+        return
+    run_batch(batch)
+
+
+@shared_task
+def enrich_ips_task(limit: int = None):
+    """
+    RDAP-обогащение IP, у которых еще нет сети: найденных theHarvester, nmap и TLS,
+    а также тех, чей запрос во время скана не удался. Запускается по расписанию
+    (CELERY_BEAT_SCHEDULE); очередь — по времени последней попытки (enrich_pending_ips).
+    """
+    if limit is None:
+        limit = getattr(settings, 'RDAP_ENRICH_BATCH', 5000)
+    return enrich_pending_ips(limit)
+
+
+@shared_task
+def prune_sessions_task():
+    """Политика хранения сессий (network/retention.py); удобно запускать раз в сутки."""
+    return apply_retention()
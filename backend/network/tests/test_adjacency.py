@@ -0,0 +1,93 @@
+"""
+Тесты индекса смежности сессии
+"""
+from collections import deque
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from network.adjacency import AdjacencyIndex
+from network.models import Domain, IPAddress, Link, ScanSession
+
+
+class AdjacencyIndexTestCase(SimpleTestCase):
+    """Векторный BFS совпадает с обычным на случайном графе"""
+
+    def test_matches_plain_bfs(self):
+        rng = np.random.default_rng(7)
+        domains, ips = rng.integers(1, 120, 200), rng.integers(1, 80, 200)
+        index = AdjacencyIndex(domains, ips, ['dns'] * 200)
+        neighbors = {v: set(index.indices[index.indptr[v]:index.indptr[v + 1]].tolist()) for v in range(index.size)}
+
+        def distances(source):
+            seen, queue = {source: 0}, deque([source])
+            while queue:
+                node = queue.popleft()
+                for other in neighbors[node] - seen.keys():
+                    seen[other] = seen[node] + 1
+                    queue.append(other)
+            return seen
+
+        labels = index.components()
+        for source, target in rng.integers(0, index.size, (50, 2)).tolist():
+            expected = distances(source)
+            nodes, hops = index.neighborhood(source, 3)
+            self.assertEqual(dict(zip(nodes.tolist(), hops.tolist())), {k: v for k, v in expected.items() if v <= 3})
+            path = index.shortest_path(source, target)
+            self.assertEqual(labels[source] == labels[target], target in expected)
+            if target not in expected:
+                self.assertIsNone(path)
+                continue
+            self.assertEqual(len(path) - 1, expected[target])
+            self.assertEqual((path[0][0], path[-1][0]), (source, target))
+            for (a, _), (b, _) in zip(path, path[1:]):
+                self.assertIn(b, neighbors[a])
+
+
+class AdjacencyApiTestCase(TestCase):
+    """Окрестность, путь и компоненты через API сессии"""
+
+    def setUp(self):
+        chain = [('root.test', '10.0.0.1', 'dns'), ('a.root.test', '10.0.0.1', 'tls-cert'),
+                 ('a.root.test', '10.0.0.2', 'dns'), ('b.root.test', '10.0.0.2', 'dns'),
+                 ('c.root.test', '10.0.0.9', 'dns')]
+        self.session = ScanSession.objects.create(root_domain='root.test', status='completed', completed_at=timezone.now())
+        for domain, ip, method in chain:
+            Link.objects.create(
+                scan_session=self.session, method=method,
+                domain=Domain.objects.get_or_create(name=domain)[0], ip=IPAddress.objects.get_or_create(address=ip)[0],
+            )
+        self.url = f'/api/sessions/{self.session.id}/'
+        self.client = APIClient()
+
+    def test_neighborhood(self):
+        """Узлы в пределах двух ребер с расстояниями и ребра между ними"""
+        data = self.client.get(self.url + 'neighborhood/', {'node': 'root.test', 'hops': 2}).json()
+
+        self.assertEqual({n['label']: n['distance'] for n in data['nodes']}, {'root.test': 0, '10.0.0.1': 1, 'a.root.test': 2})
+        self.assertEqual(len(data['edges']), 2)
+        self.assertFalse(data['truncated'])
+
+    def test_path(self):
+        """Путь между доменами через общие IP с методами связей"""
+        data = self.client.get(self.url + 'path/', {'from': 'root.test', 'to': 'b.root.test'}).json()
+
+        self.assertEqual(data['length'], 4)
+        self.assertEqual(
+            [(n['label'], n['via']) for n in data['nodes']],
+            [('root.test', None), ('10.0.0.1', 'dns'), ('a.root.test', 'tls-cert'), ('10.0.0.2', 'dns'), ('b.root.test', 'dns')],
+        )
+        self.assertEqual(self.client.get(self.url + 'path/', {'from': 'root.test', 'to': 'c.root.test'}).status_code, 404)
+        self.assertEqual(self.client.get(self.url + 'path/', {'from': 'root.test', 'to': 'nope.test'}).status_code, 404)
+
+    def test_components(self):
+        """Две компоненты; компонента узла с членами"""
+        data = self.client.get(self.url + 'components/').json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([(c['size'], c['domains'], c['ips']) for c in data['components']], [(5, 3, 2), (2, 1, 1)])
+
+        data = self.client.get(self.url + 'components/', {'node': '10.0.0.9'}).json()
+        self.assertEqual(data['component']['rank'], 2)
+        self.assertEqual(sorted(m['label'] for m in data['component']['members']), ['10.0.0.9', 'c.root.test'])
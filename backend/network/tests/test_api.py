@@ -0,0 +1,67 @@
+"""
+Тесты постраничных списков IP и связей
+"""
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from network.models import Domain, IPAddress, Link, ScanSession
+from network.storage import store_session_edges
+
+
+class LinkListTestCase(TestCase):
+    """Курсорная пагинация, фильтры и постоянное число запросов"""
+
+    def setUp(self):
+        self.session = ScanSession.objects.create(root_domain='root.test', status='completed', completed_at=timezone.now())
+        self.other = ScanSession.objects.create(root_domain='other.test', status='completed', completed_at=timezone.now())
+        root = Domain.objects.create(name='root.test')
+        for n in range(30):
+            ip = IPAddress.objects.create(address=f'10.0.0.{n + 1}')
+            domain = root if n % 3 == 0 else Domain.objects.create(name=f'd{n}.root.test')
+            Link.objects.create(scan_session=self.session, domain=domain, ip=ip, method='dns' if n % 2 else 'tls')
+        Link.objects.create(scan_session=self.other, domain=root, ip=IPAddress.objects.create(address='10.9.9.9'), method='dns')
+        self.client = APIClient()
+
+    def collect(self, params):
+        """Все страницы списка по ссылкам next"""
+        rows, data = [], self.client.get('/api/links/', params).json()
+        while True:
+            rows += data['results']
+            if not data['next']:
+                return rows
+            data = self.client.get(data['next']).json()
+
+    def test_pages_cover_list_once(self):
+        """Страницы идут по убыванию id без повторов и пропусков"""
+        rows = self.collect({'page_size': 7})
+        ids = [row['id'] for row in rows]
+        self.assertEqual(ids, sorted(Link.objects.values_list('id', flat=True), reverse=True))
+        self.assertEqual(set(rows[0]), {'id', 'domain', 'domain_name', 'ip', 'ip_address', 'method', 'discovered_at'})
+
+    def test_constant_queries(self):
+        """Страница любого размера — один запрос"""
+        for size in (5, 25):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/links/', {'page_size': size})
+            self.assertEqual(len(response.json()['results']), size)
+            self.assertEqual(len(queries), 1)
+
+    def test_filters(self):
+        """session, method, domain и ip; сессия в Edge; неизвестная сессия — 404, плохой IP — 400"""
+        rows = self.collect({'session': self.session.id, 'method': 'dns', 'domain': 'ROOT.test'})
+        self.assertEqual([row['ip_address'] for row in rows], ['10.0.0.28', '10.0.0.22', '10.0.0.16', '10.0.0.10', '10.0.0.4'])
+        self.assertTrue(all(row['domain_name'] == 'root.test' and row['method'] == 'dns' for row in rows))
+
+        self.assertEqual(len(self.collect({'ip': '10.0.0.4'})), 1)
+        self.assertEqual(self.client.get('/api/links/', {'ip': 'not-an-ip'}).status_code, 400)
+
+        store_session_edges(self.session)
+        rows = self.collect({'session': self.session.id})
+        self.assertEqual(len(rows), 30)
+        # У строк Edge свой id — отдается как edge_id, а не как id связи
+        self.assertTrue(all('id' not in row and 'edge_id' in row for row in rows))
+        self.assertEqual([row['ip_address'] for row in self.collect({'session': self.other.id})], ['10.9.9.9'])
+        self.assertEqual(self.client.get('/api/links/', {'session': 999}).status_code, 404)
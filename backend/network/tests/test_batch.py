@@ -0,0 +1,180 @@
+"""
+Тесты пакетного скана с общими кэшами
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from network.batch import InvalidRoots, RequesterBusy, ScanContext, batch_progress, create_batch, parse_roots, run_batch
+from network.models import ScanBatch, ScanSession
+from network.scanner import InternetMapScanner
+from network.scheduler import dispatch_waiting
+from network.storage import session_links
+
+# Два корня на общем хостинге 10.0.0.9
+ZONE = {'one.test': ['10.0.0.1', '10.0.0.9'], 'two.test': ['10.0.0.2', '10.0.0.9']}
+TLS = {'10.0.0.9': ['shared.test']}
+
+
+class ParseRootsTestCase(SimpleTestCase):
+    """Нормализация списка корней"""
+
+    def test_parse(self):
+        self.assertEqual(parse_roots(['One.test.', '', '# все', 'two.test  # второй', 'one.test']), ['one.test', 'two.test'])
+        with self.assertRaises(ValueError):
+            parse_roots(['# пусто'])
+        with self.settings(BATCH_SCAN_MAX_ROOTS=1), self.assertRaises(ValueError):
+            parse_roots(['one.test', 'two.test'])
+
+    def test_rejected(self):
+        """Не строки, не имена хостов и публичные суффиксы отклоняются с номерами строк"""
+        self.assertEqual(parse_roots(['Пример.рф']), ['xn--e1afmkfd.xn--p1ai'])
+        with self.assertRaises(InvalidRoots) as raised:
+            parse_roots(['one.test', 1, 'bad_name.test', 'co.uk', '-x.test', 'a' * 64 + '.test'])
+        self.assertEqual(
+            [(item['line'], item['reason']) for item in raised.exception.rejected],
+            [(2, 'not a string'), (3, 'not a host name'), (4, 'public suffix'), (5, 'not a host name'), (6, 'not a host name')],
+        )
+
+
+@mock.patch('network.scanner.get_subdomains_with_theharvester', lambda domain: set())
+@mock.patch('network.scanner.get_domains_from_ip_reverse_dns', lambda ip: [])
+@mock.patch.object(InternetMapScanner, '_get_subdomains_from_crtsh', lambda self, domain: iter(()))
+@mock.patch.object(InternetMapScanner, '_scan_ip_subnet', lambda self, ip, domain, depth: None)
+@mock.patch('network.estimator.iter_cached_crtsh_names', lambda domain: None)
+class BatchScanTestCase(TestCase):
+    """Корни пакета сканируются полностью, общая инфраструктура пробуется один раз"""
+
+    def setUp(self):
+        self.resolved, self.tls_probes = [], []
+        resolve = mock.patch.object(
+            InternetMapScanner, '_get_ips_for_domain',
+            lambda scanner, domain: self.resolved.append(domain) or ZONE.get(domain, []),
+        )
+        tls = mock.patch('network.scanner.get_domains_from_tls', lambda ip, port=443: self.tls_probes.append(ip) or TLS.get(ip, []))
+        for patcher in (resolve, tls):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_shared_probes(self):
+        batch = create_batch(['one.test', 'two.test'], depth=2, requester='ip:127.0.0.1')
+        updates = []
+        run_batch(batch, progress=updates.append)
+
+        sessions = {s.root_domain: s for s in batch.sessions.all()}
+        for root in ('one.test', 'two.test'):
+            links = set(session_links(sessions[root]).values_list('domain__name', 'ip__address'))
+            self.assertIn(('shared.test', '10.0.0.9'), links)
+            self.assertIn((root, '10.0.0.9'), links)
+        # Общий IP и домен с него пробуются один раз на пакет
+        self.assertEqual(self.tls_probes.count('10.0.0.9'), 1)
+        self.assertEqual(self.resolved.count('shared.test'), 1)
+
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'completed')
+        self.assertEqual([u['percent'] for u in updates], [50.0, 100.0])
+        progress = batch_progress(batch)
+        self.assertEqual((progress['completed'], progress['total'], progress['domains']), (2, 2, 4))
+        self.assertGreater(batch.stats['caches']['tls']['hits'], 0)
+
+    def test_budget_checked_per_root(self):
+        """Бюджет — в задаче пакета: корень сверх бюджета — failed без обхода, иначе глубина понижается"""
+        budget = 100
+        batch = create_batch(['one.test', 'two.test'], depth=3, requester='ip:127.0.0.1')
+        with self.settings(SCAN_BUDGET_MAX_PROBES=budget, SCAN_BUDGET_MAX_RUNTIME=None, SCAN_BUDGET_POLICY='downgrade'):
+            # one.test не укладывается в бюджет ни на какой глубине, two.test — только на глубине 1
+            with mock.patch('network.estimator.estimate_scan_cost', side_effect=lambda root, depth, *args: {
+                'probes': budget + 1 if root == 'one.test' else depth * budget, 'runtime_seconds': 0,
+            }):
+                self.assertEqual(run_batch(batch).status, 'completed')
+
+        sessions = {s.root_domain: s for s in batch.sessions.all()}
+        self.assertEqual((sessions['one.test'].status, sessions['one.test'].estimated_probes), ('failed', budget + 1))
+        self.assertNotIn('one.test', self.resolved)
+        self.assertEqual((sessions['two.test'].status, sessions['two.test'].depth), ('completed', 1))
+        self.assertEqual(batch_progress(batch)['failed'], 1)
+
+    def test_redelivered_task_skips_live_batch(self):
+        """Пока владелец пакета жив, повторная задача ничего не трогает; после пропажи — перехватывает"""
+        batch = create_batch(['one.test', 'two.test'], depth=2, requester='ip:127.0.0.1')
+        first = batch.sessions.order_by('id').first()
+        ScanSession.objects.filter(pk=first.pk).update(status='running')
+        ScanBatch.objects.filter(pk=batch.pk).update(status='running', worker='other:1', heartbeat_at=timezone.now())
+
+        self.assertIsNone(run_batch(batch, worker='me:2'))
+        self.assertEqual(ScanSession.objects.get(pk=first.pk).status, 'running')
+        self.assertEqual(self.resolved, [])
+
+        ScanBatch.objects.filter(pk=batch.pk).update(heartbeat_at=timezone.now() - timedelta(hours=9))
+        self.assertEqual(run_batch(batch, worker='me:2').status, 'completed')
+        self.assertEqual(set(batch.sessions.values_list('status', flat=True)), {'completed'})
+        self.assertEqual(ScanBatch.objects.get(pk=batch.pk).worker, 'me:2')
+        # Завершенный пакет повторно не запускается
+        self.assertIsNone(run_batch(batch, worker='me:3'))
+
+    def test_context_caches_are_per_batch(self):
+        """Без контекста сканер берет кэши процесса, с контекстом — общие кэши пакета"""
+        session = ScanSession.objects.create(root_domain='one.test')
+        context = ScanContext(maxsize=10, ttl=60)
+        self.assertIs(InternetMapScanner(session, context=context)._cache('tls'), context.caches['tls'])
+        self.assertIsNot(InternetMapScanner(session)._cache('tls'), context.caches['tls'])
+
+
+@mock.patch('network.estimator.iter_cached_crtsh_names', lambda domain: None)
+class BatchApiTestCase(TestCase):
+    """Создание пакета из списка и из файла; квота пакетов заказчика, бюджет и глубина"""
+
+    @mock.patch('network.views.submit_batch')
+    def test_create(self, submit):
+        client = APIClient()
+        response = client.post('/api/batches/', {'roots': ['one.test', 'two.test'], 'depth': 1}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['progress']['pending'], 2)
+        submit.assert_called_once()
+        # Оценка бюджета — дело задачи пакета, запрос ее не ждет
+        self.assertIsNone(ScanSession.objects.filter(root_domain='one.test').get().estimated_probes)
+
+        # Пока первый пакет не завершен, второй от того же заказчика не принимается
+        self.assertEqual(client.post('/api/batches/', {'roots': ['three.test']}, format='json').status_code, 429)
+        ScanBatch.objects.update(status='completed')
+
+        upload = SimpleUploadedFile('roots.txt', b'three.test\n# comment\nfour.test\n')
+        response = client.post('/api/batches/', {'file': upload, 'name': 'nightly'}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        batch_id = response.json()['id']
+        self.assertEqual(sorted(s['root_domain'] for s in client.get('/api/sessions/', {'batch': batch_id}).json()['results']), ['four.test', 'three.test'])
+        self.assertEqual(client.get(f'/api/batches/{batch_id}/').json()['progress']['total'], 2)
+        self.assertEqual(client.get('/api/sessions/', {'batch': 'abc'}).status_code, 400)
+        self.assertEqual(client.post('/api/batches/', {'roots': []}, format='json').status_code, 400)
+
+        response = client.post('/api/batches/', {'roots': [1, 2]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['rejected']), 2)
+        self.assertEqual(client.post('/api/batches/', {'roots': {'a': 1}}, format='json').status_code, 400)
+
+    @mock.patch('network.views.submit_batch')
+    def test_depth(self, submit):
+        """Глубина вне 1..BATCH_SCAN_MAX_DEPTH — 400"""
+        client = APIClient()
+        for depth in (-1, 0, 100, 'x'):
+            self.assertEqual(client.post('/api/batches/', {'roots': ['one.test'], 'depth': depth}, format='json').status_code, 400)
+        self.assertFalse(ScanBatch.objects.exists())
+
+    @mock.patch('network.scheduler.run_scanner_task')
+    def test_batch_sessions_skip_quota(self, task):
+        batch = create_batch(['one.test'], requester='user:a')
+        self.assertEqual(dispatch_waiting('user:a'), [])
+        self.assertIsNone(batch.sessions.get().dispatched_at)
+
+    def test_requester_batches_checked_in_create(self):
+        """Квота пакетов заказчика проверяется в транзакции create_batch; оператору она не мешает"""
+        create_batch(['one.test'], requester='user:a')
+        with self.assertRaises(RequesterBusy):
+            create_batch(['two.test'], requester='user:a')
+        self.assertEqual(ScanBatch.objects.filter(requester='user:a').count(), 1)
+        create_batch(['two.test'], requester='user:a', check_requester=False)
+        self.assertEqual(ScanBatch.objects.filter(requester='user:a').count(), 2)
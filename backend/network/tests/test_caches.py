@@ -0,0 +1,122 @@
+"""
+Тесты кэшей процесса воркера
+"""
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from network import caches
+from network.models import Domain, IPAddress, Link, ScanSession
+from network.tests.test_scanner import TLS, ZONE, offline_scanner
+
+CACHES = {
+    'resolve': {'maxsize': 100, 'ttl': 300},
+    'tls': {'maxsize': 100, 'ttl': 300},
+    'rdap': {'maxsize': 100, 'ttl': 300},
+    'domain_pk': {'maxsize': 100, 'ttl': 300},
+    'ip_pk': {'maxsize': 100, 'ttl': 300},
+}
+
+
+class TTLCacheTestCase(SimpleTestCase):
+    """Ограничение размера, время жизни и доля попаданий"""
+
+    def setUp(self):
+        self.now = 0.0
+        self.cache = caches.TTLCache('test', maxsize=2, ttl=10, clock=lambda: self.now)
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняется давно не использованная запись"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(len(self.cache), 2)
+
+    def test_ttl_expiry(self):
+        """Просроченная запись — промах; собственный ttl записи важнее общего"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2, ttl=100)
+        self.now = 11
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), 2)
+        self.assertEqual(self.cache.info()['hit_rate'], 0.5)
+
+    def test_cached_none(self):
+        """Закэшированное пустое значение отличается от промаха"""
+        self.cache.set('a', [])
+        self.assertEqual(self.cache.get('a', caches.MISSING), [])
+        self.assertIs(self.cache.get('b', caches.MISSING), caches.MISSING)
+
+    def test_empty_result_short_ttl(self):
+        """Пустой ответ сетевого этапа живет negative_ttl, с нулевым negative_ttl не кэшируется"""
+        cache = caches.TTLCache('test', ttl=100, negative_ttl=5, clock=lambda: self.now)
+        cache.set_result('empty', [])
+        cache.set_result('full', ['10.0.0.1'])
+        self.now = 6
+        self.assertIs(cache.get('empty', caches.MISSING), caches.MISSING)
+        self.assertEqual(cache.get('full'), ['10.0.0.1'])
+
+        cache = caches.TTLCache('test', negative_ttl=0)
+        cache.set_result('empty', [])
+        self.assertEqual(len(cache), 0)
+
+    def test_settings_cover_scanner_caches(self):
+        """В settings.WORKER_CACHES есть каждый кэш сканера и пакета"""
+        from django.conf import settings
+        from network.batch import SHARED_CACHES
+
+        self.assertLessEqual(set(SHARED_CACHES), set(settings.WORKER_CACHES))
+
+
+@override_settings(WORKER_CACHES=CACHES)
+@mock.patch('network.scanner.get_subdomains_with_theharvester', lambda domain: set())
+@mock.patch('network.scanner.get_domains_from_ip_reverse_dns', lambda ip: [])
+class WorkerCachesTestCase(TestCase):
+    """Кэши процесса общие для последовательных сканеров"""
+
+    def setUp(self):
+        caches.activate()
+        self.addCleanup(caches.deactivate)
+
+    def test_inactive_by_default(self):
+        """Без activate() кэши ничего не хранят"""
+        caches.deactivate()
+        cache = caches.get_cache('resolve')
+        cache.set('root.test', ['10.0.0.1'])
+        self.assertIsNone(cache.get('root.test'))
+
+    def test_second_scanner_reuses_results(self):
+        """Второй скан не повторяет DNS и TLS, а связи создает те же"""
+        resolved, handshakes = [], []
+
+        def run():
+            session = ScanSession.objects.create(root_domain='root.test', depth=3)
+            scanner = offline_scanner(session, 3)
+            scanner._get_ips_for_domain = lambda domain: resolved.append(domain) or ZONE.get(domain, [])
+            tls = lambda ip, port=443: handshakes.append(ip) or TLS.get(ip, [])
+            with mock.patch('network.scanner.get_domains_from_tls', tls):
+                scanner.scan('root.test')
+            return session, scanner
+
+        first, _ = run()
+        calls = (len(resolved), len(handshakes))
+        second, scanner = run()
+
+        self.assertEqual((len(resolved), len(handshakes)), calls)
+        self.assertEqual(scanner.stats.caches['resolve'], {'hit': 3, 'miss': 0})
+        pairs = lambda session: set(Link.objects.filter(scan_session=session).values_list('domain__name', 'ip__address'))
+        self.assertEqual(pairs(first), pairs(second))
+
+    def test_warm_and_invalidate(self):
+        """Прогрев загружает pk и сети RDAP; удаление строки убирает ее из кэша"""
+        domain = Domain.objects.create(name='root.test')
+        IPAddress.objects.create(address='10.0.0.1', cidr='10.0.0.0/24', organization='ORG')
+        caches.warm_from_db()
+
+        self.assertEqual(caches.get_cache('domain_pk').get('root.test'), domain.pk)
+        self.assertEqual(caches.get_cache('rdap').get('10.0.0.1'), ('10.0.0.0/24', 'ORG'))
+        domain.delete()
+        self.assertIsNone(caches.get_cache('domain_pk').get('root.test'))
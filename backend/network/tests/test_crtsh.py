@@ -0,0 +1,91 @@
+"""
+Тесты потокового разбора ответа crt.sh
+"""
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from network import tools
+
+ENTRIES = [
+    {'common_name': 'tyuiu.ru', 'name_value': 'tyuiu.ru\n*.tyuiu.ru\nWWW.tyuiu.ru.'},
+    {'common_name': 'mail.tyuiu.ru', 'name_value': 'mail.tyuiu.ru\nadmin@tyuiu.ru\nlk.tyuiu.ru'},
+    {'common_name': 'www.tyuiu.ru', 'name_value': 'www.tyuiu.ru'},
+]
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class FakeResponse:
+    """Ответ requests со stream=True: тело отдается кусками байт"""
+
+    def __init__(self, body, status_code=200, chunk=7):
+        self.status_code = status_code
+        self.encoding = 'utf-8'
+        self._chunks = _chunks(body.encode('utf-8'), chunk)
+
+    def iter_content(self, chunk_size=None):
+        return iter(self._chunks)
+
+    def close(self):
+        pass
+
+
+class StreamingParserTestCase(SimpleTestCase):
+    """Инкрементальный разбор массива и извлечение CN/SAN"""
+
+    def test_array_split_anywhere(self):
+        """Элементы собираются при любом разрезе потока, мусор до '[' пропускается"""
+        text = '<pre>' + json.dumps(ENTRIES, indent=1)
+        for size in (1, 3, 64, len(text)):
+            with self.subTest(size=size):
+                self.assertEqual(list(tools.iter_json_array(_chunks(text, size))), ENTRIES)
+
+    def test_truncated_stream(self):
+        """Оборванный поток — ValueError после уже отданных элементов"""
+        text = json.dumps(ENTRIES)[:-20]
+        items = []
+        with self.assertRaises(ValueError):
+            for item in tools.iter_json_array(_chunks(text, 16)):
+                items.append(item)
+        self.assertEqual(items, ENTRIES[:2])
+
+    def test_names_from_cn_and_san(self):
+        """Имена из common_name и name_value нормализованы и уникальны, email отброшены"""
+        names = list(tools.iter_unique_names(ENTRIES))
+        self.assertEqual(names, ['tyuiu.ru', '*.tyuiu.ru', 'www.tyuiu.ru', 'mail.tyuiu.ru', 'lk.tyuiu.ru'])
+        self.assertEqual(tools.extract_common_names(ENTRIES), sorted(names))
+
+
+class StreamingFetchTestCase(SimpleTestCase):
+    """Загрузка crt.sh потоком с записью кэша"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(tools, 'DEFAULT_SLEEP', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fetch_writes_cache(self):
+        """Полный ответ становится кэшем, повторный разбор идет из файла без сети"""
+        body = json.dumps(ENTRIES)
+        with mock.patch.object(tools.requests, 'get', return_value=FakeResponse(body)) as get:
+            names = list(tools.iter_crtsh_names('tyuiu.ru', cache_dir=self.cache_dir))
+        self.assertEqual(get.call_args.kwargs['stream'], True)
+        self.assertIn('lk.tyuiu.ru', names)
+        self.assertEqual(tools.load_crtsh_cache('tyuiu.ru', cache_dir=self.cache_dir), ENTRIES)
+        self.assertEqual(list(tools.iter_cached_crtsh_names('tyuiu.ru', cache_dir=self.cache_dir)), names)
+
+    def test_truncated_response_not_cached(self):
+        """Оборванный ответ отдает прочитанные имена, но в кэш не попадает"""
+        body = json.dumps(ENTRIES)[:-20]
+        with mock.patch.object(tools.requests, 'get', return_value=FakeResponse(body)):
+            names = list(tools.iter_crtsh_names('tyuiu.ru', cache_dir=self.cache_dir))
+        self.assertIn('mail.tyuiu.ru', names)
+        self.assertIsNone(tools.iter_cached_crtsh_names('tyuiu.ru', cache_dir=self.cache_dir))
+        self.assertEqual(os.listdir(self.cache_dir), [])
@@ -0,0 +1,63 @@
+"""
+Тесты разницы между сессиями
+"""
+import json
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from network.diff import iter_session_diff
+from network.models import Domain, IPAddress, Link, ScanSession
+from network.storage import store_session_edges
+
+
+class SessionDiffTestCase(TestCase):
+    """Добавленные и удаленные домены, IP и связи в любом хранилище"""
+
+    def setUp(self):
+        self.domains = {name: Domain.objects.create(name=name) for name in ['root.test', 'a.root.test', 'b.root.test']}
+        self.ips = {address: IPAddress.objects.create(address=address) for address in ['10.0.0.1', '10.0.0.2', '10.0.0.3']}
+        old = {('root.test', '10.0.0.1', 'dns'), ('a.root.test', '10.0.0.2', 'dns'), ('root.test', '10.0.0.2', 'tls')}
+        new = {('root.test', '10.0.0.1', 'dns'), ('a.root.test', '10.0.0.2', 'dns'), ('b.root.test', '10.0.0.3', 'dns')}
+        self.old, self.new = self.make_session(old), self.make_session(new)
+
+    def make_session(self, triples):
+        session = ScanSession.objects.create(root_domain='root.test', status='completed', completed_at=timezone.now())
+        Link.objects.bulk_create([
+            Link(scan_session=session, domain=self.domains[domain], ip=self.ips[ip], method=method)
+            for domain, ip, method in triples
+        ])
+        return session
+
+    def check(self, records):
+        changes = {(r['op'], r['kind'], r.get('value') or (r['domain'], r['ip'], r['method'])) for r in records[:-1]}
+        self.assertEqual(changes, {
+            ('added', 'domain', 'b.root.test'),
+            ('added', 'ip', '10.0.0.3'),
+            ('added', 'link', ('b.root.test', '10.0.0.3', 'dns')),
+            ('removed', 'link', ('root.test', '10.0.0.2', 'tls')),
+        })
+        self.assertEqual(records[-1], {
+            'op': 'summary', 'from': self.old.id, 'to': self.new.id,
+            'domains_added': 1, 'ips_added': 1, 'links_added': 1,
+            'domains_removed': 0, 'ips_removed': 0, 'links_removed': 1,
+        })
+
+    def test_mixed_storage(self):
+        """Старая сессия в Edge, новая — еще в Link; затем обе в Edge"""
+        store_session_edges(self.old)
+        self.check(list(iter_session_diff(self.old, self.new)))
+        store_session_edges(self.new)
+        self.check(list(iter_session_diff(self.old, self.new)))
+
+    def test_api_streams_ndjson(self):
+        """/api/sessions/diff/ отдает NDJSON; без параметров — 400, неизвестная сессия — 404"""
+        client = APIClient()
+        response = client.get('/api/sessions/diff/', {'from': self.old.id, 'to': self.new.id})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.check([json.loads(line) for line in lines])
+
+        self.assertEqual(client.get('/api/sessions/diff/', {'from': self.old.id}).status_code, 400)
+        self.assertEqual(client.get('/api/sessions/diff/', {'from': self.old.id, 'to': 999}).status_code, 404)
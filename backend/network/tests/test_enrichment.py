@@ -0,0 +1,96 @@
+"""
+Тесты фонового RDAP-обогащения IP
+"""
+import ipaddress
+import threading
+from unittest import mock
+
+from django.test import TestCase
+
+from network.enrichment import RdapEnricher, enrich_ips, enrich_pending_ips
+from network.models import IPAddress
+
+# Сети, которые «возвращает» RDAP
+NETWORKS = ['10.0.0.0/23', '10.0.2.0/28']
+
+
+class FakeRdap:
+    """rdap_lookup по таблице NETWORKS; запоминает, по каким адресам были запросы"""
+
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+        self.lock = threading.Lock()
+
+    def __call__(self, address):
+        with self.lock:
+            self.calls.append(address)
+        if address in self.fail:
+            raise ValueError('rdap недоступен')
+        ip = ipaddress.ip_address(address)
+        for cidr in NETWORKS:
+            if ip in ipaddress.ip_network(cidr):
+                return cidr, f'ORG {cidr}'
+        return f'{address}/32', None
+
+
+class RdapEnricherTestCase(TestCase):
+    """Один запрос на сеть, результаты в порядке постановки"""
+
+    def drain(self, enricher):
+        results = []
+        while True:
+            batch = enricher.poll(block=True)
+            if not batch:
+                return results
+            results.extend(batch)
+
+    def test_one_lookup_per_network(self):
+        """Адреса одной /24 ждут первый запрос; не попавшие в его сеть запрашиваются сами"""
+        rdap = FakeRdap()
+        addresses = ['10.0.0.1', '10.0.0.2', '10.0.1.5', '10.0.0.3', '10.0.2.1', '10.0.2.200']
+        with mock.patch('network.tools.rdap_lookup', rdap):
+            enricher = RdapEnricher(max_workers=2, rate=0)
+            for i, address in enumerate(addresses):
+                enricher.submit(address, i)
+            results = self.drain(enricher)
+            # Сеть 10.0.0.0/23 уже известна — новый адрес из нее обходится без запроса
+            enricher.submit('10.0.1.77', 'late')
+            results += self.drain(enricher)
+            enricher.close()
+
+        self.assertEqual(sorted(rdap.calls), ['10.0.0.1', '10.0.1.5', '10.0.2.1', '10.0.2.200'])
+        self.assertEqual([context for *_, context in results], [0, 1, 2, 3, 4, 5, 'late'])
+        by_address = {address: cidr for address, cidr, _, _ in results}
+        self.assertEqual(by_address['10.0.0.3'], '10.0.0.0/23')
+        self.assertEqual(by_address['10.0.2.200'], '10.0.2.200/32')
+        self.assertEqual(by_address['10.0.1.77'], '10.0.0.0/23')
+
+    def test_enrich_ips_bulk_update(self):
+        """enrich_ips записывает сеть и организацию; неудачный запрос оставляет IP без сети"""
+        for address in ['10.0.0.1', '10.0.0.2', '10.0.2.1']:
+            IPAddress.objects.create(address=address)
+        with mock.patch('network.tools.rdap_lookup', FakeRdap(fail={'10.0.2.1'})):
+            updated = enrich_ips(IPAddress.objects.filter(cidr__isnull=True), rate=0)
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(
+            dict(IPAddress.objects.values_list('address', 'organization')),
+            {'10.0.0.1': 'ORG 10.0.0.0/23', '10.0.0.2': 'ORG 10.0.0.0/23', '10.0.2.1': None},
+        )
+
+    def test_pending_queue_by_last_attempt(self):
+        """Неглобальные IP не запрашиваются; адреса без ответа уходят в конец очереди"""
+        for address in ['10.0.0.1', '8.8.8.8', '1.1.1.1']:
+            IPAddress.objects.create(address=address)
+        rdap = FakeRdap(fail={'8.8.8.8'})
+        with mock.patch('network.tools.rdap_lookup', rdap):
+            self.assertEqual(enrich_pending_ips(10), 1)
+        self.assertEqual(sorted(rdap.calls), ['1.1.1.1', '8.8.8.8'])
+        self.assertFalse(IPAddress.objects.filter(rdap_checked_at__isnull=True).exists())
+
+        IPAddress.objects.create(address='9.9.9.9')
+        rdap = FakeRdap()
+        with mock.patch('network.tools.rdap_lookup', rdap):
+            enrich_pending_ips(1)
+        self.assertEqual(rdap.calls, ['9.9.9.9'])
@@ -0,0 +1,92 @@
+"""
+Тесты оценки стоимости скана и допуска по бюджету
+"""
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from network.estimator import admit_scan, estimate_scan_cost
+from network.models import Domain, IPAddress, Link, ScanSession
+
+
+@mock.patch('network.estimator.iter_cached_crtsh_names', lambda domain: None)
+class EstimatorTestCase(TestCase):
+    """Тесты оценщика"""
+
+    def test_cost_grows_with_depth(self):
+        """Более глубокий скан оценивается дороже"""
+        costs = [estimate_scan_cost('root.test', depth)['probes'] for depth in (1, 2, 3)]
+        self.assertEqual(costs, sorted(costs))
+        self.assertLess(costs[0], costs[2])
+
+    def test_extension_counts_only_new_layers(self):
+        """Углубление оценивается дешевле полного скана той же глубины"""
+        full = estimate_scan_cost('root.test', 3)
+        extension = estimate_scan_cost('root.test', 3, base_depth=2)
+        self.assertLess(extension['probes'], full['probes'])
+        self.assertLess(extension['domains'], full['domains'])
+
+    def test_history_signals(self):
+        """Прошлый завершенный скан используется как сигнал"""
+        session = ScanSession.objects.create(root_domain='root.test', depth=1, status='completed')
+        for i in range(4):
+            domain = Domain.objects.create(name=f'd{i}.root.test')
+            ip = IPAddress.objects.create(address=f'10.0.{i}.1', cidr=f'10.0.{i}.0/24')
+            Link.objects.create(scan_session=session, domain=domain, ip=ip)
+
+        signals = estimate_scan_cost('root.test', 2)['signals']
+        self.assertEqual(signals['history_session_id'], session.id)
+        self.assertEqual(signals['history_domains'], 4)
+        self.assertEqual(signals['known_cidrs'], 4)
+
+    def test_crtsh_cache_signal(self):
+        """Размер закэшированного ответа crt.sh задает ширину первого уровня"""
+        cached = [f'n{i}.root.test' for i in range(50)]
+        with mock.patch('network.estimator.iter_cached_crtsh_names', lambda domain: iter(cached)):
+            estimate = estimate_scan_cost('root.test', 2)
+        self.assertEqual(estimate['signals']['crtsh_names'], 50)
+        self.assertEqual(estimate['domains'], 51)
+
+    @override_settings(SCAN_BUDGET_MAX_PROBES=None, SCAN_BUDGET_MAX_RUNTIME=None)
+    def test_no_budget_admits_everything(self):
+        """Без бюджета скан допускается на запрошенной глубине"""
+        self.assertEqual(admit_scan('root.test', 5)[0], 5)
+
+    @override_settings(SCAN_BUDGET_MAX_RUNTIME=None, SCAN_BUDGET_POLICY='downgrade')
+    def test_downgrade_policy(self):
+        """Политика downgrade понижает глубину до укладывающейся в бюджет"""
+        budget = estimate_scan_cost('root.test', 2)['probes']
+        with self.settings(SCAN_BUDGET_MAX_PROBES=budget):
+            depth, estimate = admit_scan('root.test', 4)
+        self.assertEqual(depth, 2)
+        self.assertLessEqual(estimate['probes'], budget)
+
+    @override_settings(SCAN_BUDGET_MAX_PROBES=1, SCAN_BUDGET_POLICY='reject')
+    def test_reject_policy(self):
+        """Политика reject отклоняет скан сверх бюджета"""
+        depth, estimate = admit_scan('root.test', 2)
+        self.assertIsNone(depth)
+        self.assertGreater(estimate['probes'], 1)
+
+
+@mock.patch('network.estimator.iter_cached_crtsh_names', lambda domain: None)
+class EstimateApiTestCase(TestCase):
+    """Оценка и запуск скана через API выбирают одну и ту же базовую сессию"""
+
+    def test_estimate_uses_extension_base(self):
+        base = ScanSession.objects.create(root_domain='root.test', depth=1, status='completed', frontier=[])
+        response = self.client.get('/api/domains/estimate/', {'domain': 'root.test', 'depth': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['base_session_id'], base.id)
+        self.assertEqual(response.json()['estimate']['base_depth'], 1)
+
+        response = self.client.get('/api/domains/estimate/', {'domain': 'root.test', 'depth': 3, 'extend': 'false'})
+        self.assertEqual(response.json()['estimate']['base_depth'], 0)
+
+    @mock.patch('network.views.admit_scan')
+    def test_pending_duplicate_checked_before_budget(self, admit):
+        pending = ScanSession.objects.create(root_domain='root.test', depth=2, status='pending')
+        response = self.client.post('/api/domains/scan/', {'domain': 'root.test', 'depth': 2})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['session_id'], pending.id)
+        admit.assert_not_called()
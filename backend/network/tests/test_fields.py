@@ -0,0 +1,58 @@
+"""
+Тесты хранения сетей IP и запросов вхождения
+"""
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from network.enrichment import RdapEnricher
+from network.fields import primary_network
+from network.models import IPAddress
+
+
+class NetworkLookupTestCase(TestCase):
+    """Lookups net_within / net_contains и фильтры /api/ips/"""
+
+    def setUp(self):
+        IPAddress.objects.create(address='10.0.0.1', cidr='10.0.0.0/23', organization='ORG A')
+        IPAddress.objects.create(address='10.0.1.9', cidr='10.0.0.0/23', organization='ORG A')
+        IPAddress.objects.create(address='10.0.2.1', cidr='10.0.2.0/24, 10.0.3.0/24', organization='ORG B')
+        IPAddress.objects.create(address='2001:db8::1', cidr='2001:db8::/32')
+        IPAddress.objects.create(address='192.0.2.5')
+
+    def test_primary_network(self):
+        """Из списка сетей RDAP берется та, в которую входит адрес"""
+        self.assertEqual(primary_network('10.0.3.4', '10.0.2.0/24, 10.0.3.0/24'), '10.0.3.0/24')
+        self.assertIsNone(primary_network('10.9.9.9', '10.0.2.0/24'))
+        self.assertEqual(IPAddress.objects.get(address='10.0.2.1').network, '10.0.2.0/24')
+
+    def test_lookups(self):
+        """Адреса внутри сети и сети, содержащие адрес, без смешения IPv4 и IPv6"""
+        within = IPAddress.objects.filter(address__net_within='10.0.0.0/23').values_list('address', flat=True)
+        self.assertEqual(sorted(within), ['10.0.0.1', '10.0.1.9'])
+        self.assertEqual(IPAddress.objects.filter(address__net_within='::/0').count(), 1)
+        containing = IPAddress.objects.filter(network__net_contains='10.0.1.200').values_list('address', flat=True)
+        self.assertEqual(sorted(containing), ['10.0.0.1', '10.0.1.9'])
+        self.assertFalse(IPAddress.objects.filter(network__net_contains='10.0.3.1').exists())
+
+    def test_api_filters(self):
+        """?within= и ?contains=; некорректная сеть — 400"""
+        client = APIClient()
+        data = client.get('/api/ips/', {'within': '10.0.2.0/24'}).json()
+        self.assertEqual([ip['address'] for ip in data['results']], ['10.0.2.1'])
+        data = client.get('/api/ips/', {'contains': '2001:db8:ffff::7'}).json()
+        self.assertEqual([ip['network'] for ip in data['results']], ['2001:db8::/32'])
+        self.assertEqual(client.get('/api/ips/', {'within': '10.0.0.0/99'}).status_code, 400)
+
+    def test_enricher_uses_stored_networks(self):
+        """Адрес в уже сохраненной сети обогащается без запроса RDAP"""
+        rdap = mock.Mock(side_effect=AssertionError('запрос RDAP не ожидался'))
+        with mock.patch('network.tools.rdap_lookup', rdap):
+            enricher = RdapEnricher(max_workers=1, rate=0)
+            enricher.submit('10.0.1.250', 'ctx')
+            results = enricher.poll(block=True)
+            enricher.close()
+
+        self.assertEqual(results, [('10.0.1.250', '10.0.0.0/23', 'ORG A', 'ctx')])
+        rdap.assert_not_called()
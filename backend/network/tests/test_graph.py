@@ -0,0 +1,200 @@
+"""
+Тесты API графа связей
+"""
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from network.bench.seed import seed_session
+from network.graph import build_session_graph
+from network.layout import LAYOUT_NAME, compute_layout
+from network.models import Domain, IPAddress, Link, ScanSession, SessionGraph
+
+
+class SeededGraphTestCase(TestCase):
+    """Граф на синтетической сессии из бенчмарка"""
+
+    def test_seed_shape(self):
+        """Сессия содержит запрошенное число связей и «горячий» IP с fan-in"""
+        session = seed_session('seed.test', 200, fan_in=40)
+        links = Link.objects.filter(scan_session=session)
+        self.assertEqual(links.count(), 200)
+        hot = links.order_by('-discovered_at').first().ip
+        self.assertEqual(links.filter(ip=hot).count(), 40)
+
+    def test_links_graph_on_fan_in(self):
+        """Домены за «горячим» IP связаны попарно, лимит выборки — 500 связей"""
+        session = seed_session('fanin.test', 1000, fan_in=30)
+        response = APIClient().get('/api/links/graph/', {'domain': 'fanin.test', 'session_id': session.id})
+        self.assertEqual(response.status_code, 200)
+        edges = response.json()['edges']
+        self.assertEqual(sum(e['type'] == 'direct' for e in edges), 500)
+        self.assertGreaterEqual(sum(e['type'] == 'via_ip' for e in edges), 30 * 29 // 2)
+
+
+class BuildSessionGraphTestCase(TestCase):
+    """Сборка графа на колоночных массивах"""
+
+    def setUp(self):
+        self.session = ScanSession.objects.create(root_domain='example.test', status='completed')
+        rows = [
+            ('example.test', '10.0.0.1', '10.0.0.0/24'),
+            ('a.example.test', '10.0.0.1', '10.0.0.0/24'),
+            ('b.example.test', '10.0.0.1', '10.0.0.0/24'),
+            ('b.example.test', '10.0.0.2', '10.0.0.0/24'),
+            ('x.a.example.test', '10.0.1.1', None),
+            ('10.9.9.9', '10.0.1.1', None),
+            ('co.uk', '10.0.2.1', None),
+            ('example.co.uk', '10.0.2.2', None),
+        ]
+        for name, address, cidr in rows:
+            domain, _ = Domain.objects.get_or_create(name=name)
+            ip, _ = IPAddress.objects.get_or_create(address=address, defaults={'cidr': cidr})
+            Link.objects.create(scan_session=self.session, domain=domain, ip=ip, method='dns')
+
+    def edges(self, graph, edge_type):
+        labels = {node['id']: node['label'] for node in graph['nodes']}
+        return {
+            frozenset((labels[e['source']], labels[e['target']]))
+            for e in graph['edges'] if e['type'] == edge_type
+        }
+
+    def test_edges(self):
+        """Косвенные ребра через общий IP, поддомены и по одному member_of на IP"""
+        graph = build_session_graph(self.session)
+
+        self.assertEqual(len(self.edges(graph, 'direct')), 8)
+        self.assertEqual(self.edges(graph, 'via_ip'), {
+            frozenset(pair) for pair in [
+                ('example.test', 'a.example.test'), ('example.test', 'b.example.test'),
+                ('a.example.test', 'b.example.test'), ('x.a.example.test', '10.9.9.9'),
+            ]
+        })
+        # example.co.uk — регистрируемый домен, публичный суффикс co.uk ему не родитель
+        self.assertEqual(self.edges(graph, 'subdomain'), {
+            frozenset(('example.test', 'a.example.test')), frozenset(('example.test', 'b.example.test')),
+            frozenset(('a.example.test', 'x.a.example.test')),
+        })
+        self.assertEqual(self.edges(graph, 'member_of'), {
+            frozenset(('10.0.0.1', '10.0.0.0/24')), frozenset(('10.0.0.2', '10.0.0.0/24')),
+        })
+
+    def test_nodes_and_summary(self):
+        """Имя без букв в поле домена — узел типа ip, подсети без дублей"""
+        graph = build_session_graph(self.session)
+        types = {node['label']: node['type'] for node in graph['nodes']}
+
+        self.assertEqual(types['10.9.9.9'], 'ip')
+        self.assertEqual(types['10.0.0.0/24'], 'subnet')
+        self.assertEqual(graph['summary'], {
+            'total_nodes': 13, 'total_edges': len(graph['edges']), 'domains': 6, 'ips': 6, 'subnets': 1,
+        })
+
+    def test_empty_session(self):
+        """У сессии без связей графа нет"""
+        self.assertIsNone(build_session_graph(ScanSession.objects.create(root_domain='empty.test')))
+
+
+class SessionGraphLayoutTestCase(TestCase):
+    """Раскладка графа на сервере и ее кэш в SessionGraph"""
+
+    def test_layout_is_deterministic(self):
+        """Корень в центре, координаты конечны и одинаковы при повторном расчете"""
+        sources, targets = [0, 0, 1, 2, 3], [1, 2, 3, 3, 4]
+        first = compute_layout(6, sources, targets, root=0)
+        second = compute_layout(6, sources, targets, root=0)
+
+        self.assertTrue(np.isfinite(first).all())
+        self.assertTrue(np.array_equal(first, second))
+        self.assertEqual(first[0].tolist(), [0.0, 0.0])
+        # Несвязанный узел 5 — на самом дальнем кольце
+        radius = np.hypot(first[:, 0], first[:, 1])
+        self.assertEqual(radius.argmax(), 5)
+
+    def test_completed_session_served_from_cache(self):
+        """Завершенная сессия отдает координаты узлов, посчитанные один раз"""
+        session = seed_session('layout.test', 120)
+        client = APIClient()
+        params = {'domain': 'layout.test', 'session_id': session.id}
+
+        data = client.get('/api/links/graph/', params).json()
+        self.assertEqual(data['layout'], LAYOUT_NAME)
+        self.assertTrue(all('position' in node for node in data['nodes']))
+        stored = SessionGraph.objects.get(session=session)
+
+        with mock.patch('network.graph.compute_layout') as layout:
+            again = client.get('/api/links/graph/', params).json()
+        layout.assert_not_called()
+        self.assertEqual(again['nodes'], stored.nodes)
+
+    def test_running_session_has_no_layout(self):
+        """У незавершенной сессии граф собирается на лету и без координат"""
+        session = seed_session('running.test', 40)
+        session.status = 'running'
+        session.save()
+
+        data = APIClient().get('/api/links/graph/', {'domain': 'running.test', 'session_id': session.id}).json()
+        self.assertIsNone(data['layout'])
+        self.assertFalse(any('position' in node for node in data['nodes']))
+        self.assertFalse(SessionGraph.objects.exists())
+
+
+class ClusterApiTestCase(TestCase):
+    """Обзор кластеров и раскрытие кластера"""
+
+    def setUp(self):
+        self.session = ScanSession.objects.create(root_domain='one.test', status='completed')
+        rows = [
+            ('a.one.test', '10.0.0.1', '10.0.0.0/24', 'ORG-A'),
+            ('b.one.test', '10.0.0.2', '10.0.0.0/24', 'ORG-A'),
+            ('b.one.test', '10.0.1.1', '10.0.1.0/24', 'ORG-A'),
+            ('www.two.co.uk', '10.0.1.1', '10.0.1.0/24', 'ORG-A'),
+            ('mail.three.test', '10.0.2.1', None, 'ORG-B'),
+        ]
+        for name, address, cidr, organization in rows:
+            domain, _ = Domain.objects.get_or_create(name=name)
+            ip, _ = IPAddress.objects.get_or_create(address=address, defaults={'cidr': cidr, 'organization': organization})
+            Link.objects.create(scan_session=self.session, domain=domain, ip=ip, method='dns')
+        self.client = APIClient()
+        self.url = f'/api/sessions/{self.session.id}/clusters/'
+
+    def test_overview(self):
+        """Домены свернуты по регистрируемому домену, IP — по подсети, ребра несут число связей"""
+        data = self.client.get(self.url).json()
+        nodes = {node['id']: node for node in data['nodes']}
+        self.assertEqual(
+            set(nodes),
+            {'c-domain:one.test', 'c-domain:two.co.uk', 'c-domain:three.test',
+             'c-subnet:10.0.0.0/24', 'c-subnet:10.0.1.0/24', 'c-subnet:'},
+        )
+        self.assertEqual(nodes['c-domain:one.test']['domains'], 2)
+        self.assertEqual(nodes['c-domain:one.test']['links'], 3)
+        weights = {(e['source'], e['target']): e['weight'] for e in data['edges']}
+        self.assertEqual(weights[('c-domain:one.test', 'c-subnet:10.0.0.0/24')], 2)
+        # Агрегаты сохранены вместе с материализованным графом
+        self.assertTrue(SessionGraph.objects.get(session=self.session).clusters['domain'])
+
+    def test_overview_is_bounded(self):
+        """При limit=2 лишние кластеры сворачиваются в «*», сумма связей сохраняется"""
+        data = self.client.get(self.url, {'grouping': 'organization', 'limit': 2}).json()
+        domain_nodes = [node for node in data['nodes'] if node['kind'] == 'domain']
+        self.assertEqual([node['id'] for node in domain_nodes], ['c-domain:one.test', 'c-domain:*'])
+        self.assertEqual(sum(node['links'] for node in domain_nodes), 5)
+        self.assertEqual(sum(edge['weight'] for edge in data['edges']), 5)
+
+    def test_expand(self):
+        """Раскрытие подсети дает ее IP и связи с кластерами доменов"""
+        data = self.client.get(self.url, {'expand': 'c-subnet:10.0.1.0/24'}).json()
+        members = [node['label'] for node in data['nodes'] if node['type'] == 'ip']
+        self.assertEqual(members, ['10.0.1.1'])
+        self.assertEqual(
+            {(edge['target'], edge['weight']) for edge in data['edges']},
+            {('c-domain:one.test', 1), ('c-domain:two.co.uk', 1)},
+        )
+
+        domains = self.client.get(self.url, {'expand': 'c-domain:one.test'}).json()
+        self.assertEqual(sorted(n['label'] for n in domains['nodes'] if n['type'] == 'domain'), ['a.one.test', 'b.one.test'])
+        self.assertEqual(self.client.get(self.url, {'expand': 'bogus'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'expand': 'c-domain:none.test'}).status_code, 404)
@@ -0,0 +1,87 @@
+"""
+Тесты массового импорта внешних наборов связей
+"""
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from network import ingest
+from network.models import Domain, ScanSession
+from network.storage import session_links
+
+
+class NormalizeTestCase(SimpleTestCase):
+    """Записи разных форматов приводятся к (домен, IP, метод, время)"""
+
+    def test_formats(self):
+        now = timezone.now()
+        dnsdb = {'rrname': 'WWW.Example.com.', 'rrtype': 'A', 'rdata': ['10.0.0.1', 'bad'], 'time_first': 1700000000}
+        [(domain, ip, method, seen)] = ingest.normalize(dnsdb, 'dns', now)
+        self.assertEqual((domain, ip, method), ('www.example.com', '10.0.0.1', 'dns'))
+        self.assertEqual(seen.year, 2023)
+        self.assertEqual(seen.tzinfo, dt_timezone.utc)
+
+        row = {'domain': '*.example.com', 'ip': '2001:DB8::1', 'method': 'tls', 'seen': ''}
+        self.assertEqual(ingest.normalize(row, 'dns', now), [('example.com', '2001:db8::1', 'tls', now)])
+        self.assertEqual(ingest.normalize({'rrname': 'a.test', 'rrtype': 'CNAME', 'rdata': 'b.test'}, 'dns', now), [])
+        self.assertEqual(ingest.normalize({'domain': 'a b.test', 'ip': '10.0.0.1'}, 'dns', now), [])
+
+    def test_copy_text(self):
+        """Строка COPY: табуляции и обратные косые экранируются"""
+        now = timezone.now()
+        text = ingest._copy_text([('a\\b', '10.0.0.1', 'dns', now)]).getvalue()
+        self.assertEqual(text, f'a\\\\b\t10.0.0.1\tdns\t{now.isoformat()}\n')
+
+
+class ImportDatasetTestCase(TestCase):
+    """Импорт CSV и NDJSON.gz кусками в синтетическую сессию"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        Domain.objects.create(name='a.test')
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_csv_in_chunks(self):
+        """Дубликаты связей схлопываются, существующие домены не дублируются"""
+        with open(self.path('pdns.csv'), 'w') as f:
+            f.write('domain,ip,seen\na.test,10.0.0.1,2024-01-01T00:00:00\nb.test,10.0.0.1,\n'
+                    'a.test,10.0.0.1,2023-01-01\nc.test,not-an-ip,\nc.test,10.0.0.2,\n')
+        updates = []
+        with mock.patch.object(ingest, 'CHUNK_SIZE', 2):
+            session = ingest.import_dataset(self.path('pdns.csv'), progress=lambda counts: updates.append(dict(counts)))
+
+        self.assertEqual((session.root_domain, session.status), ('import:pdns.csv', 'completed'))
+        self.assertEqual(session.stats['import'], {'records': 5, 'skipped': 1, 'domains': 2, 'ips': 2, 'links': 3})
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(
+            sorted(session_links(session).values_list('domain__name', 'ip__address')),
+            [('a.test', '10.0.0.1'), ('b.test', '10.0.0.1'), ('c.test', '10.0.0.2')],
+        )
+        self.assertEqual(Domain.objects.count(), 3)
+        # Время наблюдения — самое раннее по всем кускам, а не время импорта
+        self.assertEqual(
+            session_links(session).get(domain__name='a.test').first_seen,
+            datetime(2023, 1, 1, tzinfo=dt_timezone.utc),
+        )
+
+    def test_command_ndjson_gz(self):
+        """Команда: NDJSON в gzip, свой корень и метод по умолчанию"""
+        with gzip.open(self.path('ct.jsonl.gz'), 'wt') as f:
+            for record in [{'common_name': 'x.test', 'ip': '10.0.0.3'}, {'common_name': 'y.test', 'ip': '10.0.0.3'}]:
+                f.write(json.dumps(record) + '\n')
+            f.write('not json\n')
+
+        call_command('import_dataset', self.path('ct.jsonl.gz'), '--root', 'ct.test', '--method', 'tls', stdout=io.StringIO())
+        links = session_links(ScanSession.objects.get(root_domain='ct.test'))
+        self.assertEqual(sorted(links.values_list('domain__name', 'ip__address', 'method')), [('x.test', '10.0.0.3', 'tls'), ('y.test', '10.0.0.3', 'tls')])
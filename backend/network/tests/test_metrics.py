@@ -0,0 +1,68 @@
+"""
+Тесты метрик сканера и экспорта в формате Prometheus
+"""
+from django.test import SimpleTestCase
+
+from network.metrics import Counter, Histogram, ScanStats, SCANNER_QUEUE_SIZE, SCANNER_STAGE_CALLS, render_prometheus
+
+
+class MetricsTestCase(SimpleTestCase):
+    """Тесты метрик процесса"""
+
+    def test_counter_labels(self):
+        """Счетчик хранит значения отдельно по меткам"""
+        counter = Counter('test_requests_total', 'Тестовый счетчик', ('kind',))
+        counter.inc(kind='a')
+        counter.inc(2, kind='a')
+        counter.inc(kind='b')
+        self.assertEqual(counter.value(kind='a'), 3)
+        self.assertIn('test_requests_total{kind="a"} 3', counter.render())
+
+    def test_histogram_buckets(self):
+        """Гистограмма накапливает корзины, count и sum"""
+        histogram = Histogram('test_latency_seconds', 'Тестовая гистограмма', buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        text = histogram.render()
+        self.assertIn('test_latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn('test_latency_seconds_count 2', text)
+
+    def test_scan_stats_summary(self):
+        """Сводка запуска считает вызовы этапов, ошибки и попадания в кэш"""
+        stats = ScanStats()
+        errors_before = SCANNER_STAGE_CALLS.value(stage='dns', outcome='error')
+        with stats.stage('dns'):
+            pass
+        with self.assertRaises(ValueError):
+            with stats.stage('dns'):
+                raise ValueError('boom')
+        stats.cache('crtsh', hit=True)
+        stats.cache('crtsh', hit=False)
+        stats.queue_size(7)
+        stats.queue_size(3)
+
+        summary = stats.summary()
+        self.assertEqual(summary['stages']['dns']['calls'], 2)
+        self.assertEqual(summary['stages']['dns']['errors'], 1)
+        self.assertEqual(summary['caches']['crtsh']['hit_ratio'], 0.5)
+        self.assertEqual(summary['peak_queue'], 7)
+        self.assertEqual(SCANNER_STAGE_CALLS.value(stage='dns', outcome='error'), errors_before + 1)
+
+    def test_queue_size_per_session(self):
+        """Размер очереди — отдельный ряд на сессию; после close() ряд пропадает"""
+        first, second = ScanStats(session_id=101), ScanStats(session_id=102)
+        first.queue_size(5)
+        second.queue_size(2)
+        self.assertEqual(SCANNER_QUEUE_SIZE.value(session='101'), 5)
+        self.assertIn('internetmap_scanner_queue_size{session="102"} 2', SCANNER_QUEUE_SIZE.render())
+        first.close()
+        second.close()
+        self.assertNotIn('session="101"', SCANNER_QUEUE_SIZE.render())
+
+    def test_render_contains_scanner_metrics(self):
+        """Экспорт содержит описания метрик сканера"""
+        text = render_prometheus()
+        self.assertIn('# TYPE internetmap_scanner_stage_seconds histogram', text)
+        self.assertIn('# TYPE internetmap_scanner_stage_inflight gauge', text)
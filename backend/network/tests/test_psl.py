@@ -0,0 +1,86 @@
+"""
+Тесты движка Public Suffix List
+"""
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from network import psl
+from network.tools import extract_base_domains
+
+
+class PublicSuffixTestCase(SimpleTestCase):
+    """Регистрируемый домен по правилам PSL"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Снимки тестов — во временном каталоге, а не в общем каталоге пользователя
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        patcher = mock.patch.object(psl, 'SNAPSHOT_DIR', directory.name)
+        patcher.start()
+        cls.addClassCleanup(patcher.stop)
+
+    def test_registrable_domain(self):
+        """Обычные, многоуровневые, подстановочные, исключения и частные суффиксы"""
+        cases = {
+            'www.tyuiu.ru': 'tyuiu.ru',
+            'a.b.example.co.uk': 'example.co.uk',
+            'shop.example.com.br': 'example.com.br',
+            'mail.gov.spb.ru': 'gov.spb.ru',
+            'foo.bar.kawasaki.jp': 'foo.bar.kawasaki.jp',   # *.kawasaki.jp
+            'www.city.kawasaki.jp': 'city.kawasaki.jp',     # !city.kawasaki.jp
+            'user.github.io': 'user.github.io',             # частная секция
+            'WWW.Example.COM.': 'example.com',
+            '*.example.org': 'example.org',
+            'host.unknown-tld': 'host.unknown-tld',
+            'xn--80ak6aa92e.xn--p1ai': 'xn--80ak6aa92e.xn--p1ai',
+            'co.uk': None,
+            'github.io': None,
+            'com': None,
+            '': None,
+        }
+        for name, expected in cases.items():
+            with self.subTest(name=name):
+                self.assertEqual(psl.registrable_domain(name), expected)
+        self.assertEqual(psl.registrable_domains(list(cases)), list(cases.values()))
+
+    def test_public_suffix(self):
+        """Публичный суффикс и проверка «имя само суффикс»"""
+        self.assertEqual(psl.public_suffix('www.example.co.uk'), 'co.uk')
+        self.assertEqual(psl.public_suffix('foo.bar.kawasaki.jp'), 'bar.kawasaki.jp')
+        self.assertTrue(psl.is_public_suffix('co.uk'))
+        self.assertFalse(psl.is_public_suffix('example.co.uk'))
+
+    def test_extract_base_domains(self):
+        """extract_base_domains больше не путает ccTLD второго уровня"""
+        result = extract_base_domains(['www.example.co.uk', 'mail.example.co.uk', 'a.b.kommune.no', 'co.uk'])
+        self.assertEqual(sorted(result), ['b.kommune.no', 'example.co.uk'])
+
+    def test_snapshot(self):
+        """Скомпилированное дерево сохраняется снимком и при повторной загрузке не компилируется"""
+        with tempfile.TemporaryDirectory() as snapshot_dir, mock.patch.object(psl, 'SNAPSHOT_DIR', snapshot_dir):
+            trie = psl.load()
+            self.assertEqual(len(os.listdir(snapshot_dir)), 1)
+            with mock.patch.object(psl, 'compile_rules', side_effect=AssertionError('снимок не использован')):
+                self.assertEqual(psl.load(), trie)
+
+    def test_untrusted_snapshot_dir_not_used(self):
+        """В каталог, открытый на запись остальным, снимок не пишется и из него не читается"""
+        with tempfile.TemporaryDirectory() as snapshot_dir, mock.patch.object(psl, 'SNAPSHOT_DIR', snapshot_dir):
+            os.chmod(snapshot_dir, 0o777)
+            self.assertTrue(psl.load())
+            self.assertEqual(os.listdir(snapshot_dir), [])
+
+    def test_snapshot_writable_by_others_ignored(self):
+        """Снимок, доступный на запись группе или остальным, не загружается"""
+        with tempfile.TemporaryDirectory() as snapshot_dir, mock.patch.object(psl, 'SNAPSHOT_DIR', snapshot_dir):
+            trie = psl.load()
+            [name] = os.listdir(snapshot_dir)
+            os.chmod(os.path.join(snapshot_dir, name), 0o666)
+            with mock.patch.object(psl, 'compile_rules', return_value=trie) as compile_rules:
+                psl.load()
+            compile_rules.assert_called_once()
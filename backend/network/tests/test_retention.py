@@ -0,0 +1,92 @@
+"""
+Тесты политики хранения сессий и сжатия интервалов Edge
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from network.models import Domain, Edge, EdgeInterval, IPAddress, Link, ScanSession
+from network.retention import apply_retention, plan_retention
+from network.storage import session_links, store_session_edges
+
+NOW = datetime(2026, 10, 19, 12, tzinfo=dt_timezone.utc)
+POLICY = {'keep_all_days': 14, 'snapshot_days': 7, 'max_age_days': 365}
+
+
+def session(id, days_ago, status='completed', root='root.test', base=None):
+    return {'id': id, 'root_domain': root, 'status': status, 'created_at': NOW - timedelta(days=days_ago), 'base_session_id': base}
+
+
+class PlanRetentionTestCase(SimpleTestCase):
+    """Какие сессии попадают под удаление"""
+
+    def test_snapshots_and_limits(self):
+        """Свежие хранятся все, старые — последняя в каждой неделе, старше года — удаляются"""
+        sessions = [session(i, days_ago) for i, days_ago in enumerate(range(0, 40), start=1)]
+        sessions += [session(100, 20, status='failed'), session(101, 500), session(102, 30, status='running')]
+        doomed = plan_retention(sessions, now=NOW, policy=POLICY)
+
+        kept = {s['id'] for s in sessions} - doomed
+        self.assertTrue(all(s['id'] in kept for s in sessions if s['created_at'] >= NOW - timedelta(days=14)))
+        self.assertIn(100, doomed)
+        self.assertIn(101, doomed)
+        self.assertIn(102, kept)
+        old_kept = [s for s in sessions if s['id'] in kept and s['created_at'] < NOW - timedelta(days=14)]
+        weeks = [s['created_at'].date().toordinal() // 7 for s in old_kept if s['status'] == 'completed']
+        self.assertEqual(len(weeks), len(set(weeks)))
+        self.assertGreaterEqual(len(weeks), 3)
+
+    def test_protected_sessions(self):
+        """Последняя завершенная сессия корня и база ожидающего углубления не удаляются"""
+        sessions = [session(1, 900, root='old.test'), session(2, 600), session(3, 650), session(5, 700),
+                    session(4, 1, status='pending', base=3)]
+        doomed = plan_retention(sessions, now=NOW, policy=POLICY)
+
+        self.assertEqual(doomed, {5})
+
+
+@override_settings(SCAN_RETENTION=POLICY)
+class ApplyRetentionTestCase(TestCase):
+    """Удаление сессий в хранилище Edge сжимает интервалы"""
+
+    def setUp(self):
+        self.domains = [Domain.objects.create(name=name) for name in ['root.test', 'a.root.test']]
+        self.ip = IPAddress.objects.create(address='10.0.0.1')
+
+    def make_session(self, days_ago, domains):
+        scan = ScanSession.objects.create(root_domain='root.test', status='completed')
+        created = NOW - timedelta(days=days_ago)
+        ScanSession.objects.filter(id=scan.id).update(created_at=created, completed_at=created)
+        scan.refresh_from_db()
+        Link.objects.bulk_create([Link(scan_session=scan, domain=domain, ip=self.ip) for domain in domains])
+        Link.objects.filter(scan_session=scan).update(discovered_at=created)
+        store_session_edges(scan)
+        return scan
+
+    def test_intervals_compacted(self):
+        """Дыры от удаленных сессий сливают интервалы; связь только из удаленных сессий удаляется"""
+        root, flapping = self.domains
+        # Четыре сессии в одну старую неделю: из них остается последняя
+        plans = [[root, flapping], [root], [root, flapping], [root]]
+        old = [self.make_session(days_ago, domains) for days_ago, domains in zip([60, 59.9, 59.8, 59.7], plans)]
+        recent = self.make_session(1, [root])
+
+        summary = apply_retention(now=NOW)
+
+        self.assertEqual(summary['sessions_deleted'], 3)
+        self.assertEqual(list(ScanSession.objects.order_by('id').values_list('id', flat=True)), [old[-1].id, recent.id])
+        # Корневой домен был во всех сессиях: один интервал 1..5
+        self.assertEqual(list(EdgeInterval.objects.values_list('start_sequence', 'end_sequence')), [(1, 5)])
+        self.assertFalse(Edge.objects.filter(domain=flapping).exists())
+        self.assertEqual(summary['edges_deleted'], 1)
+        for scan in (old[-1], recent):
+            self.assertEqual(list(session_links(scan).values_list('domain__name', flat=True)), ['root.test'])
+
+    def test_dry_run(self):
+        """dry_run ничего не удаляет"""
+        for days_ago in [60, 59.9]:
+            self.make_session(days_ago, self.domains)
+        summary = apply_retention(now=NOW, dry_run=True)
+
+        self.assertEqual(summary['sessions_deleted'], 1)
+        self.assertEqual(ScanSession.objects.count(), 2)
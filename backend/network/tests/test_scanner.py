@@ -0,0 +1,186 @@
+"""
+Тесты обхода InternetMapScanner без сетевых запросов
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from network.models import Domain, IPAddress, Link, ScanSession
+from network.scanner import InternetMapScanner
+
+
+# Синтетический "интернет": домен -> IP и IP -> домены из TLS-сертификата
+ZONE = {
+    'root.test': ['10.0.0.1'],
+    'a.root.test': ['10.0.0.2'],
+    'b.root.test': ['10.0.0.3'],
+    'c.root.test': ['10.0.0.4'],
+}
+TLS = {
+    '10.0.0.1': ['a.root.test'],
+    '10.0.0.2': ['b.root.test'],
+    '10.0.0.3': ['c.root.test'],
+}
+
+
+def offline_scanner(session, max_depth):
+    """Сканер, у которого все сетевые шаги заменены синтетической зоной."""
+    scanner = InternetMapScanner(session=session, max_depth=max_depth)
+    scanner._get_ips_for_domain = lambda domain: ZONE.get(domain, [])
+    scanner._get_subdomains_from_crtsh = lambda domain: set()
+    scanner._scan_ip_subnet = lambda ip, domain, depth: None
+    return scanner
+
+
+@mock.patch('network.scanner.get_subdomains_with_theharvester', lambda domain: set())
+@mock.patch('network.scanner.get_domains_from_ip_reverse_dns', lambda ip: [])
+@mock.patch('network.scanner.get_domains_from_tls', lambda ip, port=443: TLS.get(ip, []))
+class DepthExtensionTestCase(TestCase):
+    """Углубление завершенного скана с его границы"""
+
+    def run_scan(self, depth, base_session=None):
+        session = ScanSession.objects.create(root_domain='root.test', depth=depth, base_session=base_session)
+        scanner = offline_scanner(session, depth)
+        if base_session:
+            scanner.extend(base_session)
+        else:
+            scanner.scan('root.test')
+        session.frontier = scanner.frontier
+        session.status = 'completed'
+        session.save()
+        return session, scanner
+
+    def link_pairs(self, session):
+        return set(Link.objects.filter(scan_session=session).values_list('domain__name', 'ip__address'))
+
+    def test_frontier_recorded_at_depth_limit(self):
+        """Домены, отброшенные по лимиту глубины, попадают в frontier"""
+        session, _ = self.run_scan(depth=1)
+        self.assertEqual(session.frontier, ['a.root.test'])
+
+    def test_extension_matches_full_scan(self):
+        """Углубленный скан дает тот же граф, что и полный скан той же глубины"""
+        base, _ = self.run_scan(depth=1)
+        extended, scanner = self.run_scan(depth=3, base_session=base)
+
+        full = ScanSession.objects.create(root_domain='root.test', depth=3)
+        offline_scanner(full, 3).scan('root.test')
+
+        self.assertEqual(self.link_pairs(extended), self.link_pairs(full))
+        self.assertEqual(extended.frontier, ['c.root.test'])
+
+    def test_extension_skips_already_visited(self):
+        """Углубление не запрашивает DNS для доменов, обойденных базовым сканом"""
+        base, _ = self.run_scan(depth=2)
+        session = ScanSession.objects.create(root_domain='root.test', depth=3, base_session=base)
+        scanner = offline_scanner(session, 3)
+        resolved = []
+        scanner._get_ips_for_domain = lambda domain: resolved.append(domain) or ZONE.get(domain, [])
+        scanner.extend(base)
+
+        self.assertEqual(resolved, ['b.root.test'])
+        self.assertTrue(self.link_pairs(base) <= self.link_pairs(session))
+
+
+@mock.patch('network.scanner.get_subdomains_with_theharvester', lambda domain: set())
+@mock.patch('network.scanner.get_domains_from_ip_reverse_dns', lambda ip: [])
+@mock.patch('network.scanner.get_domains_from_tls', lambda ip, port=443: TLS.get(ip, []))
+@mock.patch.object(InternetMapScanner, '_get_ips_for_domain', lambda self, domain: ZONE.get(domain, []))
+@mock.patch.object(InternetMapScanner, '_get_subdomains_from_crtsh', lambda self, domain: set())
+@mock.patch.object(InternetMapScanner, '_scan_ip_subnet', lambda self, ip, domain, depth: None)
+class SessionStatsTestCase(TestCase):
+    """Статистика, сохраняемая задачей в ScanSession"""
+
+    def test_task_persists_stats(self):
+        """run_scanner_task завершает сессию и сохраняет статистику обхода"""
+        from network.tasks import run_scanner_task
+
+        session = ScanSession.objects.create(root_domain='root.test', depth=2)
+        run_scanner_task(session.id)
+        session.refresh_from_db()
+
+        self.assertEqual(session.status, 'completed')
+        self.assertIsNotNone(session.completed_at)
+        self.assertEqual(session.stats['items']['domain'], 2)
+        self.assertEqual(session.stats['items']['ip'], 2)
+        self.assertEqual(session.stats['links_by_method'], {'dns': 2, 'tls-cert': 2})
+        self.assertEqual(session.stats['stages']['dns']['calls'], 2)
+        self.assertEqual(session.stats['network_calls'], 8)
+        # Граф завершенной сессии сразу материализован вместе с раскладкой
+        self.assertTrue(all('position' in node for node in session.graph.nodes))
+
+    def test_sessions_api(self):
+        """Список и карточка сессий отдают сохраненную статистику"""
+        from rest_framework.test import APIClient
+
+        session = ScanSession.objects.create(root_domain='root.test', depth=1, status='completed', stats={'peak_queue': 3})
+        ScanSession.objects.create(root_domain='other.test', depth=1)
+        # Длительность считается от отправки воркеру, ожидание в очереди — отдельно
+        ScanSession.objects.filter(pk=session.pk).update(
+            dispatched_at=session.created_at + timedelta(seconds=30),
+            completed_at=session.created_at + timedelta(seconds=40),
+        )
+        client = APIClient()
+
+        listed = client.get('/api/sessions/', {'root_domain': 'root.test'}).json()['results']
+        self.assertEqual([item['id'] for item in listed], [session.id])
+        self.assertEqual((listed[0]['queue_wait_seconds'], listed[0]['duration_seconds']), (30.0, 10.0))
+        page = client.get('/api/sessions/', {'page_size': 1}).json()
+        self.assertEqual(len(page['results']), 1)
+        self.assertIsNotNone(page['next'])
+        detail = client.get(f'/api/sessions/{session.id}/').json()
+        self.assertEqual(detail['stats'], {'peak_queue': 3})
+
+
+@mock.patch('network.scanner.get_subdomains_with_theharvester', lambda domain: {('github.io', None), ('b.root.test', None)})
+@mock.patch('network.scanner.get_domains_from_ip_reverse_dns', lambda ip: ['com'])
+@mock.patch('network.scanner.get_domains_from_tls', lambda ip, port=443: ['a.root.test', 'co.uk'])
+class PublicSuffixScopeTestCase(TestCase):
+    """Сканер не уходит в публичные суффиксы из SAN, PTR и theHarvester"""
+
+    def test_public_suffixes_skipped(self):
+        session = ScanSession.objects.create(root_domain='root.test', depth=1)
+        scanner = offline_scanner(session, 1)
+        scanner.scan('root.test')
+
+        self.assertEqual(set(scanner.frontier), {'a.root.test', 'b.root.test'})
+        self.assertFalse(Link.objects.filter(domain__name='co.uk').exists())
+
+
+@mock.patch('network.scanner.get_subdomains_with_theharvester', lambda domain: set())
+@mock.patch('network.scanner.get_domains_from_ip_reverse_dns', lambda ip: [])
+@mock.patch('network.scanner.get_domains_from_tls', lambda ip, port=443: TLS.get(ip, []) + ['x.root.test', 'y.root.test'])
+class PrimaryKeyCacheTestCase(TestCase):
+    """Связи сохраняются по pk из словарей сканера, без SELECT на каждое имя"""
+
+    def test_no_per_name_lookups(self):
+        """Домены и IP выбираются пачками через IN, повторно встреченные — вообще без запросов"""
+        Domain.objects.create(name='x.root.test')
+        session = ScanSession.objects.create(root_domain='root.test', depth=3)
+        scanner = offline_scanner(session, 3)
+        with CaptureQueriesContext(connection) as queries:
+            scanner.scan('root.test')
+
+        lookups = [q['sql'] for q in queries if 'FROM "network_domain"' in q['sql'] or 'FROM "network_ipaddress"' in q['sql']]
+        self.assertTrue(lookups)
+        self.assertTrue(all(' IN (' in sql for sql in lookups), lookups)
+        self.assertEqual(Domain.objects.filter(name='x.root.test').count(), 1)
+        self.assertEqual(scanner.domain_pks['x.root.test'], Domain.objects.get(name='x.root.test').pk)
+        self.assertTrue(Link.objects.filter(scan_session=session, domain__name='y.root.test', method='tls-cert').exists())
+
+    def test_bad_values_do_not_break_warm_up(self):
+        """Невалидные значения не попадают в пачку, ошибка базы на пачке — переход к построчному пути"""
+        session = ScanSession.objects.create(root_domain='root.test', depth=1)
+        scanner = offline_scanner(session, 1)
+        scanner._warm_pks(domains=['ok.root.test', 'x' * 300, None], ips=['10.0.0.1', 'not-an-ip'])
+        self.assertEqual(set(scanner.domain_pks), {'ok.root.test'})
+        self.assertEqual(set(scanner.ip_pks), {'10.0.0.1'})
+
+        with mock.patch.object(Domain.objects, 'bulk_create', side_effect=DatabaseError('boom')):
+            scanner._warm_pks(domains=['new.root.test'])
+        self.assertNotIn('new.root.test', scanner.domain_pks)
+        scanner._save_link(session, 'new.root.test', '10.0.0.1')
+        self.assertTrue(Link.objects.filter(scan_session=session, domain__name='new.root.test').exists())
@@ -0,0 +1,75 @@
+"""
+Тесты планировщика сканов
+"""
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from network.models import ScanSession
+from network.scheduler import BATCH_QUEUE, INTERACTIVE_QUEUE, classify, dispatch_waiting, requester_from_request, submit_scan
+
+
+class RequesterTestCase(SimpleTestCase):
+    """X-Forwarded-For учитывается только от доверенных прокси"""
+
+    def requester(self, remote, forwarded):
+        return requester_from_request(RequestFactory().get('/', REMOTE_ADDR=remote, HTTP_X_FORWARDED_FOR=forwarded))
+
+    def test_untrusted_header_ignored(self):
+        self.assertEqual(self.requester('203.0.113.5', '198.51.100.1'), 'ip:203.0.113.5')
+
+    @override_settings(TRUSTED_PROXIES=['10.0.0.1', '10.0.0.2'])
+    def test_trusted_chain(self):
+        """Клиентом считается первый недоверенный адрес справа, поддельный левый адрес не учитывается"""
+        self.assertEqual(self.requester('10.0.0.1', '1.1.1.1, 198.51.100.1, 10.0.0.2'), 'ip:198.51.100.1')
+        self.assertEqual(self.requester('10.0.0.1', '10.0.0.2'), 'ip:10.0.0.2')
+
+
+class ClassifyTestCase(TestCase):
+    """Тесты выбора очереди и приоритета"""
+
+    def test_shallow_scans_are_interactive(self):
+        """Мелкие сканы идут в интерактивную очередь с высоким приоритетом"""
+        self.assertEqual(classify(1), (INTERACTIVE_QUEUE, 0))
+        self.assertEqual(classify(2)[0], INTERACTIVE_QUEUE)
+
+    def test_deep_scans_are_batch(self):
+        """Глубокие сканы уходят в пакетную очередь"""
+        self.assertEqual(classify(4)[0], BATCH_QUEUE)
+
+    @override_settings(SCAN_INTERACTIVE_MAX_COST=100)
+    def test_expensive_scans_are_batch(self):
+        """Дорогой скан уходит в пакетную очередь даже при малой глубине"""
+        self.assertEqual(classify(1, estimated_cost=500)[0], BATCH_QUEUE)
+        self.assertEqual(classify(1, estimated_cost=50)[0], INTERACTIVE_QUEUE)
+
+
+@override_settings(SCAN_REQUESTER_CONCURRENCY=1)
+@mock.patch('network.scheduler.run_scanner_task.apply_async')
+class QuotaTestCase(TestCase):
+    """Тесты квоты одновременных сканов на заказчика"""
+
+    def create(self, requester, depth=1):
+        return ScanSession.objects.create(root_domain=f'{requester}.test', depth=depth, requester=requester)
+
+    def test_quota_defers_second_scan(self, apply_async):
+        """Второй скан того же заказчика ждет, чужой скан уходит сразу"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(submit_scan(self.create('alice')))
+            self.assertFalse(submit_scan(self.create('alice')))
+            self.assertTrue(submit_scan(self.create('bob')))
+        self.assertEqual(apply_async.call_count, 2)
+
+    def test_finished_scan_releases_slot(self, apply_async):
+        """После завершения скана отправляется следующий ожидающий по приоритету"""
+        first = self.create('alice', depth=4)
+        submit_scan(first)
+        deep = self.create('alice', depth=4)
+        submit_scan(deep)
+        shallow = self.create('alice', depth=1)
+        submit_scan(shallow)
+
+        ScanSession.objects.filter(id=first.id).update(status='completed')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(dispatch_waiting('alice'), [shallow.id])
+        apply_async.assert_called_once_with(args=[shallow.id], queue=INTERACTIVE_QUEUE, priority=0)
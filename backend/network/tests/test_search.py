@@ -0,0 +1,54 @@
+"""
+Тесты поиска доменов по суффиксу, префиксу и подстроке
+"""
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from network.models import Domain, IPAddress, Link, ScanSession
+from network.search import parse_query, search_domains
+
+
+class ParseQueryTestCase(SimpleTestCase):
+    """Вид запроса по положению звездочки"""
+
+    def test_kinds(self):
+        self.assertEqual(parse_query('*.TYUIU.ru.'), ('suffix', '.tyuiu.ru'))
+        self.assertEqual(parse_query('mail*'), ('prefix', 'mail'))
+        self.assertEqual(parse_query(' tyuiu '), ('substring', 'tyuiu'))
+        for query in ('', '*', 'a*b', 'ab'):
+            with self.assertRaises(ValueError):
+                parse_query(query)
+
+
+class DomainSearchTestCase(TestCase):
+    """search_domains и /api/domains/search/"""
+
+    def setUp(self):
+        names = ['tyuiu.ru', 'mail.tyuiu.ru', 'lk.mail.tyuiu.ru', 'nottyuiu.ru', 'mail.example.com']
+        self.domains = {name: Domain.objects.create(name=name) for name in names}
+        self.session = ScanSession.objects.create(root_domain='tyuiu.ru', status='completed')
+        ip = IPAddress.objects.create(address='10.0.0.1')
+        for name in ('tyuiu.ru', 'lk.mail.tyuiu.ru'):
+            Link.objects.create(scan_session=self.session, domain=self.domains[name], ip=ip, method='dns')
+
+    def names(self, query, session=None):
+        return sorted(search_domains(query, session).values_list('name', flat=True))
+
+    def test_search(self):
+        """Поддомены без самого домена и без похожих имен; префикс; подстрока; сессия"""
+        self.assertEqual(self.names('*.tyuiu.ru'), ['lk.mail.tyuiu.ru', 'mail.tyuiu.ru'])
+        self.assertEqual(self.names('mail*'), ['mail.example.com', 'mail.tyuiu.ru'])
+        self.assertEqual(self.names('tyuiu'), ['lk.mail.tyuiu.ru', 'mail.tyuiu.ru', 'nottyuiu.ru', 'tyuiu.ru'])
+        self.assertEqual(self.names('*.tyuiu.ru', self.session), ['lk.mail.tyuiu.ru'])
+
+    def test_api(self):
+        """Страницы по алфавиту; некорректный шаблон — 400, неизвестная сессия — 404"""
+        client = APIClient()
+        data = client.get('/api/domains/search/', {'q': 'tyuiu', 'page_size': 3}).json()
+        self.assertEqual([d['name'] for d in data['results']], ['lk.mail.tyuiu.ru', 'mail.tyuiu.ru', 'nottyuiu.ru'])
+        data = client.get(data['next']).json()
+        self.assertEqual([d['name'] for d in data['results']], ['tyuiu.ru'])
+        self.assertIsNone(data['next'])
+
+        self.assertEqual(client.get('/api/domains/search/', {'q': 'ab'}).status_code, 400)
+        self.assertEqual(client.get('/api/domains/search/', {'q': 'tyuiu', 'session': 999}).status_code, 404)
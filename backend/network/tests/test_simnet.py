@@ -0,0 +1,37 @@
+"""
+Тесты симулированного интернета для офлайн-бенчмарка
+"""
+import dns.resolver
+from django.test import TestCase
+
+from network.bench.simnet import ROOT_DOMAIN, SimulatedInternet, SyntheticZone
+from network.models import Link, ScanSession
+from network.scanner import InternetMapScanner
+
+
+class SyntheticZoneTestCase(TestCase):
+    """Тесты синтетической зоны"""
+
+    def test_zone_shape(self):
+        """Зона содержит CNAME-цепочки, домены без A-записи и общие IP"""
+        zone = SyntheticZone(40)
+        self.assertEqual(len(zone.names), 40)
+        self.assertTrue(zone.cnames)
+        self.assertTrue(any(zone.address_of(name) is None for name in zone.names))
+        self.assertLess(len(zone.ptr), len(zone.addresses))
+
+    def test_full_scan_offline(self):
+        """Сканер проходит всю зону без обращения к настоящему интернету"""
+        zone = SyntheticZone(12)
+        with SimulatedInternet(zone):
+            self.assertEqual(
+                [r.to_text() for r in dns.resolver.resolve(ROOT_DOMAIN, 'A')],
+                [zone.address_of(ROOT_DOMAIN)],
+            )
+            session = ScanSession.objects.create(root_domain=ROOT_DOMAIN, depth=5)
+            scanner = InternetMapScanner(session=session, max_depth=5)
+            scanner.scan(ROOT_DOMAIN)
+
+        self.assertEqual(scanner.visited_domains, zone.known_names)
+        methods = set(Link.objects.filter(scan_session=session).values_list('method', flat=True))
+        self.assertTrue({'dns', 'tls-cert', 'harvester', 'nmap-subnet'} <= methods)
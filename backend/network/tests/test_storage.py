@@ -0,0 +1,94 @@
+"""
+Тесты хранилища связей Edge/EdgeInterval
+"""
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from network.graph import build_session_graph
+from network.models import Domain, Edge, EdgeInterval, IPAddress, Link, ScanSession
+from network.storage import session_links, store_session_edges
+
+
+class EdgeStorageTestCase(TestCase):
+    """Перенос сессий в Edge: одна строка на связь, членство интервалами"""
+
+    def setUp(self):
+        self.domains = {name: Domain.objects.create(name=name) for name in ['root.test', 'a.root.test', 'b.root.test']}
+        self.ips = {address: IPAddress.objects.create(address=address, cidr='10.0.0.0/24') for address in ['10.0.0.1', '10.0.0.2']}
+
+    def make_session(self, triples, root='root.test'):
+        session = ScanSession.objects.create(root_domain=root, status='completed', completed_at=timezone.now())
+        Link.objects.bulk_create([
+            Link(scan_session=session, domain=self.domains[domain], ip=self.ips[ip], method=method)
+            for domain, ip, method in triples
+        ])
+        return session
+
+    def triples(self, session):
+        return set(session_links(session).values_list('domain__name', 'ip__address', 'method'))
+
+    def test_daily_rescans_share_rows(self):
+        """Неизменные связи хранятся один раз, интервал продлевается; пропуск дает второй интервал"""
+        stable = ('root.test', '10.0.0.1', 'dns')
+        flapping = ('a.root.test', '10.0.0.2', 'tls-cert')
+        plans = [{stable, flapping}, {stable}, {stable, flapping, ('b.root.test', '10.0.0.1', 'dns')}]
+        sessions = [self.make_session(plan) for plan in plans]
+        for session in sessions:
+            store_session_edges(session)
+
+        self.assertFalse(Link.objects.exists())
+        self.assertEqual(Edge.objects.count(), 3)
+        self.assertEqual([s.sequence for s in sessions], [1, 2, 3])
+        for session, plan in zip(sessions, plans):
+            self.assertEqual(self.triples(session), plan)
+        stable_edge = Edge.objects.get(domain__name='root.test')
+        self.assertEqual(list(stable_edge.intervals.values_list('start_sequence', 'end_sequence')), [(1, 3)])
+        self.assertEqual(
+            sorted(EdgeInterval.objects.filter(edge__domain__name='a.root.test').values_list('start_sequence', 'end_sequence')),
+            [(1, 1), (3, 3)],
+        )
+
+    def test_roots_are_independent(self):
+        """Одинаковая связь в сессиях разных корней — одна Edge, свои интервалы"""
+        first = self.make_session({('root.test', '10.0.0.1', 'dns')})
+        other = self.make_session({('root.test', '10.0.0.1', 'dns')}, root='other.test')
+        store_session_edges(first)
+        store_session_edges(other)
+
+        self.assertEqual(Edge.objects.count(), 1)
+        self.assertEqual((first.sequence, other.sequence), (1, 1))
+        self.assertEqual(self.triples(other), {('root.test', '10.0.0.1', 'dns')})
+
+    def test_graph_unchanged(self):
+        """Граф сессии после переноса тот же, что по строкам Link"""
+        session = self.make_session({
+            ('root.test', '10.0.0.1', 'dns'), ('a.root.test', '10.0.0.1', 'dns'), ('b.root.test', '10.0.0.2', 'tls-cert'),
+        })
+        shape = lambda graph: (
+            sorted(node['label'] for node in graph['nodes']),
+            sorted((edge['type'], edge['label']) for edge in graph['edges']),
+            graph['summary'],
+        )
+        before = shape(build_session_graph(session))
+        call_command('store_edges', stdout=open('/dev/null', 'w'))
+        session.refresh_from_db()
+
+        self.assertEqual(session.storage, 'edges')
+        self.assertEqual(shape(build_session_graph(session)), before)
+
+    def test_deleted_session_number_not_reused(self):
+        """Номер удаленной последней сессии не выдается снова: ее интервалы не попадают в новую"""
+        stable = ('root.test', '10.0.0.1', 'dns')
+        extra = ('a.root.test', '10.0.0.2', 'tls-cert')
+        first, second = self.make_session({stable}), self.make_session({stable, extra})
+        store_session_edges(first)
+        store_session_edges(second)
+        second.delete()
+
+        rescan = self.make_session({stable})
+        store_session_edges(rescan)
+
+        self.assertEqual(rescan.sequence, 3)
+        self.assertEqual(self.triples(rescan), {stable})
+        self.assertEqual(self.triples(first), {stable})
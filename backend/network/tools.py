@@ -8,8 +8,11 @@ import subprocess
 import logging
 from ipwhois import IPWhois
 import xml.etree.ElementTree as ET
+from . import psl
 import dns.resolver, dns.reversename
-from typing import List, Set, Tuple, Dict, Optional
+from typing import List, Set, Tuple, Dict, Optional, Iterable, Iterator
+import codecs
+import tempfile
 import socket
 import ssl
 from cryptography import x509
@@ -19,6 +22,10 @@ import ipaddress
 
 DEFAULT_CACHE_DIR = "cache/crtsh"
 DEFAULT_SLEEP = 1.0
+# Адреса внешних сервисов; переопределяются, например, стендом бенчмарка
+CRTSH_URL = os.environ.get("CRTSH_URL", "https://crt.sh/json")
+# Если задан, RDAP запрашивается напрямую по {RDAP_URL}/ip/<ip> вместо бутстрапа ipwhois
+RDAP_URL = os.environ.get("RDAP_URL")
 logger = logging.getLogger(__name__)
 
 def get_domains_from_ip_reverse_dns(ip: str) -> List[str]:
@@ -41,7 +48,25 @@ def _cache_path(cache_dir: str, key: str) -> str:
     return os.path.join(cache_dir, f"{h}.json")
 
 
+def load_crtsh_cache(domain: str, cache_dir: str = DEFAULT_CACHE_DIR):
+    """
+    Возвращает закэшированный ответ crt.sh для домена без сетевого запроса.
+    None — кэша нет или он поврежден.
+    """
+    cache_path = _cache_path(cache_dir, f"crtsh:{domain}")
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
 def rdap_lookup(ip: str):
+    if RDAP_URL:
+        return _rdap_lookup_http(ip)
+
     obj = IPWhois(ip)
     res = obj.lookup_rdap()
 
@@ -50,13 +75,33 @@ def rdap_lookup(ip: str):
     return cidr, name
 
 
+def _rdap_lookup_http(ip: str, timeout: int = 10):
+    """RDAP-запрос к серверу RDAP_URL. Возвращает (cidr, name), как rdap_lookup."""
+    r = requests.get(f"{RDAP_URL.rstrip('/')}/ip/{ip}", timeout=timeout)
+    r.raise_for_status()
+    data = r.json()
+
+    cidrs = data.get("cidr0_cidrs") or []
+    if cidrs:
+        prefix = cidrs[0].get("v4prefix") or cidrs[0].get("v6prefix")
+        cidr = f"{prefix}/{cidrs[0]['length']}"
+    else:
+        # Диапазон start-end сворачиваем в наименьшие покрывающие сети
+        networks = ipaddress.summarize_address_range(
+            ipaddress.ip_address(data["startAddress"]),
+            ipaddress.ip_address(data["endAddress"]),
+        )
+        cidr = ", ".join(str(n) for n in networks)
+    return cidr, data.get("name")
+
+
 # Получает json с crt.sh со связанными с доменом субдоменами
 def fetch_crtsh_json(domain: str,
                      cache_dir: str = DEFAULT_CACHE_DIR,
                      use_cache: bool = True,
                      max_retries: int = 3,
                      timeout: int = 20,
-                     sleep_sec: float = DEFAULT_SLEEP,
+                     sleep_sec: float = None,
                      debug: bool = False):
     """
     Fetch crt.sh JSON for a domain and return parsed Python object (list of dicts).
@@ -64,10 +109,12 @@ def fetch_crtsh_json(domain: str,
     - use_cache: if True, read/write cache files in cache_dir
     - max_retries: retry attempts on transient errors
     - timeout: HTTP timeout in seconds
-    - sleep_sec: politeness pause after successful fetch
+    - sleep_sec: politeness pause after successful fetch (DEFAULT_SLEEP if None)
     - debug: print diagnostics
     Returns: list (parsed JSON) or [] on failure.
     """
+    if sleep_sec is None:
+        sleep_sec = DEFAULT_SLEEP
     key = f"crtsh:{domain}"
     cache_path = _cache_path(cache_dir, key)
 
@@ -79,7 +126,7 @@ def fetch_crtsh_json(domain: str,
         except Exception as e:
             if debug: print(f"[crtsh] cache load failed: {e}")
 
-    url = f"https://crt.sh/json?q={domain}"
+    url = f"{CRTSH_URL}?q={domain}"
     headers = {
         "User-Agent": "Mozilla/5.0 (compatible; poc-crtsh/1.0; +https://example.invalid)",
         "Accept": "application/json, text/*;q=0.8, */*;q=0.1",
@@ -153,25 +200,195 @@ def fetch_crtsh_json(domain: str,
     return []
 
 
+def normalize_cert_name(name: str) -> Optional[str]:
+    """Имя из сертификата в нижнем регистре без пробелов и точки в конце; None — не доменное имя (email, пусто)."""
+    name = name.strip().lower().rstrip('.')
+    if not name or '@' in name or ' ' in name:
+        return None
+    return name
+
+
+def _entry_names(entry) -> Iterator[str]:
+    """CN и SAN записи crt.sh: name_value — имена через перевод строки."""
+    if not isinstance(entry, dict):
+        return
+    for field in ("common_name", "name_value"):
+        value = entry.get(field)
+        if not value:
+            continue
+        for raw in value.split("\n"):
+            name = normalize_cert_name(raw)
+            if name:
+                yield name
+
+
 def extract_common_names(crtsh_json):
     """
-    При наличии crt.sh JSON (списка словарей) возвращает отсортированный уникальный список значений common_name.
-    - Игнорирует записи без 'common_name'.
-    - Нормализует до нижнего регистра и удаляет пробелы и точки в конце.
+    При наличии crt.sh JSON (списка словарей) возвращает отсортированный уникальный список имен:
+    common_name и SAN из name_value.
+    - Нормализует до нижнего регистра и удаляет пробелы и точки в конце, email-адреса отбрасывает.
     """
     if not crtsh_json:
         return []
     names = set()
     for entry in crtsh_json:
-        if not isinstance(entry, dict):
+        names.update(_entry_names(entry))
+    return sorted(names)
+
+
+# --- Потоковый разбор crt.sh ---
+# По крупным корням crt.sh отдает десятки мегабайт JSON: разбираем массив по мере
+# загрузки и отдаем имена сразу, не держа в памяти ни тело ответа, ни список записей.
+
+CRTSH_CHUNK_SIZE = 64 * 1024
+# Больше этого одна запись crt.sh быть не может — значит, поток поврежден
+CRTSH_MAX_ENTRY_SIZE = 1024 * 1024
+_json_decoder = json.JSONDecoder()
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator:
+    """
+    Элементы JSON-массива из потока кусков текста. В памяти — только недочитанный элемент.
+    Мусор до первой '[' (например, HTML-обертка) пропускается.
+    ValueError — поток оборвался до закрывающей ']' или элемент не разбирается.
+    """
+    buffer = ''
+    started = False
+    for chunk in chunks:
+        buffer += chunk
+        pos = 0
+        if not started:
+            start = buffer.find('[')
+            if start == -1:
+                buffer = ''
+                continue
+            started = True
+            pos = start + 1
+        length = len(buffer)
+        while True:
+            while pos < length and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= length:
+                break
+            if buffer[pos] == ']':
+                return
+            try:
+                item, pos_end = _json_decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Элемент еще не догружен целиком
+                break
+            yield item
+            pos = pos_end
+        buffer = buffer[pos:]
+        if len(buffer) > CRTSH_MAX_ENTRY_SIZE:
+            raise ValueError("crt.sh: запись не разбирается как JSON")
+    raise ValueError("crt.sh: поток оборвался до конца массива")
+
+
+def iter_unique_names(entries: Iterable) -> Iterator[str]:
+    """
+    Уникальные нормализованные CN и SAN из записей crt.sh, в порядке появления.
+    Множество просмотренных имен не больше самого списка отданных имен; сырые записи
+    и тело ответа в памяти не держатся.
+    """
+    seen = set()
+    for entry in entries:
+        for name in _entry_names(entry):
+            if name not in seen:
+                seen.add(name)
+                yield name
+
+
+def _iter_text_file(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            chunk = f.read(CRTSH_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_cached_crtsh_names(domain: str, cache_dir: str = DEFAULT_CACHE_DIR) -> Optional[Iterator[str]]:
+    """Имена из кэша crt.sh потоком, без загрузки файла целиком. None — кэша нет."""
+    cache_path = _cache_path(cache_dir, f"crtsh:{domain}")
+    if not os.path.exists(cache_path):
+        return None
+    return iter_unique_names(iter_json_array(_iter_text_file(cache_path)))
+
+
+def iter_crtsh_names(domain: str,
+                     cache_dir: str = DEFAULT_CACHE_DIR,
+                     use_cache: bool = True,
+                     max_retries: int = 3,
+                     timeout: int = 20,
+                     sleep_sec: float = None) -> Iterator[str]:
+    """
+    Имена (CN и SAN) из crt.sh по мере загрузки ответа.
+    Сырой ответ параллельно пишется во временный файл и становится кэшем (тем же,
+    что читают fetch_crtsh_json и load_crtsh_cache), только если массив дочитан до конца.
+    Повторы — пока не отдано ни одного имени; обрыв посреди потока завершает итерацию.
+    """
+    if sleep_sec is None:
+        sleep_sec = DEFAULT_SLEEP
+    cached = iter_cached_crtsh_names(domain, cache_dir) if use_cache else None
+    if cached is not None:
+        yield from cached
+        return
+
+    url = f"{CRTSH_URL}?q={domain}"
+    headers = {
+        "User-Agent": "Mozilla/5.0 (compatible; poc-crtsh/1.0; +https://example.invalid)",
+        "Accept": "application/json, text/*;q=0.8, */*;q=0.1",
+    }
+    for attempt in range(1, max_retries + 1):
+        try:
+            r = requests.get(url, headers=headers, timeout=timeout, stream=True)
+        except requests.RequestException as e:
+            logger.debug(f"crt.sh {domain}: ошибка запроса (попытка {attempt}): {e}")
+            time.sleep(sleep_sec * attempt)
             continue
-        cn = entry.get("common_name")
-        if not cn:
+        if r.status_code != 200:
+            logger.debug(f"crt.sh {domain}: статус {r.status_code} (попытка {attempt})")
+            r.close()
+            time.sleep(sleep_sec * attempt)
             continue
-        cn = cn.strip().lower().rstrip('.')
-        if cn:
-            names.add(cn)
-    return sorted(names)
+        break
+    else:
+        return
+
+    cache_file = tmp_path = None
+    if use_cache:
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(_cache_path(cache_dir, "")), suffix=".part")
+            cache_file = os.fdopen(fd, "w", encoding="utf-8")
+        except OSError:
+            cache_file = None
+
+    decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+
+    def chunks():
+        for raw in r.iter_content(chunk_size=CRTSH_CHUNK_SIZE):
+            text = decoder.decode(raw)
+            if cache_file:
+                cache_file.write(text)
+            yield text
+
+    complete = False
+    try:
+        yield from iter_unique_names(iter_json_array(chunks()))
+        complete = True
+    except (ValueError, requests.RequestException) as e:
+        logger.warning(f"crt.sh {domain}: ответ прочитан не полностью: {e}")
+    finally:
+        r.close()
+        if cache_file:
+            cache_file.close()
+            if complete:
+                os.replace(tmp_path, _cache_path(cache_dir, f"crtsh:{domain}"))
+            else:
+                os.unlink(tmp_path)
+    if complete:
+        time.sleep(sleep_sec)
 
 
 def get_nameservers(domain: str) -> List[str]:
@@ -196,26 +413,8 @@ def get_nameservers(domain: str) -> List[str]:
 
 
 def extract_base_domains(subdomains: List[str]) -> List[str]:
-    """Возвращает уникальные базовые домены (правильно обрабатывает .co.uk, .com.br и т.д.)"""
-    base_domains: Set[str] = set()
-    
-    for sub in subdomains:
-        sub = sub.strip().rstrip('.')
-        # Простой подход: берём последние 2-3 части
-        # Для точности нужна база данных публичных суффиксов (Public Suffix List)
-        # Но пока используем простую эвристику
-        parts = sub.split('.')
-        
-        if len(parts) >= 3:
-            # Проверяем, похоже ли на .co.uk или .com.br
-            if parts[-2] in ('co', 'com', 'net', 'org', 'gov'):
-                base_domains.add('.'.join(parts[-3:]))
-            else:
-                base_domains.add('.'.join(parts[-2:]))
-        elif len(parts) == 2:
-            base_domains.add(sub)
-    
-    return list(base_domains)
+    """Возвращает уникальные базовые домены по Public Suffix List (.co.uk, .com.br, github.io и т.д.)"""
+    return list({base for base in psl.registrable_domains(subdomains) if base})
 
 
 
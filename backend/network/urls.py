@@ -2,12 +2,14 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DomainViewSet, IPAddressViewSet, LinkViewSet
+from .views import DomainViewSet, IPAddressViewSet, LinkViewSet, ScanBatchViewSet, ScanSessionViewSet
 
 router = DefaultRouter()
 router.register(r'domains', DomainViewSet, basename='domain')
 router.register(r'ips', IPAddressViewSet, basename='ip')
 router.register(r'links', LinkViewSet, basename='link')
+router.register(r'sessions', ScanSessionViewSet, basename='session')
+router.register(r'batches', ScanBatchViewSet, basename='batch')
 
 urlpatterns = [
     path('', include(router.urls)),
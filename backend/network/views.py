@@ -1,14 +1,36 @@
 # backend/network/views.py
 
 from rest_framework import viewsets, status
+from rest_framework.filters import OrderingFilter
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from .models import Domain, IPAddress, Link, ScanSession
-from .serializers import DomainSerializer, IPAddressSerializer, LinkSerializer
+from .models import Domain, IPAddress, Link, ScanBatch, ScanSession
+from .serializers import DomainSerializer, IPAddressSerializer, LinkSerializer, LinkListSerializer, ScanBatchSerializer, ScanSessionSerializer
+from .pagination import IdCursorPagination, NameCursorPagination
+from .search import search_domains
 from .scanner import InternetMapScanner
-from .tasks import run_scanner_task
+from .scheduler import submit_scan, requester_from_request
+from .estimator import admit_scan
+from .metrics import render_prometheus, PROMETHEUS_CONTENT_TYPE
+from .graph import get_session_graph, get_cluster_aggregates, GRAPH_LINK_LIMIT
+from .clusters import cluster_overview, expand_cluster, IP_GROUPINGS, DEFAULT_IP_GROUPING, DEFAULT_CLUSTER_LIMIT, MAX_CLUSTER_LIMIT
+from .layout import LAYOUT_NAME
+from .storage import session_links
+from .diff import iter_session_diff_ndjson
+from .batch import (
+    annotate_progress, create_batch, parse_depth, parse_roots, submit_batch,
+    InvalidRoots, RequesterBusy,
+)
+from .export import iter_export, export_filename, FORMATS as EXPORT_FORMATS
+from .adjacency import (
+    get_adjacency, resolve_node, neighborhood_payload, path_payload, components_payload,
+    DEFAULT_HOPS, MAX_HOPS, DEFAULT_NODE_LIMIT, MAX_NODE_LIMIT,
+)
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+import ipaddress
 import logging
-from itertools import combinations
 from django.utils import timezone
 from datetime import timedelta
 from drf_yasg.utils import swagger_auto_schema
@@ -24,6 +46,7 @@ class DomainViewSet(viewsets.ViewSet):
             properties={
                 'domain': openapi.Schema(type=openapi.TYPE_STRING, description='Имя домена для сканирования', example='tyuiu.ru'),
                 'depth': openapi.Schema(type=openapi.TYPE_INTEGER, description='Глубина поиска поддоменов', example=2, default=2),
+                'extend': openapi.Schema(type=openapi.TYPE_BOOLEAN, description='Углублять готовый скан меньшей глубины вместо нового обхода с нуля', default=True),
             }
         ),
         responses={
@@ -50,14 +73,12 @@ class DomainViewSet(viewsets.ViewSet):
 
         # Получаем запрошенную глубину из POST-запроса.
         requested_depth = int(request.data.get('depth', 2))
+        allow_extend = str(request.data.get('extend', True)).lower() not in ('false', '0', 'no')
 
         # --- НАЧАЛО НОВОЙ "УМНОЙ" ЛОГИКИ ---
 
         # 1. Ищем самый глубокий из УЖЕ ЗАВЕРШЕННЫХ сканов для этого домена.
-        latest_completed_scan = ScanSession.objects.filter(
-            root_domain=domain_name,
-            status='completed'
-        ).order_by('-depth', '-created_at').first()
+        latest_completed_scan, base_session = self._extension_base(domain_name, allow_extend)
 
         # 2. Проверяем, подходит ли он нам.
         if latest_completed_scan and latest_completed_scan.depth >= requested_depth:
@@ -71,41 +92,137 @@ class DomainViewSet(viewsets.ViewSet):
 
         # --- КОНЕЦ НОВОЙ ЛОГИКИ ---
 
-        # Если мы дошли сюда, значит, подходящего скана нет. Запускаем новый.
-        try:
-            # Добавим проверку, чтобы не создавать дублирующиеся задачи
-            existing_pending_scan = ScanSession.objects.filter(
-                root_domain=domain_name,
-                depth=requested_depth,
-                status__in=['pending', 'running']
-            ).first()
+        # Не создаем дублирующуюся задачу и не тратим на нее оценку стоимости
+        existing_pending_scan = self._pending_scan(domain_name, requested_depth)
+        if existing_pending_scan:
+            return self._pending_response(existing_pending_scan, domain_name)
+
+        # Оцениваем стоимость и проверяем бюджет до постановки в очередь
+        admitted_depth, estimate = admit_scan(
+            domain_name, requested_depth, base_session.depth if base_session else 0
+        )
+        if admitted_depth is None:
+            return Response({
+                'error': 'Scan exceeds the configured budget',
+                'domain': domain_name,
+                'estimate': estimate,
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
+        downgraded_from = requested_depth if admitted_depth != requested_depth else None
+        requested_depth = admitted_depth
+        if downgraded_from and latest_completed_scan and latest_completed_scan.depth >= requested_depth:
+            # После понижения глубины готовый скан снова подходит
+            return Response({
+                'status': 'A suitable completed scan already exists.',
+                'session_id': latest_completed_scan.id,
+                'domain': domain_name,
+                'downgraded_from': downgraded_from,
+                'estimate': estimate,
+            }, status=status.HTTP_200_OK)
+
+        if downgraded_from:
+            # Скан пониженной глубины тоже может уже стоять в очереди
+            existing_pending_scan = self._pending_scan(domain_name, requested_depth)
             if existing_pending_scan:
-                logger.info(f"Скан с глубиной {requested_depth} уже в очереди (ID: {existing_pending_scan.id}).")
-                return Response({
-                    'status': 'Scan session is already pending or running.',
-                    'session_id': existing_pending_scan.id,
-                    'domain': domain_name,
-                }, status=status.HTTP_202_ACCEPTED)
+                return self._pending_response(existing_pending_scan, domain_name)
 
-            logger.info(f"Запускаем новый скан для {domain_name} с глубиной {requested_depth}.")
+        # Если мы дошли сюда, значит, подходящего скана нет. Запускаем новый.
+        try:
+            if base_session:
+                logger.info(f"Углубляем скан {base_session.id} для {domain_name}: {base_session.depth} → {requested_depth}.")
+            else:
+                logger.info(f"Запускаем новый скан для {domain_name} с глубиной {requested_depth}.")
             session = ScanSession.objects.create(
                 root_domain=domain_name,
                 depth=requested_depth,
-                status='pending'
+                status='pending',
+                base_session=base_session,
+                requester=requester_from_request(request),
+                estimated_probes=estimate['probes'],
+                estimated_runtime=estimate['runtime_seconds'],
             )
-            run_scanner_task.delay(session.id)
+            dispatched = submit_scan(session, estimated_cost=estimate['probes'])
             
             return Response({
-                'status': 'New scan session created and scheduled.',
+                'status': 'Depth extension scheduled.' if base_session else 'New scan session created and scheduled.',
                 'session_id': session.id,
+                'base_session_id': base_session.id if base_session else None,
                 'domain': domain_name,
+                'depth': requested_depth,
+                'downgraded_from': downgraded_from,
+                'estimate': estimate,
+                'queue': session.queue,
+                'dispatched': dispatched,
             }, status=status.HTTP_202_ACCEPTED)
 
         except Exception as e:
             logger.error(f"Не удалось создать сессию сканирования: {e}")
             return Response({'error': 'Failed to create scan session'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @staticmethod
+    def _extension_base(domain_name, allow_extend=True):
+        """
+        Самый глубокий завершенный скан домена и сессия, которую можно углубить:
+        он же, если углубление разрешено и у него записана граница, иначе None.
+        """
+        latest_completed_scan = ScanSession.objects.filter(
+            root_domain=domain_name,
+            status='completed'
+        ).order_by('-depth', '-created_at').first()
+        base_session = None
+        if allow_extend and latest_completed_scan and latest_completed_scan.frontier is not None:
+            base_session = latest_completed_scan
+        return latest_completed_scan, base_session
+
+    @staticmethod
+    def _pending_scan(domain_name, depth):
+        return ScanSession.objects.filter(
+            root_domain=domain_name,
+            depth=depth,
+            status__in=['pending', 'running']
+        ).first()
+
+    @staticmethod
+    def _pending_response(session, domain_name):
+        logger.info(f"Скан с глубиной {session.depth} уже в очереди (ID: {session.id}).")
+        return Response({
+            'status': 'Scan session is already pending or running.',
+            'session_id': session.id,
+            'domain': domain_name,
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('domain', openapi.IN_QUERY, description="Имя домена", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('depth', openapi.IN_QUERY, description="Глубина сканирования", type=openapi.TYPE_INTEGER, default=2),
+            openapi.Parameter('extend', openapi.IN_QUERY, description="Оценивать углубление готового скана меньшей глубины", type=openapi.TYPE_BOOLEAN, default=True),
+        ],
+        operation_description="""Оценивает стоимость скана (число сетевых проб и время) без его запуска и показывает, какую глубину допустит бюджет."""
+    )
+    @action(detail=False, methods=['get'])
+    def estimate(self, request):
+        domain_name = request.query_params.get('domain')
+        if not domain_name:
+            return Response({'error': 'Domain parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            requested_depth = int(request.query_params.get('depth', 2))
+        except ValueError:
+            return Response({'error': 'Depth must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        allow_extend = str(request.query_params.get('extend', True)).lower() not in ('false', '0', 'no')
+
+        # Базовая сессия та же, что выберет scan: оценивается только углубление
+        _, base_session = self._extension_base(domain_name, allow_extend)
+        admitted_depth, estimate = admit_scan(
+            domain_name, requested_depth, base_session.depth if base_session else 0
+        )
+        return Response({
+            'domain': domain_name,
+            'requested_depth': requested_depth,
+            'base_session_id': base_session.id if base_session else None,
+            'admitted_depth': admitted_depth,
+            'estimate': estimate,
+        })
 
     # ... ваш метод graph и другие методы остаются без изменений ...
     # Убедитесь, что метод graph все еще здесь
@@ -127,9 +244,10 @@ class DomainViewSet(viewsets.ViewSet):
                 session = ScanSession.objects.create(
                     root_domain=domain_name,
                     depth=2,  # или возьми из параметров
-                    status='pending'
+                    status='pending',
+                    requester=requester_from_request(request),
                 )
-                run_scanner_task.delay(session.id)
+                submit_scan(session)
                 return Response({
                     'status': 'Scan started, please check back later',
                     'session_id': session.id,
@@ -140,7 +258,7 @@ class DomainViewSet(viewsets.ViewSet):
                 logger.error(f"Failed to create scan session: {e}")
                 return Response({'error': 'Failed to start scan'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        links = Link.objects.filter(scan_session=latest_session).select_related('domain', 'ip')
+        links = session_links(latest_session).select_related('domain', 'ip')
         
         nodes = {}
         edges = []
@@ -175,22 +293,124 @@ class DomainViewSet(viewsets.ViewSet):
         node_list = list(nodes.values())
 
         return Response({'nodes': node_list, 'edges': edges})
-    
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, description="Шаблон: *.tyuiu.ru — поддомены, mail* — префикс, иначе подстрока (от 3 символов)", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('session', openapi.IN_QUERY, description="Только домены сессии (ID)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Размер страницы", type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: DomainSerializer(many=True), 400: 'Некорректный шаблон', 404: 'Сессия не найдена'},
+        operation_description="""Поиск обнаруженных доменов по суффиксу, префиксу или подстроке по индексам (pg_trgm и reverse(name)). Результаты по алфавиту, постранично по курсору."""
+    )
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        session = None
+        if request.query_params.get('session'):
+            try:
+                session = ScanSession.objects.get(pk=int(request.query_params['session']))
+            except (ValueError, ScanSession.DoesNotExist):
+                return Response({'error': f"Сессия {request.query_params['session']} не найдена"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            domains = search_domains(request.query_params.get('q'), session)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = NameCursorPagination()
+        page = paginator.paginate_queryset(domains, request, view=self)
+        return paginator.get_paginated_response(DomainSerializer(page, many=True).data)
+
 class IPAddressViewSet(viewsets.ModelViewSet):
     """
     API для получения, создания, обновления и удаления IP-адресов.
     Возвращает базовую информацию: адрес, организацию, CIDR (подсеть).
+    Фильтры: within — адреса внутри сети, contains — IP, чья сеть содержит адрес или сеть.
+    Список постраничный по курсору (?cursor=, ?page_size=).
     """
-    queryset = IPAddress.objects.all()
     serializer_class = IPAddressSerializer
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        queryset = IPAddress.objects.all()
+        for param, lookup in (('within', 'address__net_within'), ('contains', 'network__net_contains')):
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                queryset = queryset.filter(**{lookup: value})
+            except ValueError:
+                raise ValidationError({'error': f'{param}: {value!r} — не IP-адрес или сеть'})
+        return queryset
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('within', openapi.IN_QUERY, description="Только адреса внутри сети, например 10.0.0.0/24", type=openapi.TYPE_STRING),
+            openapi.Parameter('contains', openapi.IN_QUERY, description="Только IP, чья сеть (RDAP) содержит адрес или сеть", type=openapi.TYPE_STRING),
+        ]
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
 class LinkViewSet(viewsets.ModelViewSet):
     """
     API для получения, создания, обновления и удаления связей между доменами и IP-адресами.
     Каждая связь содержит тип (dns, tls, reverse_dns), дату, домен и IP.
+    Список постраничный по курсору; фильтры: session, method, domain, ip.
     """
-    queryset = Link.objects.all()
     serializer_class = LinkSerializer
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        return Link.objects.select_related('domain', 'ip')
+
+    def filter_links(self):
+        """
+        Связи для списка. С session — связи сессии в любом хранилище (у Edge дата — first_seen),
+        иначе — все строки Link. Строки — словари values() одним запросом с JOIN.
+        id строки Edge не является id связи: он приходит отдельно как edge_id.
+        """
+        params = self.request.query_params
+        extra = {}
+        if params.get('session'):
+            try:
+                session = ScanSession.objects.get(pk=int(params['session']))
+            except (ValueError, ScanSession.DoesNotExist):
+                raise NotFound({'error': f"Сессия {params['session']} не найдена"})
+            queryset = session_links(session)
+            if queryset.model is not Link:
+                discovered_at, extra = F('first_seen'), {'edge_id': F('id')}
+            else:
+                discovered_at = F('discovered_at')
+        else:
+            queryset, discovered_at = Link.objects.all(), F('discovered_at')
+        if params.get('method'):
+            queryset = queryset.filter(method=params['method'])
+        if params.get('domain'):
+            queryset = queryset.filter(domain__name=params['domain'].strip().lower())
+        if params.get('ip'):
+            try:
+                address = str(ipaddress.ip_address(params['ip'].strip()))
+            except ValueError:
+                raise ValidationError({'error': f"ip: {params['ip']!r} — не IP-адрес"})
+            queryset = queryset.filter(ip__address=address)
+        return queryset.values(
+            'id', 'domain_id', 'ip_id', 'method',
+            domain_name=F('domain__name'), ip_address=F('ip__address'), discovered=discovered_at, **extra,
+        )
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('session', openapi.IN_QUERY, description="Только связи сессии (ID)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('method', openapi.IN_QUERY, description="Только связи, найденные этим методом", type=openapi.TYPE_STRING),
+            openapi.Parameter('domain', openapi.IN_QUERY, description="Только связи домена", type=openapi.TYPE_STRING),
+            openapi.Parameter('ip', openapi.IN_QUERY, description="Только связи IP-адреса", type=openapi.TYPE_STRING),
+        ],
+        responses={200: LinkListSerializer(many=True), 400: 'ip — не IP-адрес'},
+    )
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_links())
+        return self.get_paginated_response(LinkListSerializer(page, many=True).data)
+
     @swagger_auto_schema(
         manual_parameters=[
             openapi.Parameter('domain', openapi.IN_QUERY, description="Имя домена для получения графа", type=openapi.TYPE_STRING, required=True)
@@ -217,6 +437,8 @@ class LinkViewSet(viewsets.ModelViewSet):
         operation_description="""
         Возвращает полный граф связей по домену (все уникальные домены/IP и все связи с типами и методами).
         Используйте параметр domain для фильтрации (например, ?domain=tyuiu.ru).
+        У завершенной сессии узлы приходят с готовыми координатами position {x, y}, а поле layout
+        называет алгоритм раскладки; у незавершенной координат нет и layout равен null.
         """
     )
     @action(detail=False, methods=['get'])
@@ -240,94 +462,274 @@ class LinkViewSet(viewsets.ModelViewSet):
         if not latest_session:
             return Response({'nodes': [], 'edges': [], 'message': 'No completed scan found for this domain.'}, status=status.HTTP_200_OK)
 
-        links_data = Link.objects.filter(scan_session=latest_session).values(
-            'id', 'domain__id', 'domain__name', 'ip__id', 'ip__address', 
-            'ip__organization', 'ip__cidr', 'method'
-        )[:500]
-
-        if not links_data:
+        graph = get_session_graph(latest_session)
+        if graph is None:
             return Response({'nodes': [], 'edges': [], 'message': 'No links found for this session.'}, status=200)
 
-        nodes = {}
-        edges = []
-        # Этот словарь теперь хранит связи через ЛЮБОЙ узел-посредник
-        connector_to_domains = {} 
+        graph['summary']['message'] = f'Showing a partial graph limited to {GRAPH_LINK_LIMIT} links.'
+        layout = LAYOUT_NAME if graph['nodes'] and 'position' in graph['nodes'][0] else None
+        return Response({'domain': domain_name, **graph, 'layout': layout})
 
-        for link in links_data:
-            domain_id_str = f'd-{link["domain__id"]}'
-            # ID посредника (может быть как IP, так и доменом)
-            connector_id_str = f'ip-{link["ip__id"]}' 
-            
-            domain_label = link['domain__name']
-            connector_label = link['ip__address']
-
-            # Создаем узел для домена
-            if domain_id_str not in nodes:
-                node_type = 'domain' if any(char.isalpha() for char in domain_label) else 'ip'
-                nodes[domain_id_str] = {'id': domain_id_str, 'label': domain_label, 'type': node_type, 'data': domain_label}
-                if node_type == 'ip': nodes[domain_id_str]['organization'] = 'Unknown'
-
-            # Создаем узел для "посредника"
-            if connector_id_str not in nodes:
-                node_type = 'domain' if any(char.isalpha() for char in connector_label) else 'ip'
-                nodes[connector_id_str] = {'id': connector_id_str, 'label': connector_label, 'type': node_type, 'data': connector_label}
-                if node_type == 'ip': nodes[connector_id_str]['organization'] = link['ip__organization'] or 'Unknown'
-
-            # Добавляем прямую связь (зеленую)
-            edges.append({'id': f'e-{link["id"]}', 'source': domain_id_str, 'target': connector_id_str, 'type': 'direct', 'label': link['method']})
-            
-            # Готовим данные для создания косвенных связей
-            if connector_id_str not in connector_to_domains: connector_to_domains[connector_id_str] = set()
-            connector_to_domains[connector_id_str].add(domain_id_str)
-            
-            # ... (код для подсетей не меняется) ...
-            subnet_cidr = link['ip__cidr']
-            if subnet_cidr:
-                subnet_id_str = f'sub-{subnet_cidr}'
-                if subnet_id_str not in nodes: nodes[subnet_id_str] = {'id': subnet_id_str, 'label': subnet_cidr, 'type': 'subnet', 'data': subnet_cidr}
-                edges.append({'id': f'member_{connector_id_str}_{subnet_id_str}', 'source': connector_id_str, 'target': subnet_id_str, 'type': 'member_of', 'label': 'belongs to'})
-
-        # --- СОЗДАНИЕ КОСВЕННЫХ СВЯЗЕЙ ---
-        
-        # 1. Связи через посредников (КРАСНЫЕ или СИНИЕ)
-        for connector_id, domain_set in connector_to_domains.items():
-            if len(domain_set) > 1 and connector_id in nodes:
-                connector_node = nodes[connector_id]
-                for domain1_id, domain2_id in combinations(domain_set, 2):
-                    # Если посредник - IP, линия КРАСНАЯ
-                    if connector_node['type'] == 'ip':
-                        edges.append({
-                            'id': f'via_{connector_id}_{domain1_id}_{domain2_id}',
-                            'source': domain1_id, 'target': domain2_id,
-                            'type': 'via_ip', # <-- RED
-                            'label': f'via {connector_node["label"]}'
-                        })
-                    # Если посредник - Домен, линия СИНЯЯ
-                    elif connector_node['type'] == 'domain':
-                        edges.append({
-                            'id': f'via_{connector_id}_{domain1_id}_{domain2_id}',
-                            'source': domain1_id, 'target': domain2_id,
-                            'type': 'subdomain', # <-- BLUE
-                            'label': f'alias via {connector_node["label"]}'
-                        })
-
-        # 2. Прямые связи поддоменов (тоже СИНИЕ)
-        domain_nodes = {node['label']: node['id'] for node in nodes.values() if node['type'] == 'domain'}
-        for name, domain_id in domain_nodes.items():
-            parts = name.split('.')
-            if len(parts) > 2:
-                parent_name = '.'.join(parts[1:])
-                if parent_name in domain_nodes:
-                    parent_id = domain_nodes[parent_name]
-                    edges.append({'id': f'sub_{parent_id}_{domain_id}', 'source': parent_id, 'target': domain_id, 'type': 'subdomain', 'label': 'subdomain of'})
 
-        node_list = list(nodes.values())
-        
-        return Response({
-            'domain': domain_name, 'nodes': node_list, 'edges': edges,
-            'summary': {
-                'message': 'Showing a partial graph limited to 500 links.', 'total_nodes': len(node_list), 'total_edges': len(edges),
-                'domains': len([n for n in node_list if n['type'] == 'domain']), 'ips': len([n for n in node_list if n['type'] == 'ip']),
-                'subnets': len([n for n in node_list if n['type'] == 'subnet'])
+class ScanSessionViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API для просмотра сессий сканирования и их статистики: посещенные домены и IP,
+    связи по методам, время по этапам, сетевые вызовы и попадания в кэш.
+    Фильтры: root_domain, status, batch; сортировка: ?ordering=depth.
+    Список постраничный по ключу; курсор строится по полю сортировки, поэтому
+    сортировать можно только по полям без NULL.
+    """
+    serializer_class = ScanSessionSerializer
+    pagination_class = IdCursorPagination
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['id', 'created_at', 'depth']
+    ordering = ['-id']
+
+    def get_queryset(self):
+        queryset = ScanSession.objects.all()
+        root_domain = self.request.query_params.get('root_domain')
+        if root_domain:
+            queryset = queryset.filter(root_domain=root_domain)
+        session_status = self.request.query_params.get('status')
+        if session_status:
+            queryset = queryset.filter(status=session_status)
+        batch = self.request.query_params.get('batch')
+        if batch:
+            try:
+                queryset = queryset.filter(batch_id=int(batch))
+            except ValueError:
+                raise ValidationError({'error': f'batch: {batch!r} — не ID пакета'})
+        return queryset
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('root_domain', openapi.IN_QUERY, description="Фильтр по корневому домену", type=openapi.TYPE_STRING),
+            openapi.Parameter('status', openapi.IN_QUERY, description="Фильтр по статусу (pending, running, completed, failed)", type=openapi.TYPE_STRING),
+            openapi.Parameter('batch', openapi.IN_QUERY, description="Только сессии пакета (ID)", type=openapi.TYPE_INTEGER),
+        ]
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('grouping', openapi.IN_QUERY, description="Как сворачивать IP: subnet (по CIDR) или organization", type=openapi.TYPE_STRING, default=DEFAULT_IP_GROUPING),
+            openapi.Parameter('expand', openapi.IN_QUERY, description="ID кластера для раскрытия, например c-subnet:10.0.0.0/24 или c-domain:example.com", type=openapi.TYPE_STRING),
+            openapi.Parameter('limit', openapi.IN_QUERY, description=f"Сколько кластеров или членов на сторону (до {MAX_CLUSTER_LIMIT})", type=openapi.TYPE_INTEGER, default=DEFAULT_CLUSTER_LIMIT),
+        ],
+        operation_description="""
+        Граф сессии с уровнем детализации. Без expand — обзор: домены свернуты по регистрируемому
+        домену, IP — по подсети или организации, ребра между кластерами несут число связей (weight).
+        С expand — члены выбранного кластера и их агрегированные связи с кластерами другой стороны.
+        Не больше limit элементов на сторону; остальное сворачивается в кластер «*».
+        """
+    )
+    @action(detail=True, methods=['get'])
+    def clusters(self, request, pk=None):
+        session = self.get_object()
+        grouping = request.query_params.get('grouping', DEFAULT_IP_GROUPING)
+        if grouping not in IP_GROUPINGS:
+            return Response({'error': f"grouping должен быть одним из: {', '.join(IP_GROUPINGS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', DEFAULT_CLUSTER_LIMIT)), 2), MAX_CLUSTER_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit должен быть целым числом'}, status=status.HTTP_400_BAD_REQUEST)
+
+        expand = request.query_params.get('expand')
+        if not expand:
+            return Response({'session_id': session.id, **cluster_overview(get_cluster_aggregates(session), grouping, limit)})
+
+        try:
+            data = expand_cluster(session, expand, grouping, limit)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if data is None:
+            return Response({'error': f'Кластер {expand} не найден в сессии'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'session_id': session.id, **data})
+
+    def _adjacency_limit(self, request):
+        return min(max(int(request.query_params.get('limit', DEFAULT_NODE_LIMIT)), 1), MAX_NODE_LIMIT)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('node', openapi.IN_QUERY, description="Узел: ключ графа (d-12, ip-7), имя домена или адрес IP", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('hops', openapi.IN_QUERY, description=f"Радиус в ребрах (до {MAX_HOPS})", type=openapi.TYPE_INTEGER, default=DEFAULT_HOPS),
+            openapi.Parameter('limit', openapi.IN_QUERY, description=f"Сколько ближайших узлов вернуть (до {MAX_NODE_LIMIT})", type=openapi.TYPE_INTEGER, default=DEFAULT_NODE_LIMIT),
+        ],
+        operation_description="""
+        Окрестность узла: домены и IP в пределах hops ребер (домен — IP) с расстоянием до узла
+        и ребра между ними. Отвечает по индексу смежности сессии в памяти.
+        """
+    )
+    @action(detail=True, methods=['get'])
+    def neighborhood(self, request, pk=None):
+        session = self.get_object()
+        try:
+            hops = min(max(int(request.query_params.get('hops', DEFAULT_HOPS)), 1), MAX_HOPS)
+            limit = self._adjacency_limit(request)
+        except ValueError:
+            return Response({'error': 'hops и limit должны быть целыми числами'}, status=status.HTTP_400_BAD_REQUEST)
+        index = get_adjacency(session)
+        node = resolve_node(index, request.query_params.get('node'))
+        if node is None:
+            return Response({'error': 'Узел не найден в сессии'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'session_id': session.id, **neighborhood_payload(index, node, hops, limit)})
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('from', openapi.IN_QUERY, description="Начальный узел: ключ графа, имя домена или адрес IP", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('to', openapi.IN_QUERY, description="Конечный узел", type=openapi.TYPE_STRING, required=True),
+        ],
+        operation_description="""
+        Кратчайший путь между двумя узлами сессии: цепочка доменов и IP, у каждого узла
+        в via — метод связи с предыдущим. 404, если узлы не связаны.
+        """
+    )
+    @action(detail=True, methods=['get'])
+    def path(self, request, pk=None):
+        session = self.get_object()
+        index = get_adjacency(session)
+        source = resolve_node(index, request.query_params.get('from'))
+        target = resolve_node(index, request.query_params.get('to'))
+        if source is None or target is None:
+            return Response({'error': 'Узел не найден в сессии'}, status=status.HTTP_404_NOT_FOUND)
+        data = path_payload(index, source, target)
+        if data is None:
+            return Response({'error': 'Узлы не связаны'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'session_id': session.id, **data})
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('node', openapi.IN_QUERY, description="Только компонента этого узла и ее члены", type=openapi.TYPE_STRING),
+            openapi.Parameter('limit', openapi.IN_QUERY, description=f"Сколько компонент или членов вернуть (до {MAX_NODE_LIMIT})", type=openapi.TYPE_INTEGER, default=DEFAULT_NODE_LIMIT),
+        ],
+        operation_description="""
+        Компоненты связности графа сессии: их число и крупнейшие по размеру.
+        С node — компонента узла: место по размеру и члены.
+        """
+    )
+    @action(detail=True, methods=['get'])
+    def components(self, request, pk=None):
+        session = self.get_object()
+        try:
+            limit = self._adjacency_limit(request)
+        except ValueError:
+            return Response({'error': 'limit должен быть целым числом'}, status=status.HTTP_400_BAD_REQUEST)
+        index = get_adjacency(session)
+        node = None
+        if request.query_params.get('node'):
+            node = resolve_node(index, request.query_params['node'])
+            if node is None:
+                return Response({'error': 'Узел не найден в сессии'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'session_id': session.id, **components_payload(index, limit, node)})
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('from', openapi.IN_QUERY, description="ID исходной (старой) сессии", type=openapi.TYPE_INTEGER, required=True),
+            openapi.Parameter('to', openapi.IN_QUERY, description="ID сравниваемой (новой) сессии", type=openapi.TYPE_INTEGER, required=True),
+        ],
+        responses={200: openapi.Response(description='Поток NDJSON: по записи на строку, последняя — summary')},
+        operation_description="""
+        Разница между двумя сессиями: появившиеся и исчезнувшие домены, IP и связи.
+        Считается в базе и отдается потоком NDJSON без ограничения на число связей:
+        {"op": "added", "kind": "link", "domain": "...", "ip": "...", "method": "dns"};
+        последняя строка — {"op": "summary", ...} с количествами.
+        """
+    )
+    @action(detail=False, methods=['get'])
+    def diff(self, request):
+        try:
+            ids = [int(request.query_params[param]) for param in ('from', 'to')]
+        except (KeyError, ValueError):
+            return Response({'error': 'Параметры from и to (ID сессий) обязательны'}, status=status.HTTP_400_BAD_REQUEST)
+        sessions = ScanSession.objects.in_bulk(ids)
+        missing = [session_id for session_id in ids if session_id not in sessions]
+        if missing:
+            return Response({'error': f'Сессия {missing[0]} не найдена'}, status=status.HTTP_404_NOT_FOUND)
+        return StreamingHttpResponse(
+            iter_session_diff_ndjson(sessions[ids[0]], sessions[ids[1]]), content_type='application/x-ndjson'
+        )
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('table', openapi.IN_QUERY, description="Таблица: links, domains или ips", type=openapi.TYPE_STRING, default='links'),
+            openapi.Parameter('output', openapi.IN_QUERY, description="Формат файла: csv, arrow или parquet", type=openapi.TYPE_STRING, default='csv'),
+        ],
+        responses={200: openapi.Response(description='Файл выгрузки потоком'), 400: 'Неизвестные таблица или формат'},
+        operation_description="""
+        Выгрузка связей, доменов или IP сессии в CSV, Arrow (Feather v2) или Parquet.
+        Читается серверным курсором и отдается потоком по кускам, без ограничения на число связей;
+        Arrow и Parquet загружаются в pandas (read_feather / read_parquet) без разбора JSON.
+        """
+    )
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        session = self.get_object()
+        table = request.query_params.get('table', 'links')
+        file_format = request.query_params.get('output', 'csv')
+        try:
+            content = iter_export(session, table, file_format)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[file_format][1])
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(session, table, file_format)}"'
+        return response
+
+
+class ScanBatchViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Пакетные сканы: список корневых доменов одной задачей с общими кэшами (network/batch.py).
+    Прогресс пакета — сессии по статусам и итоги обхода; сессии пакета — /api/sessions/?batch=<id>.
+    """
+    serializer_class = ScanBatchSerializer
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        return annotate_progress(ScanBatch.objects.all())
+
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'roots': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING), description='Корневые домены'),
+                'depth': openapi.Schema(type=openapi.TYPE_INTEGER, description='Глубина для всех корней', default=2),
+                'name': openapi.Schema(type=openapi.TYPE_STRING, description='Название пакета'),
             }
-        })
\ No newline at end of file
+        ),
+        responses={
+            202: ScanBatchSerializer,
+            400: 'Нет корней, их больше лимита, есть непригодные (rejected) или глубина вне допустимой',
+            429: 'У заказчика уже есть незавершенный пакет',
+        },
+        operation_description="""Создает пакетный скан. Корни — списком roots в JSON или файлом file (multipart, по домену на строку, # — комментарий). Бюджет скана каждый корень проходит в задаче пакета перед обходом: глубина сессии может быть понижена, а корень сверх бюджета — отклонен (сессия failed). У заказчика — не больше BATCH_SCAN_REQUESTER_CONCURRENCY незавершенных пакетов. Все корни сканируются одной задачей в пакетной очереди."""
+    )
+    def create(self, request):
+        upload = request.FILES.get('file')
+        if upload is not None:
+            lines = upload.read().decode('utf-8', errors='replace').splitlines()
+        else:
+            lines = request.data.get('roots') or []
+            if isinstance(lines, str):
+                lines = lines.splitlines()
+        if not isinstance(lines, list):
+            return Response({'error': 'roots must be a list of strings'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            roots = parse_roots(lines)
+            depth = parse_depth(request.data.get('depth', 2))
+        except InvalidRoots as e:
+            return Response({'error': str(e), 'rejected': e.rejected}, status=status.HTTP_400_BAD_REQUEST)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        requester = requester_from_request(request)
+        try:
+            batch = create_batch(roots, depth, request.data.get('name', ''), requester)
+        except RequesterBusy:
+            return Response({'error': 'Too many unfinished batches for this requester'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        submit_batch(batch)
+        return Response(ScanBatchSerializer(batch).data, status=status.HTTP_202_ACCEPTED)
+
+
+def metrics(request):
+    """Метрики процесса в текстовом формате Prometheus."""
+    return HttpResponse(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
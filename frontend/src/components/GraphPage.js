@@ -130,7 +130,7 @@ function GraphPage() {
         organization: node.organization,
         type: node.type,
       },
-      position: { x: 0, y: 0 },
+      position: node.position || { x: 0, y: 0 },
       style: {
         // Уменьшаем размеры узлов, чтобы они не были громоздкими
         width: node.type === 'ip' ? 100 : 150,
@@ -156,6 +156,13 @@ function GraphPage() {
       },
     }));
 
+    // У завершенной сессии координаты уже посчитаны на сервере — только рисуем
+    if (rawNodes.every((node) => node.position)) {
+      setLayoutedNodes(flowNodes);
+      setLayoutedEdges(flowEdges);
+      return;
+    }
+
     const layoutResult = createForceLayout(flowNodes, flowEdges, {
       width,
       height,